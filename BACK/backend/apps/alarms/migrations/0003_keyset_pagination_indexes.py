@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alarms', '0002_alter_alarmconfiguration_alarm_type'),
+        ('farms', '0003_shed_current_occupancy'),
+        ('flocks', '0009_keyset_pagination_indexes'),
+        ('inventory', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alarm',
+            index=models.Index(fields=['created_at', 'id'], name='alarm_created_id_idx'),
+        ),
+    ]
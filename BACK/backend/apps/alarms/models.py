@@ -3,6 +3,7 @@ from django.conf import settings
 from django.utils import timezone
 
 from apps.farms.models import Farm
+from apps.sync.change_log import ChangeLog
 
 
 class BaseModel(models.Model):
@@ -93,8 +94,22 @@ class Alarm(BaseModel):
     def __str__(self):
         return f"Alarm {self.id} - {self.alarm_type} - {self.status}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ChangeLog.touch('alarm', [self.pk])
+
+    def delete(self, *args, **kwargs):
+        tombstones = ChangeLog.tombstones('alarm', [self.pk])
+        result = super().delete(*args, **kwargs)
+        ChangeLog.deleted(tombstones)
+        return result
+
     class Meta:
-        indexes = [models.Index(fields=['source_type', 'source_date']), models.Index(fields=['farm', 'flock'])]
+        indexes = [
+            models.Index(fields=['source_type', 'source_date']),
+            models.Index(fields=['farm', 'flock']),
+            models.Index(fields=['created_at', 'id'], name='alarm_created_id_idx'),
+        ]
 
 
 class AlarmEscalation(BaseModel):
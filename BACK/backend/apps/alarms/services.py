@@ -1,8 +1,9 @@
 import logging
 from django.utils import timezone
-from django.db import models
+from django.db import connection, models, transaction
 
 from apps.farms.models import Farm
+from apps.sync.change_log import ChangeLog
 
 from .models import AlarmConfiguration, Alarm
 
@@ -35,6 +36,8 @@ class AlarmEvaluationEngine:
             try:
                 if config.alarm_type == 'MORTALITY':
                     created = AlarmEvaluationEngine._evaluate_mortality_alarms(farm, config)
+                elif config.alarm_type == 'WEIGHT_DEVIATION':
+                    created = AlarmEvaluationEngine._evaluate_weight_deviation_window(farm, config)
                 elif config.alarm_type == 'NO_RECORDS':
                     created = AlarmEvaluationEngine._evaluate_missing_records_alarms(farm, config)
                 else:
@@ -120,6 +123,122 @@ class AlarmEvaluationEngine:
 
         return created
 
+    @staticmethod
+    def schedule_weight_deviation(record_ids):
+        """Encola la evaluación de desviación de peso para ejecutarse tras el commit.
+
+        La ingesta (save o bulk sync) solo registra los ids tocados; la lógica de
+        alarmas corre en la tarea, fuera de la petición.
+        """
+        record_ids = sorted({rid for rid in record_ids if rid is not None})
+        if not record_ids:
+            return
+        from .tasks import evaluate_weight_deviation_task
+
+        transaction.on_commit(lambda: evaluate_weight_deviation_task.delay(record_ids), robust=True)
+
+    @staticmethod
+    def _evaluate_weight_deviation_window(farm: Farm, config: AlarmConfiguration):
+        """Barrido periódico: reevalúa los pesajes de la granja dentro de la ventana configurada
+        (cubre registros cuya tarea diferida no llegó a ejecutarse)."""
+        from datetime import timedelta
+        from apps.flocks.models import DailyWeightRecord
+
+        hours = max(1, config.evaluation_period_hours)
+        since = timezone.now().date() - timedelta(days=max(1, int((hours + 23) // 24)))
+        records = DailyWeightRecord.objects.filter(flock__shed__farm=farm, date__gte=since)
+        return AlarmEvaluationEngine.evaluate_weight_deviation(records)['alarms_created']
+
+    @staticmethod
+    def evaluate_weight_deviation(records):
+        """Evalúa en bloque la desviación de peso de un conjunto de DailyWeightRecord.
+
+        `records` puede ser una lista de ids o un queryset (p. ej. una ventana de fechas).
+        Usa un número fijo de consultas: registros con lote/galpón/granja, configuraciones
+        activas por granja, alarmas abiertas existentes y un bulk_create de las nuevas.
+        La tolerancia sale de la curva de referencia en caché.
+
+        Returns {'evaluated', 'deviating', 'alarms_created'}.
+        """
+        import numpy as np
+        from apps.flocks.models import DailyWeightRecord
+        from apps.flocks.reference_cache import BreedReferenceCache
+
+        if not isinstance(records, models.QuerySet):
+            records = DailyWeightRecord.objects.filter(id__in=list(records))
+        records = list(
+            records.filter(expected_weight__gt=0, deviation_percentage__isnull=False)
+            .select_related('flock__shed__farm')
+        )
+        result = {'evaluated': len(records), 'deviating': 0, 'alarms_created': 0}
+        if not records:
+            return result
+
+        tolerances = BreedReferenceCache.lookup_pairs([(r.flock, r.date) for r in records]).tolerance_range
+        deviating = [
+            (rec, float(tol)) for rec, tol in zip(records, tolerances)
+            if not np.isnan(tol) and float(rec.deviation_percentage) > tol
+        ]
+        result['deviating'] = len(deviating)
+        if not deviating:
+            return result
+
+        farm_ids = {rec.flock.shed.farm_id for rec, _ in deviating}
+        configs = {
+            c.farm_id: c for c in AlarmConfiguration.objects.filter(
+                alarm_type='WEIGHT_DEVIATION', farm_id__in=farm_ids, is_active=True
+            ).select_related('farm')
+        }
+        already_open = set(Alarm.objects.filter(
+            alarm_type='WEIGHT_DEVIATION',
+            source_type='daily_weight',
+            source_id__in=[rec.id for rec, _ in deviating],
+        ).exclude(status='RESOLVED').values_list('source_id', flat=True))
+
+        new_alarms = []
+        for rec, tolerance in deviating:
+            config = configs.get(rec.flock.shed.farm_id)
+            if config is None or rec.id in already_open:
+                continue
+
+            deviation = float(rec.deviation_percentage)
+            critical = float(config.critical_threshold) if config.critical_threshold else tolerance * 2
+            new_alarms.append(Alarm(
+                alarm_type='WEIGHT_DEVIATION',
+                description=(
+                    f'Peso fuera de rango - {rec.flock}: peso promedio {rec.average_weight}g vs esperado '
+                    f'{rec.expected_weight}g. Desviación: {deviation:.1f}% (tolerancia: {tolerance:.1f}%)'
+                ),
+                priority='HIGH' if deviation > critical else 'MEDIUM',
+                farm_id=config.farm_id,
+                flock_id=rec.flock_id,
+                shed_id=rec.flock.shed_id,
+                configuration=config,
+                source_type='daily_weight',
+                source_date=rec.date,
+                source_id=rec.id,
+            ))
+
+        if not new_alarms:
+            return result
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Alarm.objects.bulk_create(new_alarms)
+            ChangeLog.touch('alarm', [alarm.pk for alarm in new_alarms])
+        else:
+            # Backends sin RETURNING (MySQL): las notificaciones necesitan el id de cada alarma
+            for alarm in new_alarms:
+                alarm.save()
+        result['alarms_created'] = len(new_alarms)
+
+        for alarm in new_alarms:
+            try:
+                AlarmNotificationService.send_alarm_notifications(alarm, alarm.configuration)
+            except Exception:
+                logger.exception('Failed sending notifications for alarm %s', alarm.id)
+
+        return result
+
     @staticmethod
     def _evaluate_missing_records_alarms(farm: Farm, config: AlarmConfiguration):
         # Placeholder implementation
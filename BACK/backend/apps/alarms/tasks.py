@@ -7,6 +7,11 @@ def evaluate_all_alarms_task():
     return AlarmEvaluationEngine.evaluate_all_farms()
 
 
+@shared_task
+def evaluate_weight_deviation_task(record_ids):
+    return AlarmEvaluationEngine.evaluate_weight_deviation(record_ids)
+
+
 @shared_task
 def escalate_unresolved_alarms_task():
     from .services import AlarmEscalationService
@@ -110,3 +110,74 @@ def test_priority_high_when_exceeds_critical(monkeypatch):
     alarm = Alarm.objects.filter(alarm_type='MORTALITY', flock=flock).first()
     assert alarm is not None
     assert alarm.priority == 'HIGH'
+
+
+def _weight_setup(name):
+    from apps.flocks.models import BreedReference
+
+    user = User.objects.create(username=f'w-{name}', email=f'{name}@example.com')
+    farm = Farm.objects.create(name=f'Weight Farm {name}', location='', farm_manager=user)
+    shed = Shed.objects.create(name='Shed W', farm=farm, capacity=10000)
+    BreedReference.objects.create(breed='WB', age_days=7, expected_weight=200, tolerance_range=10)
+    BreedReference.objects.create(breed='WB', age_days=14, expected_weight=400, tolerance_range=10)
+    config = AlarmConfiguration.objects.create(
+        alarm_type='WEIGHT_DEVIATION', farm=farm, threshold_value=10, critical_threshold=30,
+        evaluation_period_hours=24 * 30, is_active=True,
+    )
+    return user, farm, shed, config
+
+
+def _weight_flocks(user, shed, count, weight):
+    from datetime import timedelta
+    from apps.flocks.models import DailyWeightRecord
+
+    records = []
+    today = timezone.now().date()
+    for i in range(count):
+        flock = Flock.objects.create(arrival_date=today - timedelta(days=7), initial_quantity=10, current_quantity=10, initial_weight=40, breed='WB', gender='X', supplier='S', shed=shed)
+        records.append(DailyWeightRecord.objects.create(flock=flock, date=today, average_weight=weight, sample_size=10, recorded_by=user))
+    return records
+
+
+@pytest.mark.django_db
+def test_weight_deviation_batch_creates_alarms_once(monkeypatch):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    monkeypatch.setattr('apps.alarms.services.AlarmNotificationService.send_alarm_notifications', lambda a, c: None)
+    user, farm, shed, config = _weight_setup('batch')
+    ok = _weight_flocks(user, shed, 1, 205)
+    small = _weight_flocks(user, shed, 2, 250)
+    large = _weight_flocks(user, shed, 8, 280)
+
+    with CaptureQueriesContext(connection) as few:
+        result = AlarmEvaluationEngine.evaluate_weight_deviation([r.id for r in ok + small])
+    assert result == {'evaluated': 3, 'deviating': 2, 'alarms_created': 2}
+
+    with CaptureQueriesContext(connection) as many:
+        result = AlarmEvaluationEngine.evaluate_weight_deviation([r.id for r in large])
+    assert result['alarms_created'] == 8
+    assert len(many.captured_queries) <= len(few.captured_queries)
+
+    alarm = Alarm.objects.get(source_type='daily_weight', source_id=large[0].id)
+    assert alarm.priority == 'HIGH'
+    assert alarm.shed_id == shed.id and alarm.configuration_id == config.id
+
+    # Reevaluar no duplica alarmas abiertas (ni en el barrido periódico de la granja)
+    assert AlarmEvaluationEngine.evaluate_farm(farm)['alarms_created'] == 0
+    assert Alarm.objects.filter(alarm_type='WEIGHT_DEVIATION').count() == 10
+
+
+@pytest.mark.django_db
+def test_weight_record_save_defers_alarm_evaluation(monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr('apps.alarms.services.AlarmNotificationService.send_alarm_notifications', lambda a, c: None)
+    user, farm, shed, config = _weight_setup('deferred')
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        records = _weight_flocks(user, shed, 1, 300)
+    # Nada se evalúa dentro de la escritura
+    assert Alarm.objects.count() == 0
+
+    for callback in callbacks:
+        callback()
+    assert Alarm.objects.filter(source_type='daily_weight', source_id=records[0].id).count() == 1
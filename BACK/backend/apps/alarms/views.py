@@ -1,6 +1,7 @@
 from rest_framework import viewsets, permissions
 from .models import AlarmConfiguration, Alarm
 from .serializers import AlarmConfigurationSerializer, AlarmSerializer
+from avicolatrack.pagination import KeysetPagination
 
 
 class AlarmConfigurationViewSet(viewsets.ModelViewSet):
@@ -13,6 +14,7 @@ class AlarmViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Alarm.objects.all().order_by('-created_at')
     serializer_class = AlarmSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
 from django.shortcuts import render
 from rest_framework.decorators import action
@@ -23,6 +25,8 @@ from django.db import models as dj_models
 from django.db.models import Count
 import logging
 
+from apps.sync.change_log import ChangeLog
+
 logger = logging.getLogger(__name__)
 
 
@@ -128,6 +132,7 @@ class AlarmManagementViewSet(viewsets.ModelViewSet):
 
         user_alarms = self.get_queryset()
         alarms_to_update = user_alarms.filter(id__in=alarm_ids, status='PENDING')
+        updated_ids = list(alarms_to_update.values_list('id', flat=True))
 
         updated_count = alarms_to_update.update(
             status='ACKNOWLEDGED',
@@ -135,5 +140,6 @@ class AlarmManagementViewSet(viewsets.ModelViewSet):
             acknowledged_at=timezone.now(),
             resolution_notes=notes
         )
+        ChangeLog.touch('alarm', updated_ids)
 
         return Response({'updated_count': updated_count, 'message': f'{updated_count} alarmas atendidas'})
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.functions import Coalesce
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Shed.current_occupancy desde los lotes activos y corrige desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo informa los galpones con desvío, sin corregirlos')
+
+    def handle(self, *args, **options):
+        from apps.farms.models import Shed
+
+        sheds = Shed.objects.annotate(
+            actual=Coalesce(
+                models.Sum('flocks__current_quantity', filter=models.Q(flocks__status='ACTIVE')),
+                0
+            )
+        ).exclude(current_occupancy=models.F('actual'))
+
+        drifted = list(sheds.only('id', 'name', 'current_occupancy'))
+        for shed in drifted:
+            self.stdout.write(f'Galpón {shed.id} ({shed.name}): {shed.current_occupancy} -> {shed.actual}')
+            shed.current_occupancy = shed.actual
+
+        if drifted and not options.get('dry_run'):
+            Shed.objects.bulk_update(drifted, ['current_occupancy'])
+
+        self.stdout.write(self.style.SUCCESS(f'Galpones con desvío: {len(drifted)}'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:21
+
+from django.db import migrations, models
+
+
+def populate_current_occupancy(apps, schema_editor):
+    Shed = apps.get_model('farms', 'Shed')
+    Flock = apps.get_model('flocks', 'Flock')
+    totals = {
+        row['shed_id']: row['total']
+        for row in Flock.objects.filter(status='ACTIVE').values('shed_id').annotate(total=models.Sum('current_quantity'))
+    }
+    for shed in Shed.objects.all():
+        shed.current_occupancy = totals.get(shed.id) or 0
+        shed.save(update_fields=['current_occupancy'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0002_shed'),
+        ('flocks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shed',
+            name='current_occupancy',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_current_occupancy, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from apps.flocks.dashboard_cache import DashboardCache
+
 
 class BaseModel(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
@@ -49,6 +51,10 @@ class Shed(BaseModel):
 		limit_choices_to={'role__name': 'Galponero'}
 	)
 
+	# Aves en lotes activos; lo mantienen Flock.save/delete (y por ende MortalityRecord.save)
+	# y se reconcilia con el comando reconcile_shed_occupancy
+	current_occupancy = models.PositiveIntegerField(default=0)
+
 	class Meta:
 		unique_together = ['name', 'farm']
 		indexes = [models.Index(fields=['farm', 'name']), models.Index(fields=['assigned_worker'])]
@@ -56,11 +62,43 @@ class Shed(BaseModel):
 	def __str__(self):
 		return f"{self.name} ({self.farm.name})"
 
-	@property
-	def current_occupancy(self):
-		"""Ocupación actual calculada en tiempo real"""
-		active_flocks = self.sheds_related_flocks() if False else self.flocks.filter(status='ACTIVE')
-		return sum(getattr(flock, 'current_quantity', 0) for flock in active_flocks)
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		# Nombre, capacidad o galponero se muestran en el dashboard
+		DashboardCache.bump_sheds([self.pk])
+
+	def delete(self, *args, **kwargs):
+		shed_id = self.pk
+		result = super().delete(*args, **kwargs)
+		DashboardCache.bump_sheds([shed_id])
+		return result
+
+	@classmethod
+	def adjust_occupancy(cls, shed_id, delta, shed=None):
+		"""Suma `delta` aves al contador de ocupación con un UPDATE atómico (nunca baja de 0).
+
+		Si se recibe la instancia en memoria del galpón también se actualiza su valor.
+		"""
+		if not delta:
+			return
+		if delta > 0:
+			value = models.F('current_occupancy') + delta
+		else:
+			# Restar solo si alcanza: evita valores negativos en columnas sin signo (MySQL)
+			value = models.Case(
+				models.When(current_occupancy__gt=-delta, then=models.F('current_occupancy') - (-delta)),
+				default=models.Value(0),
+			)
+		cls.objects.filter(pk=shed_id).update(current_occupancy=value)
+
+		if shed is not None and shed.pk == shed_id:
+			shed.current_occupancy = max(0, shed.current_occupancy + delta)
+
+	def calculate_occupancy(self):
+		"""Ocupación real: suma de aves de los lotes activos (usado para reconciliar el contador)"""
+		return self.flocks.filter(status='ACTIVE').aggregate(
+			total=models.Sum('current_quantity')
+		)['total'] or 0
 
 	def sheds_related_flocks(self):
 		# helper placeholder - kept for compatibility if needed
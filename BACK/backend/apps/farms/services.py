@@ -11,6 +11,8 @@ class ShedCapacityService:
         if new_quantity <= 0:
             raise ValidationError("La cantidad debe ser mayor a 0")
 
+        # Leer el contador vigente: la instancia puede venir de antes de otros cambios
+        shed.refresh_from_db(fields=['current_occupancy'])
         available = shed.available_capacity
         if new_quantity > available:
             raise ValidationError(
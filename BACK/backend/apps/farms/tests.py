@@ -1,3 +1,68 @@
 from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-# Create your tests here.
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import Flock, MortalityRecord
+
+User = get_user_model()
+
+
+class ShedOccupancyCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='occ', identification='occ-1', is_staff=True)
+        self.farm = Farm.objects.create(name='Occ Farm', location='', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Occ Shed', capacity=1000, farm=self.farm)
+        self.other = Shed.objects.create(name='Occ Shed 2', capacity=1000, farm=self.farm)
+
+    def _flock(self, quantity, shed=None):
+        return Flock.objects.create(
+            arrival_date=timezone.now().date(), initial_quantity=quantity, current_quantity=quantity,
+            initial_weight=40, breed='R', gender='M', supplier='S', shed=shed or self.shed
+        )
+
+    def _occupancy(self, shed):
+        return Shed.objects.get(pk=shed.pk).current_occupancy
+
+    def test_counter_follows_flock_lifecycle(self):
+        flock = self._flock(300)
+        self._flock(200)
+        self.assertEqual(self._occupancy(self.shed), 500)
+        self.assertEqual(self.shed.current_occupancy, 500)
+
+        MortalityRecord.objects.create(flock=flock, date=timezone.now().date(), deaths=20, recorded_by=self.user)
+        self.assertEqual(self._occupancy(self.shed), 480)
+
+        flock.refresh_from_db()
+        flock.shed = self.other
+        flock.save()
+        self.assertEqual(self._occupancy(self.shed), 200)
+        self.assertEqual(self._occupancy(self.other), 280)
+
+        flock.status = 'SOLD'
+        flock.save(update_fields=['status'])
+        self.assertEqual(self._occupancy(self.other), 0)
+
+        Flock.objects.get(shed=self.shed).delete()
+        self.assertEqual(self._occupancy(self.shed), 0)
+
+    def test_reading_occupancy_does_not_query(self):
+        self._flock(250)
+        shed = Shed.objects.get(pk=self.shed.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(shed.current_occupancy, 250)
+            self.assertEqual(shed.occupancy_percentage, 25)
+            self.assertEqual(shed.available_capacity, 750)
+
+    def test_reconcile_command_fixes_drift(self):
+        self._flock(100)
+        Shed.objects.filter(pk=self.shed.pk).update(current_occupancy=7)
+        Shed.objects.filter(pk=self.other.pk).update(current_occupancy=3)
+
+        call_command('reconcile_shed_occupancy', dry_run=True)
+        self.assertEqual(self._occupancy(self.shed), 7)
+
+        call_command('reconcile_shed_occupancy')
+        self.assertEqual(self._occupancy(self.shed), 100)
+        self.assertEqual(self._occupancy(self.other), 0)
@@ -0,0 +1,67 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Contador de versión por galpón; lo incrementan las escrituras de galpones, pesos, mortalidad y lotes.
+SHED_VERSION_KEY = 'flocks:dashboard:shed:{shed_id}:version'
+DASHBOARD_KEY = 'flocks:dashboard:{digest}'
+# Vida máxima de una entrada aunque ningún contador cambie (segundos).
+DASHBOARD_TTL = 300
+
+
+class DashboardCache:
+    """Caché del dashboard de galpones por alcance de usuario.
+
+    La clave combina los galpones accesibles y la versión vigente de cada uno, de modo
+    que usuarios con distinto alcance nunca comparten entrada y cualquier escritura que
+    afecte a un galpón invalida todas las entradas que lo incluyen.
+    """
+
+    @staticmethod
+    def key_for(shed_ids):
+        shed_ids = sorted(shed_ids)
+        keys = [SHED_VERSION_KEY.format(shed_id=shed_id) for shed_id in shed_ids]
+        versions = cache.get_many(keys) if keys else {}
+
+        missing = [key for key in keys if key not in versions]
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        if missing:
+            versions.update(cache.get_many(missing))
+
+        scope = ','.join(f'{shed_id}:{versions.get(key)}' for shed_id, key in zip(shed_ids, keys))
+        return DASHBOARD_KEY.format(digest=hashlib.sha1(scope.encode()).hexdigest())
+
+    @staticmethod
+    def get(shed_ids):
+        key = DashboardCache.key_for(shed_ids)
+        return key, cache.get(key)
+
+    @staticmethod
+    def set(key, data):
+        cache.set(key, data, DASHBOARD_TTL)
+
+    @staticmethod
+    def bump_sheds(shed_ids):
+        """Invalida las entradas que incluyen estos galpones (ahora y al confirmar la transacción).
+
+        El segundo incremento descarta entradas armadas por otro proceso con datos previos
+        al commit.
+        """
+        shed_ids = {shed_id for shed_id in shed_ids if shed_id is not None}
+        if not shed_ids:
+            return
+
+        def bump():
+            for shed_id in shed_ids:
+                key = SHED_VERSION_KEY.format(shed_id=shed_id)
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    # Sin contador (nunca leído o desalojado): se siembra con un valor nuevo
+                    cache.add(key, time.time_ns(), timeout=None)
+
+        bump()
+        transaction.on_commit(bump)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye FlockDailySnapshot desde los registros de peso, mortalidad y consumo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flock', type=int, action='append', dest='flocks',
+                            help='ID de lote a reconstruir (se puede repetir). Por defecto todos.')
+        parser.add_argument('--active-only', action='store_true',
+                            help='Solo lotes con estado ACTIVE')
+
+    def handle(self, *args, **options):
+        from apps.flocks.models import Flock
+        from apps.flocks.services_snapshot import FlockSnapshotService
+
+        flocks = Flock.objects.order_by('id')
+        if options.get('flocks'):
+            flocks = flocks.filter(id__in=options['flocks'])
+        if options.get('active_only'):
+            flocks = flocks.filter(status='ACTIVE')
+
+        total_written = 0
+        total_removed = 0
+        for flock_id in flocks.values_list('id', flat=True).iterator():
+            with transaction.atomic():
+                written, removed = FlockSnapshotService.rebuild_flock(flock_id)
+            total_written += written
+            total_removed += removed
+            self.stdout.write(f'Lote {flock_id}: {written} resúmenes, {removed} obsoletos eliminados')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes reconstruidos: {total_written} (eliminados: {total_removed})'
+        ))
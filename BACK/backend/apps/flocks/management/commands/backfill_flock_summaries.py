@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Crea FlockSummary para los lotes cerrados (SOLD, FINISHED, TRANSFERRED) que aún no lo tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flock', type=int, action='append', dest='flocks',
+                            help='ID de lote a cerrar (se puede repetir). Por defecto todos los pendientes.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Lotes por lote de cálculo')
+
+    def handle(self, *args, **options):
+        from apps.flocks.services_closeout import CLOSED_STATUSES, FlockCloseoutService
+        from apps.flocks.models import Flock
+
+        pending = Flock.objects.filter(status__in=CLOSED_STATUSES, summary__isnull=True).order_by('id')
+        if options.get('flocks'):
+            pending = pending.filter(id__in=options['flocks'])
+        flock_ids = list(pending.values_list('id', flat=True))
+
+        batch_size = max(options['batch_size'], 1)
+        total = 0
+        for start in range(0, len(flock_ids), batch_size):
+            created = FlockCloseoutService.close_out(flock_ids[start:start + batch_size])
+            total += len(created)
+            self.stdout.write(f'{min(start + batch_size, len(flock_ids))}/{len(flock_ids)} lotes procesados')
+
+        self.stdout.write(self.style.SUCCESS(f'Cierres creados: {total}'))
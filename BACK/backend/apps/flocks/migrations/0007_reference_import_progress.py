@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:14
+
+from django.db import migrations, models
+
+
+def mark_existing_logs_completed(apps, schema_editor):
+    # Las importaciones previas eran síncronas: ya terminaron
+    ReferenceImportLog = apps.get_model('flocks', 'ReferenceImportLog')
+    for log in ReferenceImportLog.objects.all():
+        log.status = 'COMPLETED'
+        log.processed_rows = log.total_rows
+        log.save(update_fields=['status', 'processed_rows'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0006_alter_flock_current_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referenceimportlog',
+            name='processed_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referenceimportlog',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('COMPLETED', 'Completado'), ('FAILED', 'Fallido')], default='PENDING', max_length=12),
+        ),
+        migrations.RunPython(mark_existing_logs_completed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0007_reference_import_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlockDailySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('live_birds', models.PositiveIntegerField(default=0)),
+                ('deaths', models.PositiveIntegerField(default=0)),
+                ('average_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('expected_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('deviation_percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('feed_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('flock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_snapshots', to='flocks.flock')),
+            ],
+            options={
+                'ordering': ['flock', 'date'],
+                'indexes': [models.Index(fields=['date', 'flock'], name='flocks_floc_date_7a4934_idx')],
+                'unique_together': {('flock', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0008_flockdailysnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyweightrecord',
+            index=models.Index(fields=['date', 'id'], name='dailyweight_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='syncconflict',
+            index=models.Index(fields=['created_at', 'id'], name='flocks_conflict_created_idx'),
+        ),
+    ]
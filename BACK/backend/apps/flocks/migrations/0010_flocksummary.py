@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlockSummary',
+            fields=[
+                ('flock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='flocks.flock')),
+                ('closing_status', models.CharField(choices=[('ACTIVE', 'Activo'), ('SOLD', 'Vendido'), ('FINISHED', 'Terminado'), ('TRANSFERRED', 'Transferido')], max_length=12)),
+                ('arrival_date', models.DateField()),
+                ('closed_on', models.DateField()),
+                ('days', models.PositiveIntegerField()),
+                ('initial_quantity', models.PositiveIntegerField()),
+                ('final_quantity', models.PositiveIntegerField()),
+                ('total_mortality', models.PositiveIntegerField(default=0)),
+                ('mortality_records', models.PositiveIntegerField(default=0)),
+                ('mortality_rate', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('initial_weight', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('final_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('average_weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('weight_records', models.PositiveIntegerField(default=0)),
+                ('total_feed_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('feed_records', models.PositiveIntegerField(default=0)),
+                ('weight_gain_kg', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('fcr', models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-closed_on'],
+                'indexes': [models.Index(fields=['closed_on'], name='flock_summary_closed_idx')],
+            },
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.utils import timezone
 from django.conf import settings
 
 from apps.farms.models import Shed
+from apps.sync.change_log import ChangeLog
+from .reference_cache import BreedReferenceCache
+from .dashboard_cache import DashboardCache
 from django.conf import settings
 
 
@@ -67,21 +72,81 @@ class Flock(BaseModel):
 		# Validar capacidad del galpón antes de crear nuevo lote
 		if not self.pk:  # Solo en creación
 			self._validate_shed_capacity()
-		
-		super().save(*args, **kwargs)
+
+		update_fields = kwargs.get('update_fields')
+		tracks_occupancy = update_fields is None or bool(
+			{'status', 'current_quantity', 'shed', 'shed_id'} & set(update_fields)
+		)
+		if not tracks_occupancy:
+			super().save(*args, **kwargs)
+			DashboardCache.bump_sheds([self.shed_id])
+			ChangeLog.touch('flock', [self.pk])
+			return
+
+		with transaction.atomic():
+			previous = None
+			if self.pk:
+				previous = Flock.objects.select_for_update().filter(pk=self.pk).values(
+					'shed_id', 'status', 'current_quantity'
+				).first()
+			super().save(*args, **kwargs)
+			self._sync_shed_occupancy(previous)
+
+		DashboardCache.bump_sheds([self.shed_id, previous['shed_id'] if previous else None])
+		ChangeLog.touch('flock', [self.pk])
+		if previous and previous['status'] == 'ACTIVE' and self.status != 'ACTIVE':
+			# El lote sale de producción: calcular su cierre una sola vez
+			from .services_closeout import FlockCloseoutService
+			FlockCloseoutService.schedule([self.pk])
+
+	def delete(self, *args, **kwargs):
+		with transaction.atomic():
+			shed_id, birds = self.shed_id, self._occupied_birds(self.status, self.current_quantity)
+			# Los pesajes y mortalidades se eliminan en cascada: también se publican como borrados
+			tombstones = [
+				ChangeLog.tombstones('flock', [self.pk]),
+				ChangeLog.tombstones('daily_weight', self.weight_records.values_list('id', flat=True)),
+				ChangeLog.tombstones('mortality', self.mortality_records.values_list('id', flat=True)),
+			]
+			result = super().delete(*args, **kwargs)
+			Shed.adjust_occupancy(shed_id, -birds, self._cached_shed())
+			for entries in tombstones:
+				ChangeLog.deleted(entries)
+		DashboardCache.bump_sheds([shed_id])
+		return result
+
+	@staticmethod
+	def _occupied_birds(status, quantity):
+		return quantity if status == 'ACTIVE' else 0
+
+	def _cached_shed(self):
+		return Flock._meta.get_field('shed').get_cached_value(self, default=None)
+
+	def _sync_shed_occupancy(self, previous):
+		"""Trasladar al contador del galpón el cambio de estado, cantidad o galpón del lote"""
+		new_birds = self._occupied_birds(self.status, self.current_quantity)
+		if previous is None:
+			old_shed_id, old_birds = self.shed_id, 0
+		else:
+			old_shed_id = previous['shed_id']
+			old_birds = self._occupied_birds(previous['status'], previous['current_quantity'])
+
+		shed = self._cached_shed()
+		if old_shed_id == self.shed_id:
+			Shed.adjust_occupancy(self.shed_id, new_birds - old_birds, shed)
+		else:
+			Shed.adjust_occupancy(old_shed_id, -old_birds)
+			Shed.adjust_occupancy(self.shed_id, new_birds, shed)
 	
 	def _validate_shed_capacity(self):
 		"""Validar que el galpón tenga suficiente capacidad para el nuevo lote"""
 		if not self.shed or not hasattr(self.shed, 'capacity'):
 			return  # Si no hay galpón o capacidad definida, no validar
 		
-		# Calcular capacidad actual ocupada en el galpón
-		current_occupation = Flock.objects.filter(
-			shed=self.shed,
-			status='ACTIVE'
-		).aggregate(
-			total=models.Sum('current_quantity')
-		)['total'] or 0
+		# Capacidad actual ocupada en el galpón (contador mantenido por Flock.save)
+		current_occupation = Shed.objects.filter(pk=self.shed_id).values_list(
+			'current_occupancy', flat=True
+		).first() or 0
 		
 		# Verificar si el nuevo lote excede la capacidad
 		if current_occupation + self.initial_quantity > self.shed.capacity:
@@ -124,6 +189,15 @@ class BreedReference(BaseModel):
 			is_active=True
 		).order_by('-version').first()
 
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		BreedReferenceCache.invalidate()
+
+	def delete(self, *args, **kwargs):
+		result = super().delete(*args, **kwargs)
+		BreedReferenceCache.invalidate()
+		return result
+
 
 class DailyWeightRecord(BaseModel):
 	flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='weight_records')
@@ -141,98 +215,57 @@ class DailyWeightRecord(BaseModel):
 
 	class Meta:
 		unique_together = ['flock', 'date']
+		# Clave de la paginación por cursor (date, id)
+		indexes = [models.Index(fields=['date', 'id'], name='dailyweight_date_id_idx')]
 
 	def save(self, *args, **kwargs):
 		# Calcular peso esperado y desviación automáticamente
 		if not self.expected_weight or self.expected_weight == 0:
 			self.expected_weight = self._calculate_expected_weight()
 
+		self._update_deviation()
+		
+		# Guardar primero el registro
+		super().save(*args, **kwargs)
+
+		from .services_snapshot import FlockSnapshotService
+		FlockSnapshotService.refresh(self.flock_id, self.date)
+		DashboardCache.bump_sheds([self.flock.shed_id])
+		ChangeLog.touch('daily_weight', [self.pk])
+
+		# Un pesaje nuevo descarta la predicción de crecimiento cacheada del lote
+		from .services_forecast import GrowthForecastService
+		GrowthForecastService.invalidate([self.flock_id])
+
+		# La alarma por desviación se evalúa en diferido (AlarmEvaluationEngine), fuera de la petición
+		from apps.alarms.services import AlarmEvaluationEngine
+		AlarmEvaluationEngine.schedule_weight_deviation([self.pk])
+
+	def delete(self, *args, **kwargs):
+		from .services_snapshot import FlockSnapshotService
+		from .services_forecast import GrowthForecastService
+
+		tombstones = ChangeLog.tombstones('daily_weight', [self.pk])
+		result = super().delete(*args, **kwargs)
+		# El resumen del día ya no debe mostrar el peso eliminado
+		FlockSnapshotService.refresh(self.flock_id, self.date)
+		DashboardCache.bump_sheds([self.flock.shed_id])
+		GrowthForecastService.invalidate([self.flock_id])
+		ChangeLog.deleted(tombstones)
+		return result
+
+	def _update_deviation(self):
+		"""Recalcular deviation_percentage a partir de average_weight y expected_weight"""
 		if self.expected_weight and self.expected_weight > 0:
-			deviation = abs(self.average_weight - self.expected_weight)
+			deviation = abs(Decimal(str(self.average_weight)) - Decimal(str(self.expected_weight)))
 			try:
-				self.deviation_percentage = (deviation / self.expected_weight) * 100
+				self.deviation_percentage = (deviation / Decimal(str(self.expected_weight))) * 100
 			except Exception:
 				self.deviation_percentage = None
-		
-		# Guardar primero el registro
-		super().save(*args, **kwargs)
-		
-		# Verificar si se debe generar alarma por desviación
-		self._check_weight_deviation_alarm()
 
 	def _calculate_expected_weight(self):
-		"""Calcular peso esperado usando BreedReference más inteligente"""
-		# Usar el método de clase que maneja versionado
-		reference = BreedReference.get_reference_for_flock(self.flock, self.date)
-		return reference.expected_weight if reference else None
-	
-	def _check_weight_deviation_alarm(self):
-		"""Verificar si el peso está fuera del rango aceptable y generar alarma"""
-		if not self.expected_weight or not self.deviation_percentage:
-			return
-		
-		try:
-			from apps.alarms.models import AlarmConfiguration, Alarm
-		except ImportError:
-			return
-			
-		# Obtener referencia para verificar tolerancia
-		reference = BreedReference.get_reference_for_flock(self.flock, self.date)
-		if not reference:
-			return
-			
-		tolerance = float(reference.tolerance_range)
-		
-		# Si la desviación supera la tolerancia, crear alarma
-		if float(self.deviation_percentage) > tolerance:
-			# Verificar configuración de alarmas de la granja
-			config = AlarmConfiguration.objects.filter(
-				alarm_type='WEIGHT_DEVIATION',
-				farm=self.flock.shed.farm,
-				is_active=True
-			).first()
-			
-			if config:
-				# Verificar si no existe alarma similar reciente
-				recent_alarms = Alarm.objects.filter(
-					alarm_type='WEIGHT_DEVIATION',
-					entity_type='FLOCK',
-					entity_id=self.flock.id,
-					status='PENDING',
-					created_at__date=self.date
-				)
-				
-				if not recent_alarms.exists():
-					priority = 'HIGH' if float(self.deviation_percentage) > (tolerance * 2) else 'MEDIUM'
-					
-					Alarm.objects.create(
-						alarm_type='WEIGHT_DEVIATION',
-						entity_type='FLOCK',
-						entity_id=self.flock.id,
-						priority=priority,
-						title=f'Peso fuera de rango - {self.flock}',
-						message=f'Peso promedio {self.average_weight}g vs esperado {self.expected_weight}g. Desviación: {self.deviation_percentage:.1f}%',
-						farm=self.flock.shed.farm,
-						shed=self.flock.shed,
-						data={
-							'flock_id': self.flock.id,
-							'date': self.date.isoformat(),
-							'actual_weight': float(self.average_weight),
-							'expected_weight': float(self.expected_weight),
-							'deviation_percentage': float(self.deviation_percentage),
-							'tolerance_range': tolerance,
-							'breed': self.flock.breed
-						}
-					)
-
-	def _calculate_expected_weight(self):
-		age_days = (self.date - self.flock.arrival_date).days
-		reference = BreedReference.objects.filter(
-			breed=self.flock.breed,
-			age_days=age_days,
-			is_active=True
-		).order_by('-version').first()
-
+		"""Calcular peso esperado usando la curva de referencia en caché (versión activa)"""
+		reference = BreedReferenceCache.get_point_for_flock(self.flock, self.date)
 		return reference.expected_weight if reference else None
 
 
@@ -292,6 +325,13 @@ class MortalityRecord(BaseModel):
 			# Save the mortality record (inside the same transaction)
 			super().save(*args, **kwargs)
 
+			from .services_snapshot import FlockSnapshotService
+			FlockSnapshotService.refresh(self.flock_id, self.date, mortality_changed=True)
+
+		MortalityRecord._invalidate_stats(self.flock_id)
+		DashboardCache.bump_sheds([self.flock.shed_id])
+		ChangeLog.touch('mortality', [self.pk])
+
 		# Verificar alarmas después de guardar (fuera del bloqueo)
 		if is_new:
 			try:
@@ -300,6 +340,23 @@ class MortalityRecord(BaseModel):
 				# no dejar que una falla en alarmas rompa el guardado
 				pass
 
+	def delete(self, *args, **kwargs):
+		from .services_snapshot import FlockSnapshotService
+
+		flock_id, date = self.flock_id, self.date
+		tombstones = ChangeLog.tombstones('mortality', [self.pk])
+		result = super().delete(*args, **kwargs)
+		FlockSnapshotService.refresh(flock_id, date, mortality_changed=True)
+		MortalityRecord._invalidate_stats(flock_id)
+		DashboardCache.bump_sheds([self.flock.shed_id])
+		ChangeLog.deleted(tombstones)
+		return result
+
+	@staticmethod
+	def _invalidate_stats(flock_id):
+		from .services import MortalityService
+		MortalityService.invalidate_mortality_stats(flock_id)
+
 	def _check_mortality_alarms(self):
 		"""Verificar si debe generar alarma por mortalidad alta"""
 		from datetime import timedelta
@@ -334,6 +391,77 @@ class MortalityRecord(BaseModel):
 			)
 
 
+class FlockDailySnapshot(BaseModel):
+	"""Resumen diario materializado por lote (aves vivas, mortalidad, peso y alimento).
+
+	Se mantiene de forma incremental desde DailyWeightRecord, MortalityRecord y
+	FoodConsumptionRecord (ver FlockSnapshotService) para que los tableros y reportes
+	lean una sola tabla indexada.
+	"""
+	flock = models.ForeignKey(Flock, on_delete=models.CASCADE, related_name='daily_snapshots')
+	date = models.DateField()
+
+	live_birds = models.PositiveIntegerField(default=0)
+	deaths = models.PositiveIntegerField(default=0)
+	average_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+	expected_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+	deviation_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+	feed_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+	class Meta:
+		unique_together = ['flock', 'date']
+		indexes = [models.Index(fields=['date', 'flock'])]
+		ordering = ['flock', 'date']
+
+	def __str__(self):
+		return f"Resumen {self.flock_id} - {self.date}"
+
+
+class FlockSummary(models.Model):
+	"""Cierre de un lote: totales de vida calculados una sola vez cuando deja ACTIVE.
+
+	Lo escribe FlockCloseoutService al pasar el lote a SOLD, FINISHED o TRANSFERRED y no
+	se modifica después; los reportes leen los lotes cerrados de aquí en lugar de volver a
+	recorrer sus registros diarios.
+	"""
+	flock = models.OneToOneField(Flock, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+	closing_status = models.CharField(max_length=12, choices=Flock.STATUS_CHOICES)
+	arrival_date = models.DateField()
+	closed_on = models.DateField()
+	days = models.PositiveIntegerField()
+
+	initial_quantity = models.PositiveIntegerField()
+	final_quantity = models.PositiveIntegerField()
+	total_mortality = models.PositiveIntegerField(default=0)
+	mortality_records = models.PositiveIntegerField(default=0)
+	mortality_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # porcentaje
+
+	initial_weight = models.DecimalField(max_digits=6, decimal_places=2)  # gramos
+	final_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)  # gramos
+	# Media de los pesajes del lote y cuántos hubo (los reportes la combinan con la de lotes abiertos)
+	average_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+	weight_records = models.PositiveIntegerField(default=0)
+	total_feed_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+	feed_records = models.PositiveIntegerField(default=0)
+	weight_gain_kg = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+	fcr = models.DecimalField(max_digits=6, decimal_places=3, null=True, blank=True)
+
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [models.Index(fields=['closed_on'], name='flock_summary_closed_idx')]
+		ordering = ['-closed_on']
+
+	def __str__(self):
+		return f"Cierre lote {self.flock_id} - {self.closed_on}"
+
+	def save(self, *args, **kwargs):
+		if not self._state.adding:
+			from django.core.exceptions import ValidationError
+			raise ValidationError('El cierre de un lote no se puede modificar')
+		super().save(*args, **kwargs)
+
+
 class SyncConflict(BaseModel):
 	"""Registro de conflictos detectados durante sincronización offline"""
 	source = models.CharField(max_length=50)  # e.g. 'daily_weight', 'mortality'
@@ -347,11 +475,22 @@ class SyncConflict(BaseModel):
 	flock = models.ForeignKey(Flock, null=True, blank=True, on_delete=models.SET_NULL)
 
 	class Meta:
-		indexes = [models.Index(fields=['source', 'client_id']), models.Index(fields=['resolved_at'])]
+		indexes = [
+			models.Index(fields=['source', 'client_id']),
+			models.Index(fields=['resolved_at']),
+			models.Index(fields=['created_at', 'id'], name='flocks_conflict_created_idx'),
+		]
 
 
 class ReferenceImportLog(BaseModel):
 	"""Log de importaciones de tablas de referencia"""
+	STATUS_CHOICES = [
+		('PENDING', 'Pendiente'),
+		('PROCESSING', 'Procesando'),
+		('COMPLETED', 'Completado'),
+		('FAILED', 'Fallido'),
+	]
+
 	file_name = models.CharField(max_length=255)
 	imported_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 	total_rows = models.PositiveIntegerField(default=0)
@@ -359,3 +498,7 @@ class ReferenceImportLog(BaseModel):
 	updates = models.PositiveIntegerField(default=0)
 	errors = models.PositiveIntegerField(default=0)
 	error_details = models.JSONField(default=list)
+
+	# Progreso de la importación asíncrona (consultado por el cliente mientras corre la tarea)
+	status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='PENDING')
+	processed_rows = models.PositiveIntegerField(default=0)
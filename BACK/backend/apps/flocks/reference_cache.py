@@ -0,0 +1,182 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+# Clave compartida (Redis en producción) con el sello de versión de la tabla de referencias.
+REFERENCE_VERSION_KEY = 'flocks:breed_reference:version'
+# Tiempo máximo que una curva vive en memoria aunque el sello no cambie (segundos).
+CURVE_LOCAL_TTL = 300
+
+TWO_PLACES = Decimal('0.01')
+
+CurvePoint = namedtuple('CurvePoint', ['breed', 'age_days', 'expected_weight', 'expected_consumption', 'tolerance_range'])
+CurveArrays = namedtuple('CurveArrays', ['expected_weight', 'expected_consumption', 'tolerance_range'])
+
+
+def as_decimal(value):
+    return Decimal(repr(float(value))).quantize(TWO_PLACES)
+
+
+class BreedCurve:
+    """Curva de referencia activa de una raza como arreglos densos indexados por age_days.
+
+    Entre dos edades con referencia los valores se interpolan linealmente (tablas con
+    puntos semanales cubren también los días intermedios). Fuera del rango cubierto por
+    la tabla no se extrapola: esas edades quedan en NaN.
+    """
+
+    def __init__(self, breed, version, rows):
+        self.breed = breed
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        rows = sorted(rows)
+        self.known_ages = np.array([r[0] for r in rows], dtype=np.int64)
+        size = int(self.known_ages[-1]) + 1 if rows else 0
+        self.weight = np.full(size, np.nan)
+        self.consumption = np.full(size, np.nan)
+        self.tolerance = np.full(size, np.nan)
+
+        if rows:
+            span = np.arange(self.known_ages[0], size)
+            for column, target in ((1, self.weight), (2, self.consumption), (3, self.tolerance)):
+                target[span] = np.interp(span, self.known_ages, np.array([r[column] for r in rows], dtype=np.float64))
+
+    def __len__(self):
+        return int(self.known_ages.size)
+
+    def lookup(self, ages):
+        """Valores esperados para un vector de edades: (peso, consumo, tolerancia) con NaN si no hay curva."""
+        ages = np.asarray(ages, dtype=np.int64)
+        valid = (ages >= 0) & (ages < self.weight.size)
+        result = []
+        for source in (self.weight, self.consumption, self.tolerance):
+            values = np.full(ages.shape, np.nan)
+            values[valid] = source[ages[valid]]
+            result.append(values)
+        return tuple(result)
+
+    def point(self, age_days):
+        """Devuelve el CurvePoint (exacto o interpolado) para una edad o None si queda fuera de la curva."""
+        if age_days is None or age_days < 0 or age_days >= self.weight.size:
+            return None
+        weight = self.weight[age_days]
+        if np.isnan(weight):
+            return None
+        return CurvePoint(
+            breed=self.breed,
+            age_days=int(age_days),
+            expected_weight=as_decimal(weight),
+            expected_consumption=as_decimal(self.consumption[age_days]),
+            tolerance_range=as_decimal(self.tolerance[age_days]),
+        )
+
+
+class BreedReferenceCache:
+    """Caché en proceso de curvas BreedReference con invalidación por sello de versión.
+
+    Cada proceso guarda las curvas por raza junto al sello vigente cuando se cargaron.
+    Las escrituras sobre BreedReference cambian el sello compartido en la caché de Django,
+    por lo que los demás procesos recargan la curva en su siguiente lectura.
+    """
+
+    _curves = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def current_version():
+        version = cache.get(REFERENCE_VERSION_KEY)
+        if version is None:
+            cache.add(REFERENCE_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(REFERENCE_VERSION_KEY)
+        return version
+
+    @staticmethod
+    def bump_version():
+        # Un token nuevo (no un contador) evita reutilizar un sello tras un desalojo de la caché
+        cache.set(REFERENCE_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    @classmethod
+    def invalidate(cls):
+        """Invalida ahora y de nuevo al confirmar la transacción en curso.
+
+        El segundo sello descarta curvas que otro proceso haya cargado con datos previos
+        al commit.
+        """
+        cls.bump_version()
+        transaction.on_commit(cls.bump_version)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._curves.clear()
+
+    @classmethod
+    def get_curve(cls, breed):
+        version = cls.current_version()
+        curve = cls._curves.get(breed)
+        if curve is not None and curve.version == version and time.monotonic() - curve.loaded_at < CURVE_LOCAL_TTL:
+            return curve
+
+        curve = BreedCurve(breed, version, cls._load_rows(breed))
+        with cls._lock:
+            cls._curves[breed] = curve
+        return curve
+
+    @classmethod
+    def get_point(cls, breed, age_days):
+        return cls.get_curve(breed).point(age_days)
+
+    @classmethod
+    def get_point_for_flock(cls, flock, date):
+        return cls.get_point(flock.breed, (date - flock.arrival_date).days)
+
+    @classmethod
+    def lookup_pairs(cls, pairs):
+        """Evalúa las curvas para muchos pares (flock, date) a la vez.
+
+        Devuelve CurveArrays con un valor por par, alineado con la entrada (NaN donde la
+        raza no tiene curva para esa edad). Cada raza se resuelve con una sola operación
+        vectorizada.
+        """
+        pairs = list(pairs)
+        ages = np.array([(date - flock.arrival_date).days for flock, date in pairs], dtype=np.int64)
+        breeds = np.array([flock.breed for flock, _ in pairs], dtype=object)
+        weight = np.full(ages.shape, np.nan)
+        consumption = np.full(ages.shape, np.nan)
+        tolerance = np.full(ages.shape, np.nan)
+
+        for breed in set(breeds.tolist()):
+            idx = np.flatnonzero(breeds == breed)
+            weight[idx], consumption[idx], tolerance[idx] = cls.get_curve(breed).lookup(ages[idx])
+
+        return CurveArrays(expected_weight=weight, expected_consumption=consumption, tolerance_range=tolerance)
+
+    @classmethod
+    def deviation_for_pairs(cls, pairs, weights):
+        """Porcentaje de desviación |peso - esperado| / esperado por par (NaN sin referencia)."""
+        expected = cls.lookup_pairs(pairs).expected_weight
+        weights = np.asarray([float(w) for w in weights], dtype=np.float64)
+        deviation = np.full(expected.shape, np.nan)
+        valid = expected > 0
+        deviation[valid] = np.abs(weights[valid] - expected[valid]) / expected[valid] * 100
+        return deviation
+
+    @staticmethod
+    def _load_rows(breed):
+        from .models import BreedReference
+
+        # Ordenado por versión ascendente: la última versión activa de cada edad gana
+        rows = {}
+        queryset = BreedReference.objects.filter(breed=breed, is_active=True).order_by('age_days', 'version')
+        for age_days, weight, consumption, tolerance in queryset.values_list(
+            'age_days', 'expected_weight', 'expected_consumption', 'tolerance_range'
+        ):
+            rows[age_days] = (age_days, float(weight), float(consumption or 0), float(tolerance))
+        return list(rows.values())
@@ -32,7 +32,7 @@ class BreedReferenceSerializer(serializers.ModelSerializer):
 class ReferenceImportLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReferenceImportLog
-        fields = ['id', 'file_name', 'imported_by', 'total_rows', 'successful_imports', 'updates', 'errors', 'error_details', 'created_at']
+        fields = ['id', 'file_name', 'imported_by', 'status', 'total_rows', 'processed_rows', 'successful_imports', 'updates', 'errors', 'error_details', 'created_at', 'updated_at']
         read_only_fields = fields
 from rest_framework import serializers
 from django.utils import timezone
@@ -152,3 +152,22 @@ class MortalityStatsSerializer(serializers.Serializer):
     worst_day = WorstDaySerializer(allow_null=True)
     period = serializers.CharField()
     series = serializers.ListField(child=serializers.DictField(), required=False)
+
+
+class GrowthParametersSerializer(serializers.Serializer):
+    asymptote = serializers.FloatField()
+    b = serializers.FloatField()
+    k = serializers.FloatField()
+
+
+class GrowthForecastSerializer(serializers.Serializer):
+    flock_id = serializers.IntegerField()
+    model = serializers.CharField()
+    available = serializers.BooleanField()
+    parameters = GrowthParametersSerializer(allow_null=True)
+    observations = serializers.IntegerField()
+    age_days = serializers.IntegerField()
+    projected_weight = serializers.DecimalField(max_digits=8, decimal_places=2, allow_null=True)
+    target_weight = serializers.DecimalField(max_digits=8, decimal_places=2, allow_null=True)
+    target_date = serializers.DateField(allow_null=True)
+    generated_at = serializers.DateTimeField()
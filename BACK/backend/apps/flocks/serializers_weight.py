@@ -69,6 +69,7 @@ class ShedDetailSerializer(serializers.Serializer):
     occupancy = ShedOccupancySerializer()
     flocks = ShedFlocksSummarySerializer()
     last_activity = serializers.DictField(child=serializers.CharField(allow_null=True), required=False)
+    alerts_count = serializers.IntegerField(required=False)
     status_indicator = serializers.DictField(child=serializers.CharField())
 
 
@@ -4,19 +4,38 @@ import datetime
 from typing import List
 
 from django.conf import settings
-from django.db import transaction
+from django.db import models, transaction
 from django.utils import timezone
 
 from openpyxl import load_workbook
 
 from .models import BreedReference, ReferenceImportLog
+from .reference_cache import BreedReferenceCache
+
+
+# Filas validadas y escritas por transacción durante la importación de referencias.
+IMPORT_CHUNK_SIZE = 1000
 
 
 class BreedReferenceService:
     """Servicios relacionados con la tabla BreedReference, incluyendo import desde Excel."""
 
     @staticmethod
-    def import_from_excel(file_path: str, imported_by) -> ReferenceImportLog:
+    def create_import_log(file_name: str, imported_by) -> ReferenceImportLog:
+        """Registra una importación pendiente (antes de que la tarea procese el archivo)."""
+        return ReferenceImportLog.objects.create(
+            file_name=file_name,
+            imported_by=imported_by,
+            total_rows=0,
+            successful_imports=0,
+            updates=0,
+            errors=0,
+            error_details=[],
+            status='PENDING',
+        )
+
+    @staticmethod
+    def import_from_excel(file_path: str, imported_by, log: ReferenceImportLog = None) -> ReferenceImportLog:
         """Importa una hoja de Excel con columnas esperadas y crea/actualiza referencias.
 
         Columnas requeridas: breed, age_days, expected_weight
@@ -26,196 +45,540 @@ class BreedReferenceService:
         - Para cada fila válida se crea una nueva versión (version = max_version + 1) y se marca is_active=True.
         - Las versiones previas para la misma (breed, age_days) se desactivan.
         - Registra el resultado en ReferenceImportLog con conteo de éxitos y errores.
-        """
 
-        wb = load_workbook(filename=file_path, data_only=True)
-        ws = wb.active
+        El libro se recorre en modo read-only y las filas se procesan por bloques de
+        IMPORT_CHUNK_SIZE: las versiones salen de un único mapa (breed, age_days) -> max_version
+        precargado y cada bloque se escribe con un UPDATE de desactivación y un bulk_create.
 
-        header = [str(cell.value).strip().lower() if cell.value is not None else '' for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-
-        required = ['breed', 'age_days', 'expected_weight']
-        col_map = {}
-        for idx, name in enumerate(header):
-            if name:
-                col_map[name] = idx + 1
+        Si se recibe `log` (creado por create_import_log) se reutiliza y se actualiza su
+        progreso (processed_rows, successful_imports, errors) tras cada bloque.
+        """
 
-        missing = [c for c in required if c not in col_map]
-        log = ReferenceImportLog.objects.create(
-            file_name=file_path.split('/')[-1] if '/' in file_path else file_path.split('\\')[-1],
-            imported_by=imported_by,
-            total_rows=0,
-            successful_imports=0,
-            updates=0,
-            errors=0,
-            error_details=[],
-        )
+        if log is None:
+            log = BreedReferenceService.create_import_log(
+                file_path.split('/')[-1] if '/' in file_path else file_path.split('\\')[-1],
+                imported_by,
+            )
 
-        if missing:
-            log.errors = 0
-            log.error_details = [f"missing columns: {missing}"]
-            log.save()
-            return log
-
-        total = 0
-        successes = 0
-        updates = 0
-        errors = 0
-        error_details: List[str] = []
-
-        for row in ws.iter_rows(min_row=2):
-            total += 1
-            try:
-                breed = row[col_map['breed'] - 1].value
-                age_days = row[col_map['age_days'] - 1].value
-                expected_weight = row[col_map['expected_weight'] - 1].value
-
-                if breed is None or age_days is None or expected_weight is None:
-                    raise ValueError('required field missing')
-
-                expected_consumption = None
-                if 'expected_consumption' in col_map:
-                    expected_consumption = row[col_map['expected_consumption'] - 1].value or 0
-
-                tolerance_range = None
-                if 'tolerance_range' in col_map:
-                    tolerance_range = row[col_map['tolerance_range'] - 1].value or 10.0
-
-                with transaction.atomic():
-                    # determine new version
-                    latest = BreedReference.objects.filter(breed=breed, age_days=int(age_days)).order_by('-version').first()
-                    new_version = 1
-                    if latest:
-                        new_version = latest.version + 1
-                        # deactivate previous versions
-                        BreedReference.objects.filter(breed=breed, age_days=int(age_days), is_active=True).update(is_active=False)
-
-                    br = BreedReference.objects.create(
-                        breed=str(breed),
-                        age_days=int(age_days),
-                        expected_weight=float(expected_weight),
-                        expected_consumption=float(expected_consumption or 0),
-                        tolerance_range=float(tolerance_range or 10.0),
-                        version=new_version,
-                        is_active=True,
-                        created_by=imported_by,
-                    )
-
-                successes += 1
-            except Exception as exc:  # pragma: no cover - exception paths logged
-                errors += 1
-                error_details.append(f'row {total+1}: {str(exc)}')
+        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+
+            header_row = next(rows, ()) or ()
+            header = [str(value).strip().lower() if value is not None else '' for value in header_row]
+
+            required = ['breed', 'age_days', 'expected_weight']
+            col_map = {}
+            for idx, name in enumerate(header):
+                if name:
+                    col_map[name] = idx
+
+            missing = [c for c in required if c not in col_map]
+            if missing:
+                log.errors = 0
+                log.error_details = [f"missing columns: {missing}"]
+                log.status = 'FAILED'
+                log.save()
+                return log
+
+            # Estimación para el progreso; el total definitivo se fija al terminar
+            log.status = 'PROCESSING'
+            log.total_rows = max((ws.max_row or 1) - 1, 0)
+            log.save(update_fields=['status', 'total_rows', 'updated_at'])
+
+            versions = BreedReferenceService._max_versions()
+
+            total = 0
+            successes = 0
+            updates = 0
+            errors = 0
+            error_details: List[str] = []
+            chunk = []
+
+            for row in rows:
+                total += 1
+                try:
+                    chunk.append((total + 1, BreedReferenceService._parse_row(row, col_map)))
+                except Exception as exc:
+                    errors += 1
+                    error_details.append(f'row {total+1}: {str(exc)}')
+
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    ok, failed = BreedReferenceService._write_chunk(chunk, versions, imported_by)
+                    successes += ok
+                    errors += len(failed)
+                    error_details.extend(failed)
+                    chunk = []
+                    BreedReferenceService._report_progress(log, total, successes, errors)
+
+            if chunk:
+                ok, failed = BreedReferenceService._write_chunk(chunk, versions, imported_by)
+                successes += ok
+                errors += len(failed)
+                error_details.extend(failed)
+        finally:
+            wb.close()
 
         log.total_rows = total
+        log.processed_rows = total
         log.successful_imports = successes
         log.updates = updates
         log.errors = errors
         log.error_details = error_details
+        log.status = 'COMPLETED'
         log.save()
 
+        if successes:
+            BreedReferenceCache.invalidate()
+
         return log
 
-from django.db import transaction, models
-from django.utils.dateparse import parse_date
+    @staticmethod
+    def _report_progress(log, processed, successes, errors):
+        ReferenceImportLog.objects.filter(pk=log.pk).update(
+            processed_rows=processed,
+            successful_imports=successes,
+            errors=errors,
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def _max_versions():
+        """Mapa (breed, age_days) -> última versión existente, en una sola consulta."""
+        queryset = BreedReference.objects.values('breed', 'age_days').annotate(max_version=models.Max('version'))
+        return {(r['breed'], r['age_days']): r['max_version'] for r in queryset}
+
+    @staticmethod
+    def _parse_row(row, col_map):
+        def value(name):
+            idx = col_map.get(name)
+            return row[idx] if idx is not None and idx < len(row) else None
+
+        breed = value('breed')
+        age_days = value('age_days')
+        expected_weight = value('expected_weight')
+
+        if breed is None or age_days is None or expected_weight is None:
+            raise ValueError('required field missing')
+
+        expected_consumption = None
+        if 'expected_consumption' in col_map:
+            expected_consumption = value('expected_consumption') or 0
+
+        tolerance_range = None
+        if 'tolerance_range' in col_map:
+            tolerance_range = value('tolerance_range') or 10.0
+
+        # Validar contra los campos del modelo para que bulk_create no falle por una sola fila
+        fields = BreedReference._meta
+        return {
+            'breed': fields.get_field('breed').clean(str(breed), None),
+            'age_days': fields.get_field('age_days').clean(int(age_days), None),
+            'expected_weight': fields.get_field('expected_weight').clean(float(expected_weight), None),
+            'expected_consumption': fields.get_field('expected_consumption').clean(float(expected_consumption or 0), None),
+            'tolerance_range': fields.get_field('tolerance_range').clean(float(tolerance_range or 10.0), None),
+        }
+
+    @staticmethod
+    def _write_chunk(chunk, versions, imported_by):
+        """Aplica un bloque de filas validadas. Devuelve (éxitos, detalles de error)."""
+        new_refs = []
+        latest = {}
+        for _, data in chunk:
+            key = (data['breed'], data['age_days'])
+            versions[key] = versions.get(key, 0) + 1
+            ref = BreedReference(version=versions[key], is_active=True, created_by=imported_by, **data)
+            # Si la misma (breed, age_days) se repite en el bloque solo la última queda activa
+            if key in latest:
+                latest[key].is_active = False
+            latest[key] = ref
+            new_refs.append(ref)
+
+        ages_by_breed = {}
+        for breed, age_days in latest:
+            ages_by_breed.setdefault(breed, set()).add(age_days)
+        previous = models.Q()
+        for breed, ages in ages_by_breed.items():
+            previous |= models.Q(breed=breed, age_days__in=ages)
+
+        try:
+            with transaction.atomic():
+                BreedReference.objects.filter(previous, is_active=True).update(is_active=False)
+                BreedReference.objects.bulk_create(new_refs)
+        except Exception as exc:
+            for ref in new_refs:
+                versions[(ref.breed, ref.age_days)] -= 1
+            return 0, [f'row {row_number}: {str(exc)}' for row_number, _ in chunk]
+
+        return len(new_refs), []
+
+
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction, models
 from django.utils import timezone
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 
+from apps.farms.models import Shed
+from apps.sync.change_log import ChangeLog
+from apps.sync.services import IdempotencyService
+
+from .dashboard_cache import DashboardCache
 from .models import MortalityRecord, MortalityCause, Flock
 
+# Sello por lote: cambia en cada escritura de MortalityRecord e invalida todas las ventanas cacheadas
+MORTALITY_STATS_VERSION_KEY = 'flocks:mortality_stats:{flock_id}:version'
+MORTALITY_STATS_TTL = 600
+
 
 class MortalityService:
     @staticmethod
-    def register_mortality_batch(mortality_records, user):
-        """Registra múltiples mortalidades en batch (para sync offline)"""
-        results = []
+    def register_mortality_batch(mortality_records, user, device_id=None):
+        """Registra múltiples mortalidades en batch (para sync offline).
+
+        Los client_id que el dispositivo ya sincronizó devuelven su resultado original sin
+        volver a sumar la mortalidad (reintentos de un lote cuya respuesta se perdió).
+        """
+        return IdempotencyService.run(
+            'mortality',
+            IdempotencyService.device_key(device_id, user),
+            mortality_records,
+            lambda records: MortalityService._register_batch(records, user)
+        )
+
+    @staticmethod
+    def _register_batch(mortality_records, user):
+        """Registra un lote de mortalidades nuevas.
+
+        Precarga lotes (con su galpón), registros existentes y causas en pocas consultas,
+        bloquea los lotes en orden de id (dos dispositivos sincronizando a la vez no pueden
+        bloquearse mutuamente), valida cada registro en memoria contra la cantidad disponible
+        del lote y persiste todo con bulk_create / bulk_update y un único UPDATE de los lotes.
+        Los resultados por client_id mantienen el mismo formato que el camino por registro.
+        """
+        results = [None] * len(mortality_records)
 
         with transaction.atomic():
-            for record_data in mortality_records:
+            parsed = []
+            for idx, record_data in enumerate(mortality_records):
                 try:
-                    result = MortalityService._process_single_mortality(record_data, user)
-                    results.append(result)
+                    parsed.append((idx, record_data, MortalityService._parse_mortality(record_data)))
                 except Exception as e:
-                    results.append({
+                    results[idx] = MortalityService._mortality_error(record_data, e)
+
+            flock_ids = sorted({p['flock_id'] for _, _, p in parsed})
+            locking = Flock.objects.select_for_update(
+                of=('self',) if connection.features.has_select_for_update_of else ()
+            )
+            flocks = {
+                f.id: f for f in locking.select_related('shed').filter(id__in=flock_ids).order_by('id')
+            }
+            existing = {
+                (r.flock_id, r.date): r for r in MortalityRecord.objects.filter(
+                    flock_id__in=flock_ids, date__in={p['date'] for _, _, p in parsed}
+                )
+            } if flock_ids else {}
+            causes = MortalityService._causes_by_name(
+                {p['cause_name'] for _, _, p in parsed if p['cause_name']}
+            )
+
+            role_name = getattr(getattr(user, 'role', None), 'name', None)
+            available = {flock_id: flock.current_quantity for flock_id, flock in flocks.items()}
+            to_create = {}
+            to_update = {}
+            # (idx, resultado, registro) para completar server_id tras persistir
+            pending = []
+
+            for idx, record_data, p in parsed:
+                try:
+                    flock = flocks.get(p['flock_id'])
+                    if flock is None:
+                        raise Flock.DoesNotExist('Flock matching query does not exist.')
+
+                    # Validar permisos (Galponero solo en sus galpones)
+                    if role_name == 'Galponero' and flock.shed.assigned_worker_id != user.id:
+                        raise PermissionError("No tienes permisos para registrar mortalidad en este galpón")
+
+                    key = (flock.id, p['date'])
+                    current = to_create.get(key) or existing.get(key)
+                    deaths = p['deaths']
+
+                    if current is not None:
+                        # Sumar mortalidad al registro existente del mismo día
+                        if deaths > available[flock.id]:
+                            raise ValidationError("La mortalidad total excede la cantidad del lote")
+                        current.deaths += deaths
+                        if current.pk:
+                            to_update[key] = current
+                        action = 'updated'
+                    else:
+                        if deaths > available[flock.id]:
+                            raise ValidationError(
+                                f"Mortalidad ({deaths}) excede cantidad actual del lote ({available[flock.id]})"
+                            )
+                        current = MortalityRecord(
+                            flock=flock,
+                            date=p['date'],
+                            deaths=deaths,
+                            cause=causes.get(p['cause_name']),
+                            temperature=p['temperature'],
+                            notes=p['notes'],
+                            recorded_by=user,
+                            client_id=p['client_id'],
+                            created_by_device=p['device_id']
+                        )
+                        to_create[key] = current
+                        action = 'created'
+
+                    available[flock.id] -= deaths
+                    result = {
                         'client_id': record_data.get('client_id'),
-                        'status': 'error',
-                        'error': str(e)
-                    })
+                        'status': 'success',
+                        'action': action,
+                        'server_id': current.pk
+                    }
+                    pending.append((idx, result, current))
+                    results[idx] = result
+                except Exception as e:
+                    results[idx] = MortalityService._mortality_error(record_data, e)
+
+            created = list(to_create.values())
+            MortalityService._persist_mortality(created, list(to_update.values()))
+            for idx, result, record in pending:
+                result['server_id'] = record.pk
+
+            decrements = {
+                flock_id: flocks[flock_id].current_quantity - left
+                for flock_id, left in available.items()
+                if flocks[flock_id].current_quantity != left
+            }
+            MortalityService._apply_flock_decrements(flocks, decrements)
+            MortalityService._after_mortality_writes(flocks, list(to_create) + list(to_update), decrements)
+
+        # Verificar alarmas de los registros nuevos (fuera de la transacción, como en save())
+        try:
+            MortalityService._check_mortality_alarms_batch(created, flocks)
+        except Exception:
+            # no dejar que una falla en alarmas rompa la sincronización
+            pass
 
         return results
 
     @staticmethod
-    def _process_single_mortality(record_data, user):
-        flock = Flock.objects.get(id=record_data['flock_id'])
-        date = parse_date(record_data['date'])
-        deaths = int(record_data['deaths'])
+    def _parse_mortality(record_data):
+        # Todo valor que llega al bulk_create se valida aquí: un registro inválido queda
+        # como error propio en lugar de abortar el lote completo
+        clean = MortalityService._clean
+        cause_name = record_data.get('cause_name')
+        return {
+            'flock_id': int(record_data['flock_id']),
+            'date': clean(MortalityRecord, 'date', record_data['date']),
+            'deaths': clean(MortalityRecord, 'deaths', record_data['deaths']),
+            'cause_name': clean(MortalityCause, 'name', cause_name) if cause_name else None,
+            'temperature': clean(MortalityRecord, 'temperature', record_data.get('temperature')),
+            'notes': clean(MortalityRecord, 'notes', record_data.get('notes') or ''),
+            'client_id': clean(MortalityRecord, 'client_id', record_data.get('client_id')),
+            'device_id': clean(MortalityRecord, 'created_by_device', record_data.get('device_id')),
+        }
 
-        # Validar permisos (Galponero solo en sus galpones)
-        role_name = getattr(getattr(user, 'role', None), 'name', None)
-        if role_name == 'Galponero' and flock.shed.assigned_worker != user:
-            raise PermissionError("No tienes permisos para registrar mortalidad en este galpón")
+    @staticmethod
+    def _clean(model, name, value):
+        """Convierte y valida `value` con el campo `name` del modelo"""
+        try:
+            return model._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            raise ValueError(f"{name}: {'; '.join(e.messages)}")
 
-        # Verificar duplicado del mismo día (sumar si existe)
-        existing = MortalityRecord.objects.filter(flock=flock, date=date).first()
+    @staticmethod
+    def _mortality_error(record_data, exc):
+        return {
+            'client_id': record_data.get('client_id') if isinstance(record_data, dict) else None,
+            'status': 'error',
+            'error': str(exc)
+        }
 
-        if existing:
-            # Sumar mortalidad al registro existente
-            total_deaths = existing.deaths + deaths
-            if total_deaths > (flock.current_quantity + existing.deaths):
-                raise ValidationError("La mortalidad total excede la cantidad del lote")
+    @staticmethod
+    def _causes_by_name(names):
+        """Resuelve (creando las que falten) las causas de mortalidad de todo el lote"""
+        if not names:
+            return {}
+        causes = {c.name: c for c in MortalityCause.objects.filter(name__in=names)}
+        missing = names - set(causes)
+        if missing:
+            MortalityCause.objects.bulk_create(
+                [MortalityCause(name=name, category='OTHER') for name in missing],
+                ignore_conflicts=True
+            )
+            causes.update({c.name: c for c in MortalityCause.objects.filter(name__in=missing)})
+        return causes
 
-            existing.deaths = total_deaths
-            existing.save()  # Trigger actualización automática
+    @staticmethod
+    def _persist_mortality(to_create, to_update):
+        if to_create:
+            MortalityRecord.objects.bulk_create(to_create)
+            missing = [r for r in to_create if r.pk is None]
+            if missing:
+                # Backends sin RETURNING (MySQL): recuperar ids por (flock, date)
+                ids = {
+                    (flock_id, date): pk for pk, flock_id, date in MortalityRecord.objects.filter(
+                        flock_id__in={r.flock_id for r in missing}, date__in={r.date for r in missing}
+                    ).values_list('id', 'flock_id', 'date')
+                }
+                for r in missing:
+                    r.pk = ids.get((r.flock_id, r.date))
+        if to_update:
+            now = timezone.now()
+            for r in to_update:
+                r.updated_at = now
+            MortalityRecord.objects.bulk_update(to_update, ['deaths', 'updated_at'])
+        ChangeLog.touch('mortality', [r.pk for r in list(to_create) + list(to_update)])
 
-            return {
-                'client_id': record_data.get('client_id'),
-                'status': 'success',
-                'action': 'updated',
-                'server_id': existing.id
-            }
+    @staticmethod
+    def _apply_flock_decrements(flocks, decrements):
+        """Descuenta las muertes sumadas por lote con un solo UPDATE y ajusta la ocupación del galpón"""
+        if not decrements:
+            return
+        Flock.objects.filter(id__in=list(decrements)).update(
+            current_quantity=models.Case(
+                *[models.When(id=flock_id, then=models.F('current_quantity') - deaths)
+                  for flock_id, deaths in decrements.items()],
+                output_field=models.PositiveIntegerField(),
+            ),
+            updated_at=timezone.now()
+        )
 
-        # Crear nuevo registro
-        cause = None
-        if record_data.get('cause_name'):
-            cause, _ = MortalityCause.objects.get_or_create(
-                name=record_data['cause_name'],
-                defaults={'category': 'OTHER'}
-            )
+        by_shed = defaultdict(int)
+        for flock_id, deaths in decrements.items():
+            flock = flocks[flock_id]
+            flock.current_quantity -= deaths
+            if flock.status == 'ACTIVE':
+                by_shed[flock.shed_id] += deaths
+        for shed_id, deaths in by_shed.items():
+            Shed.adjust_occupancy(shed_id, -deaths)
+        ChangeLog.touch('flock', decrements)
 
-        mortality_record = MortalityRecord.objects.create(
-            flock=flock,
-            date=date,
-            deaths=deaths,
-            cause=cause,
-            temperature=record_data.get('temperature'),
-            notes=record_data.get('notes', ''),
-            recorded_by=user,
-            client_id=record_data.get('client_id'),
-            created_by_device=record_data.get('device_id')
+    @staticmethod
+    def _after_mortality_writes(flocks, keys, decrements):
+        """Mantener resúmenes diarios, estadísticas y dashboard de los lotes tocados"""
+        if not keys:
+            return
+        from .services_snapshot import FlockSnapshotService
+
+        FlockSnapshotService.refresh_pairs(keys)
+        first_dates = {}
+        for flock_id, date in keys:
+            first_dates[flock_id] = min(date, first_dates.get(flock_id, date))
+        FlockSnapshotService.refresh_following_live_birds_many(
+            {flock_id: date for flock_id, date in first_dates.items() if flock_id in decrements}
         )
+        for flock_id in first_dates:
+            MortalityService.invalidate_mortality_stats(flock_id)
+        DashboardCache.bump_sheds({flocks[flock_id].shed_id for flock_id in first_dates})
 
-        return {
-            'client_id': record_data.get('client_id'),
-            'status': 'success',
-            'action': 'created',
-            'server_id': mortality_record.id
+    @staticmethod
+    def _check_mortality_alarms_batch(records, flocks):
+        """Versión en bloque de MortalityRecord._check_mortality_alarms: una consulta de
+        configuraciones por todas las granjas y un bulk_create de las alarmas"""
+        from apps.alarms.models import AlarmConfiguration, Alarm
+
+        if not records:
+            return
+        configs = {
+            c.farm_id: c for c in AlarmConfiguration.objects.filter(
+                alarm_type='MORTALITY',
+                farm_id__in={flocks[r.flock_id].shed.farm_id for r in records},
+                is_active=True
+            )
         }
 
+        alarms = []
+        for record in records:
+            flock = flocks[record.flock_id]
+            config = configs.get(flock.shed.farm_id)
+            original_quantity = flock.current_quantity + record.deaths
+            if config is None or original_quantity == 0:
+                continue
+
+            daily_mortality_rate = (record.deaths / original_quantity) * 100
+            if daily_mortality_rate >= config.threshold_value:
+                critical = getattr(config, 'critical_threshold', None) or config.threshold_value * 2
+                alarms.append(Alarm(
+                    alarm_type='MORTALITY',
+                    description=f'Mortalidad alta en {flock.shed.name}: {daily_mortality_rate:.1f}% (umbral: {config.threshold_value}%)',
+                    priority='HIGH' if daily_mortality_rate >= critical else 'MEDIUM',
+                    farm_id=flock.shed.farm_id,
+                    shed_id=flock.shed_id,
+                    flock=flock,
+                    configuration=config,
+                    source_type='mortality',
+                    source_date=record.date,
+                    source_id=record.pk,
+                ))
+        if alarms:
+            Alarm.objects.bulk_create(alarms)
+            ChangeLog.touch('alarm', [alarm.pk for alarm in alarms])
+
     @staticmethod
     def calculate_mortality_stats(flock, days=7):
-        """Calcula estadísticas de mortalidad de un lote"""
-        from datetime import timedelta
+        """Calcula estadísticas de mortalidad de un lote (cacheadas por lote y ventana)"""
         end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=days - 1)
+        key = MortalityService._stats_cache_key(flock, days, end_date)
 
-        # Get records in the range
-        mortality_records = flock.mortality_records.filter(date__range=[start_date, end_date])
+        stats = cache.get(key)
+        if stats is None:
+            stats = MortalityService._build_mortality_stats(flock, days, end_date)
+            cache.set(key, stats, MORTALITY_STATS_TTL)
+        return stats
 
-        total_deaths = mortality_records.aggregate(total=models.Sum('deaths'))['total'] or 0
+    @staticmethod
+    def invalidate_mortality_stats(flock_id):
+        """Descarta las estadísticas cacheadas del lote (ahora y al confirmar la transacción)"""
+        key = MORTALITY_STATS_VERSION_KEY.format(flock_id=flock_id)
+
+        def bump():
+            cache.set(key, uuid.uuid4().hex, timeout=None)
+
+        bump()
+        transaction.on_commit(bump)
 
-        # Build a daily series (one entry per day in the range)
+    @staticmethod
+    def _stats_cache_key(flock, days, end_date):
+        version_key = MORTALITY_STATS_VERSION_KEY.format(flock_id=flock.pk)
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(version_key)
+        # initial_quantity forma parte de la clave porque las tasas dependen de ella
+        return f'flocks:mortality_stats:{flock.pk}:{version}:{days}:{end_date.isoformat()}:{flock.initial_quantity}'
+
+    @staticmethod
+    def _build_mortality_stats(flock, days, end_date):
+        start_date = end_date - timedelta(days=days - 1)
+
+        # Una sola consulta agrupada por fecha; (flock, date) es único, así que cada
+        # grupo corresponde a un registro y su id identifica el peor día
+        by_date = {
+            row['date']: row
+            for row in flock.mortality_records.filter(date__range=[start_date, end_date])
+            .values('date')
+            .annotate(total=models.Sum('deaths'), record_id=models.Max('id'))
+        }
+
+        total_deaths = 0
+        worst_day = None
         series = []
         for i in range(days):
             day = start_date + timedelta(days=i)
-            day_deaths = mortality_records.filter(date=day).aggregate(total=models.Sum('deaths'))['total'] or 0
+            row = by_date.get(day)
+            day_deaths = row['total'] if row else 0
+            total_deaths += day_deaths
+            if row and (worst_day is None or day_deaths > worst_day['deaths']):
+                worst_day = {'id': row['record_id'], 'date': day.isoformat(), 'deaths': int(day_deaths)}
+
             day_rate = (day_deaths / flock.initial_quantity) * 100 if flock.initial_quantity else 0
             series.append({
                 'date': day.isoformat(),
@@ -229,7 +592,7 @@ class MortalityService:
             'total_deaths': int(total_deaths),
             'mortality_rate': float((total_deaths / flock.initial_quantity) * 100) if flock.initial_quantity else 0.0,
             'daily_average': float(total_deaths / days) if days else 0.0,
-            'worst_day': mortality_records.order_by('-deaths').first(),
+            'worst_day': worst_day,
             'period': f'{start_date} - {end_date}',
             'series': series,
         }
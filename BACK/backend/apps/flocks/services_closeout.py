@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import DailyWeightRecord, Flock, FlockSummary, MortalityRecord
+
+CLOSED_STATUSES = ('SOLD', 'FINISHED', 'TRANSFERRED')
+
+
+class FlockCloseoutService:
+    """Calcula el FlockSummary de los lotes que dejan ACTIVE.
+
+    Los totales de vida (días, mortalidad, peso final, alimento y conversión) se obtienen
+    con un número fijo de consultas agrupadas para todos los lotes pedidos y se guardan una
+    sola vez; un lote que ya tiene cierre no se recalcula.
+    """
+
+    @staticmethod
+    def schedule(flock_ids):
+        """Encola el cierre de los lotes para ejecutarse tras el commit del cambio de estado"""
+        flock_ids = sorted({fid for fid in flock_ids if fid is not None})
+        if not flock_ids:
+            return
+        from .tasks import close_out_flocks_task
+
+        transaction.on_commit(lambda: close_out_flocks_task.delay(flock_ids), robust=True)
+
+    @staticmethod
+    def close_out(flock_ids=None):
+        """Crea el cierre de los lotes cerrados sin FlockSummary (todos si flock_ids es None)"""
+        from apps.inventory.models import FoodConsumptionRecord
+
+        flocks = Flock.objects.filter(status__in=CLOSED_STATUSES, summary__isnull=True)
+        if flock_ids is not None:
+            flocks = flocks.filter(id__in=flock_ids)
+        last_weight = DailyWeightRecord.objects.filter(flock=models.OuterRef('pk')).order_by('-date')
+        flocks = list(flocks.annotate(
+            final_weight=models.Subquery(last_weight.values('average_weight')[:1])
+        ))
+        if not flocks:
+            return []
+
+        ids = [flock.id for flock in flocks]
+        mortality = FlockCloseoutService._totals(MortalityRecord.objects.filter(flock_id__in=ids), 'deaths')
+        feed = FlockCloseoutService._totals(
+            FoodConsumptionRecord.objects.filter(flock_id__in=ids), 'quantity_consumed'
+        )
+        weights = {
+            row['flock_id']: (row['average'], row['records'])
+            for row in DailyWeightRecord.objects.filter(flock_id__in=ids).values('flock_id').annotate(
+                average=models.Avg('average_weight'), records=models.Count('id')
+            )
+        }
+
+        summaries = [
+            FlockCloseoutService._build(
+                flock, mortality.get(flock.id, (0, 0)), feed.get(flock.id, (Decimal('0'), 0)),
+                weights.get(flock.id, (None, 0))
+            )
+            for flock in flocks
+        ]
+        # Si otro proceso cerró el mismo lote primero, su fila se conserva
+        FlockSummary.objects.bulk_create(summaries, ignore_conflicts=True)
+        return summaries
+
+    @staticmethod
+    def _totals(queryset, field):
+        """{flock_id: (suma de field, registros)} con una consulta agrupada"""
+        return {
+            row['flock_id']: (row['total'], row['records'])
+            for row in queryset.values('flock_id').annotate(total=models.Sum(field), records=models.Count('id'))
+        }
+
+    @staticmethod
+    def _build(flock, mortality, feed, weights):
+        # updated_at refleja el guardado que cambió el estado
+        closed_on = timezone.localtime(flock.updated_at).date()
+        total_mortality, mortality_records = mortality
+        total_feed, feed_records = feed
+        average_weight, weight_records = weights
+        initial_weight = Decimal(flock.initial_weight)
+        final_weight = flock.final_weight
+
+        weight_gain = fcr = None
+        if final_weight is not None:
+            # Biomasa final menos biomasa inicial, de gramos a kg
+            weight_gain = (flock.current_quantity * final_weight - flock.initial_quantity * initial_weight) / 1000
+            weight_gain = weight_gain.quantize(Decimal('0.01'))
+            if weight_gain > 0 and feed_records:
+                fcr = (Decimal(total_feed) / weight_gain).quantize(Decimal('0.001'))
+
+        mortality_rate = Decimal('0')
+        if flock.initial_quantity:
+            mortality_rate = (Decimal(total_mortality) * 100 / flock.initial_quantity).quantize(Decimal('0.01'))
+
+        return FlockSummary(
+            flock=flock,
+            closing_status=flock.status,
+            arrival_date=flock.arrival_date,
+            closed_on=closed_on,
+            days=max((closed_on - flock.arrival_date).days, 0),
+            initial_quantity=flock.initial_quantity,
+            final_quantity=flock.current_quantity,
+            total_mortality=total_mortality,
+            mortality_records=mortality_records,
+            mortality_rate=mortality_rate,
+            initial_weight=initial_weight,
+            final_weight=final_weight,
+            average_weight=None if average_weight is None else Decimal(average_weight).quantize(Decimal('0.01')),
+            weight_records=weight_records,
+            total_feed_kg=total_feed,
+            feed_records=feed_records,
+            weight_gain_kg=weight_gain,
+            fcr=fcr,
+        )
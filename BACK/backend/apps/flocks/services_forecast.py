@@ -0,0 +1,260 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import DailyWeightRecord, Flock
+from .reference_cache import BreedReferenceCache, as_decimal
+
+FORECAST_KEY = 'flocks:forecast:{flock_id}'
+# Vida máxima de un ajuste en caché; se descarta antes si llega un nuevo pesaje.
+FORECAST_TTL = 86400
+
+# Peso total de los puntos de la curva de referencia frente a las observaciones
+# (equivale a PRIOR_STRENGTH pesajes reales): con pocos datos manda la referencia.
+PRIOR_STRENGTH = 3.0
+# Candidatos de asíntota como múltiplos del mayor peso conocido del lote (a los 20 días
+# un pollo de engorde puede estar a menos de 1/8 de su peso asintótico).
+ASYMPTOTE_RATIOS = np.geomspace(1.02, 20.0, 120)
+# Paso entre candidatos de la rejilla gruesa (la fina lo cubre a ambos lados).
+ASYMPTOTE_STEP = float(ASYMPTOTE_RATIOS[1] / ASYMPTOTE_RATIOS[0])
+MIN_POINTS = 3
+# Rango aceptado para las consultas: edad proyectada en días y peso objetivo (gramos) que
+# cabe en GrowthForecastSerializer (max_digits=8, decimal_places=2).
+MAX_FORECAST_AGE = 365
+MAX_TARGET_WEIGHT = Decimal('999999.99')
+# math.exp desborda por encima de ~709.78
+MAX_EXPONENT = 700.0
+
+
+class GrowthCurve:
+    """Curva de Gompertz ajustada para un lote: W(t) = A * exp(-b * exp(-k * t)), t en días."""
+
+    def __init__(self, flock_id, arrival_date, asymptote, b, k, observations):
+        self.flock_id = flock_id
+        self.arrival_date = arrival_date
+        self.asymptote = asymptote
+        self.b = b
+        self.k = k
+        self.observations = observations
+
+    def weight_at(self, age_days):
+        # Exponentes acotados: edades negativas extremas tienden a 0 en lugar de desbordar
+        inner = math.exp(min(-self.k * age_days, MAX_EXPONENT))
+        return self.asymptote * math.exp(min(-self.b * inner, MAX_EXPONENT))
+
+    def age_for_weight(self, weight):
+        """Edad (días, fraccional) en la que se alcanza `weight`; None si supera la asíntota o no es finito"""
+        if not math.isfinite(weight) or weight <= 0 or weight >= self.asymptote:
+            return None
+        return -math.log(-math.log(weight / self.asymptote) / self.b) / self.k
+
+
+class GrowthForecastService:
+    """Predicción de crecimiento por lote con un modelo de Gompertz.
+
+    Cada lote se ajusta con su historial de DailyWeightRecord (más el peso inicial
+    en el día 0) junto con los puntos de la curva BreedReference de su raza como
+    observaciones a priori de menor peso. Todos los lotes se ajustan a la vez: para
+    una rejilla de asíntotas se linealiza el modelo (ln(-ln(W/A)) = ln b - k t) y se
+    resuelve la regresión ponderada de todos los lotes con operaciones de NumPy,
+    quedándose con la asíntota de menor error en la escala original.
+    """
+
+    @staticmethod
+    def fit_flocks(flocks):
+        """Ajusta las curvas de varios lotes en un solo cálculo. Devuelve {flock_id: GrowthCurve | None}"""
+        flocks = list(flocks)
+        if not flocks:
+            return {}
+
+        history = defaultdict(list)
+        for flock_id, date, weight in DailyWeightRecord.objects.filter(
+            flock_id__in=[f.id for f in flocks]
+        ).values_list('flock_id', 'date', 'average_weight').order_by('flock_id', 'date'):
+            history[flock_id].append((date, float(weight)))
+
+        series = []
+        for flock in flocks:
+            ages = [0]
+            weights = [float(flock.initial_weight)]
+            for date, weight in history[flock.id]:
+                ages.append((date - flock.arrival_date).days)
+                weights.append(weight)
+            sample = [1.0] * len(ages)
+            observations = len(ages)
+
+            curve = BreedReferenceCache.get_curve(flock.breed)
+            if len(curve):
+                ref_ages = curve.known_ages
+                ages.extend(ref_ages.tolist())
+                weights.extend(curve.weight[ref_ages].tolist())
+                sample.extend([PRIOR_STRENGTH / len(ref_ages)] * len(ref_ages))
+
+            series.append((ages, weights, sample, observations))
+
+        params = GrowthForecastService._fit_gompertz(series)
+
+        curves = {}
+        for flock, (ages, _, _, observations), fitted in zip(flocks, series, params):
+            curves[flock.id] = None if fitted is None else GrowthCurve(
+                flock_id=flock.id,
+                arrival_date=flock.arrival_date,
+                asymptote=fitted[0],
+                b=fitted[1],
+                k=fitted[2],
+                observations=observations,
+            )
+        return curves
+
+    @staticmethod
+    def _fit_gompertz(series):
+        """Ajuste vectorizado: series = [(edades, pesos, pesos_muestrales, n_obs)] -> [(A, b, k) | None]"""
+        size = max(len(ages) for ages, _, _, _ in series)
+        count = len(series)
+
+        t = np.zeros((count, size))
+        w = np.ones((count, size))
+        s = np.zeros((count, size))
+        for row, (ages, weights, sample, _) in enumerate(series):
+            n = len(ages)
+            t[row, :n] = ages
+            w[row, :n] = weights
+            s[row, :n] = sample
+
+        valid_points = (s > 0) & (w > 0)
+        s = np.where(valid_points, s, 0.0)
+        w = np.where(valid_points, w, 1.0)
+        enough = (valid_points.sum(axis=1) >= MIN_POINTS) & (np.ptp(np.where(valid_points, t, 0), axis=1) > 0)
+
+        # Rejilla gruesa de asíntotas y luego una fina alrededor de la mejor de cada lote
+        A = (w * valid_points).max(axis=1)[:, None] * ASYMPTOTE_RATIOS[None, :]
+        b, k, sse = GrowthForecastService._solve_grid(t, w, s, A)
+        best = A[np.arange(count), sse.argmin(axis=1)]
+        A = best[:, None] * np.geomspace(1 / ASYMPTOTE_STEP, ASYMPTOTE_STEP, 41)[None, :]
+        A = np.maximum(A, (w * valid_points).max(axis=1)[:, None] * ASYMPTOTE_RATIOS[0])
+        b, k, sse = GrowthForecastService._solve_grid(t, w, s, A)
+        best = sse.argmin(axis=1)
+
+        result = []
+        for row in range(count):
+            col = best[row]
+            if not enough[row] or not np.isfinite(sse[row, col]):
+                result.append(None)
+                continue
+            result.append((float(A[row, col]), float(b[row, col]), float(k[row, col])))
+        return result
+
+    @staticmethod
+    def _solve_grid(t, w, s, A):
+        """Regresión ponderada de ln(-ln(W/A)) sobre t para cada (lote, asíntota) de la rejilla A.
+
+        Devuelve b, k y el error cuadrático ponderado en la escala original, de forma (lotes, rejilla).
+        """
+        # (flocks, grid, points)
+        sw = s[:, None, :]
+        tt = t[:, None, :]
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            z = np.log(-np.log(w[:, None, :] / A[:, :, None]))
+            S = sw.sum(axis=2)
+            St = (sw * tt).sum(axis=2)
+            Stt = (sw * tt * tt).sum(axis=2)
+            Sz = (sw * z).sum(axis=2)
+            Stz = (sw * tt * z).sum(axis=2)
+
+            slope = (S * Stz - St * Sz) / (S * Stt - St ** 2)
+            intercept = (Sz - slope * St) / S
+            k = -slope
+            b = np.exp(intercept)
+            predicted = A[:, :, None] * np.exp(-b[:, :, None] * np.exp(-k[:, :, None] * tt))
+            sse = (sw * (predicted - w[:, None, :]) ** 2).sum(axis=2)
+
+        sse = np.where(np.isfinite(sse) & (k > 0) & np.isfinite(b), sse, np.inf)
+        return b, k, sse
+
+    @staticmethod
+    def refresh_active_forecasts():
+        """Ajusta todos los lotes activos en un lote de cálculo y deja cada curva en caché"""
+        version = BreedReferenceCache.current_version()
+        curves = GrowthForecastService.fit_flocks(Flock.objects.filter(status='ACTIVE'))
+        cache.set_many(
+            {FORECAST_KEY.format(flock_id=flock_id): (version, curve) for flock_id, curve in curves.items()},
+            FORECAST_TTL,
+        )
+        return sum(1 for curve in curves.values() if curve is not None)
+
+    @staticmethod
+    def get_curve(flock):
+        """Curva del lote desde caché; se reajusta si no hay entrada o cambió la tabla de referencia.
+
+        La entrada guarda (sello de referencias, curva) para cachear también los lotes sin
+        datos suficientes (curva None).
+        """
+        key = FORECAST_KEY.format(flock_id=flock.id)
+        version = BreedReferenceCache.current_version()
+        cached = cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        curve = GrowthForecastService.fit_flocks([flock])[flock.id]
+        cache.set(key, (version, curve), FORECAST_TTL)
+        return curve
+
+    @staticmethod
+    def invalidate(flock_ids):
+        cache.delete_many([FORECAST_KEY.format(flock_id=flock_id) for flock_id in set(flock_ids)])
+
+    @staticmethod
+    def projected_weight(flock, age_days):
+        """Peso proyectado (gramos) del lote a la edad indicada"""
+        curve = GrowthForecastService.get_curve(flock)
+        if curve is None:
+            return None
+        return as_decimal(curve.weight_at(age_days))
+
+    @staticmethod
+    def expected_date_for_weight(flock, target_weight):
+        """Fecha estimada en la que el lote alcanza `target_weight` (gramos)"""
+        curve = GrowthForecastService.get_curve(flock)
+        if curve is None:
+            return None
+        age = curve.age_for_weight(float(target_weight))
+        if age is None:
+            return None
+        return flock.arrival_date + timedelta(days=math.ceil(age))
+
+    @staticmethod
+    def forecast(flock, age_days=None, target_weight=None):
+        """Resumen de la predicción para la API"""
+        curve = GrowthForecastService.get_curve(flock)
+        if age_days is None:
+            age_days = flock.current_age_days
+
+        data = {
+            'flock_id': flock.id,
+            'model': 'gompertz',
+            'available': curve is not None,
+            'parameters': None,
+            'observations': 0,
+            'age_days': age_days,
+            'projected_weight': None,
+            'target_weight': target_weight,
+            'target_date': None,
+            'generated_at': timezone.now().isoformat(),
+        }
+        if curve is None:
+            return data
+
+        data['parameters'] = {'asymptote': curve.asymptote, 'b': curve.b, 'k': curve.k}
+        data['observations'] = curve.observations
+        data['projected_weight'] = as_decimal(curve.weight_at(age_days))
+        if target_weight is not None:
+            age = curve.age_for_weight(float(target_weight))
+            if age is not None:
+                data['target_date'] = flock.arrival_date + timedelta(days=math.ceil(age))
+        return data
@@ -0,0 +1,190 @@
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DailyWeightRecord, Flock, FlockDailySnapshot, MortalityRecord
+
+SNAPSHOT_UPDATE_FIELDS = [
+    'live_birds', 'deaths', 'average_weight', 'expected_weight',
+    'deviation_percentage', 'feed_kg', 'updated_at'
+]
+
+
+class FlockSnapshotService:
+    """Mantiene FlockDailySnapshot a partir de los registros fuente del lote.
+
+    Cada escritura de peso, mortalidad o consumo recalcula solo las filas
+    (flock, date) afectadas con un número fijo de consultas agrupadas y las
+    persiste con un upsert. Una mortalidad además ajusta las aves vivas de los
+    días posteriores del mismo lote.
+    """
+
+    @staticmethod
+    def refresh(flock_id, date, mortality_changed=False):
+        """Recalcula el resumen de un lote en una fecha"""
+        FlockSnapshotService.refresh_pairs([(flock_id, date)])
+        if mortality_changed:
+            FlockSnapshotService.refresh_following_live_birds(flock_id, date)
+
+    @staticmethod
+    def refresh_pairs(pairs):
+        """Recalcula (upsert) los resúmenes de muchos pares (flock_id, date) a la vez"""
+        from apps.inventory.models import FoodConsumptionRecord
+
+        pairs = set(pairs)
+        if not pairs:
+            return []
+
+        flock_ids = {flock_id for flock_id, _ in pairs}
+        dates = {date for _, date in pairs}
+
+        initial = dict(Flock.objects.filter(id__in=flock_ids).values_list('id', 'initial_quantity'))
+
+        weights = {
+            (flock_id, date): (average, expected, deviation)
+            for flock_id, date, average, expected, deviation in DailyWeightRecord.objects.filter(
+                flock_id__in=flock_ids, date__in=dates
+            ).values_list('flock_id', 'date', 'average_weight', 'expected_weight', 'deviation_percentage')
+        }
+
+        feed = {
+            (row['flock_id'], row['date']): row['total']
+            for row in FoodConsumptionRecord.objects.filter(flock_id__in=flock_ids, date__in=dates)
+            .values('flock_id', 'date')
+            .annotate(total=models.Sum('quantity_consumed'))
+        }
+
+        # Historial de mortalidad hasta la última fecha pedida para acumular por lote
+        mortality = defaultdict(list)
+        for row in (
+            MortalityRecord.objects.filter(flock_id__in=flock_ids, date__lte=max(dates))
+            .values('flock_id', 'date')
+            .annotate(total=models.Sum('deaths'))
+            .order_by('flock_id', 'date')
+        ):
+            mortality[row['flock_id']].append((row['date'], row['total']))
+
+        cumulative = {}
+        for flock_id, rows in mortality.items():
+            running = 0
+            days = []
+            totals = []
+            for date, deaths in rows:
+                running += deaths
+                days.append(date)
+                totals.append(running)
+            cumulative[flock_id] = (days, totals, dict(rows))
+
+        snapshots = []
+        for flock_id, date in pairs:
+            if flock_id not in initial:
+                continue
+            days, totals, by_date = cumulative.get(flock_id, ([], [], {}))
+            pos = bisect_right(days, date)
+            dead_to_date = totals[pos - 1] if pos else 0
+            average, expected, deviation = weights.get((flock_id, date), (None, None, None))
+
+            snapshots.append(FlockDailySnapshot(
+                flock_id=flock_id,
+                date=date,
+                live_birds=max(initial[flock_id] - dead_to_date, 0),
+                deaths=by_date.get(date, 0),
+                average_weight=average,
+                expected_weight=expected,
+                deviation_percentage=deviation,
+                feed_kg=feed.get((flock_id, date)) or Decimal('0'),
+            ))
+
+        if snapshots:
+            FlockSnapshotService._upsert(snapshots)
+        return snapshots
+
+    @staticmethod
+    def _upsert(snapshots):
+        """Inserta o actualiza por (flock, date) según lo que soporte el motor"""
+        if connection.features.supports_update_conflicts_with_target:
+            FlockDailySnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=['flock', 'date'],
+                update_fields=SNAPSHOT_UPDATE_FIELDS,
+            )
+            return
+
+        # MySQL no admite unique_fields en el upsert: separar filas existentes y nuevas
+        existing = {
+            (flock_id, date): pk for pk, flock_id, date in FlockDailySnapshot.objects.filter(
+                flock_id__in={snapshot.flock_id for snapshot in snapshots},
+                date__in={snapshot.date for snapshot in snapshots},
+            ).values_list('id', 'flock_id', 'date')
+        }
+        now = timezone.now()
+        updates = []
+        inserts = []
+        for snapshot in snapshots:
+            pk = existing.get((snapshot.flock_id, snapshot.date))
+            if pk is None:
+                inserts.append(snapshot)
+            else:
+                snapshot.pk = pk
+                snapshot.updated_at = now
+                updates.append(snapshot)
+        if updates:
+            FlockDailySnapshot.objects.bulk_update(updates, SNAPSHOT_UPDATE_FIELDS)
+        if inserts:
+            FlockDailySnapshot.objects.bulk_create(inserts)
+
+    @staticmethod
+    def refresh_following_live_birds(flock_id, date):
+        """Recalcula en una sola sentencia las aves vivas de los días posteriores"""
+        FlockSnapshotService.refresh_following_live_birds_many({flock_id: date})
+
+    @staticmethod
+    def refresh_following_live_birds_many(first_dates):
+        """Igual que refresh_following_live_birds para varios lotes ({flock_id: fecha}) en un UPDATE"""
+        if not first_dates:
+            return
+
+        after = models.Q()
+        for flock_id, date in first_dates.items():
+            after |= models.Q(flock_id=flock_id, date__gt=date)
+
+        initial = Flock.objects.filter(id=models.OuterRef('flock_id')).values('initial_quantity')[:1]
+        dead_to_date = (
+            MortalityRecord.objects.filter(flock_id=models.OuterRef('flock_id'), date__lte=models.OuterRef('date'))
+            .order_by()
+            .values('flock_id')
+            .annotate(total=models.Sum('deaths'))
+            .values('total')
+        )
+        FlockDailySnapshot.objects.filter(after).update(
+            live_birds=models.Subquery(initial, output_field=models.IntegerField()) - Coalesce(
+                models.Subquery(dead_to_date, output_field=models.IntegerField()), 0
+            )
+        )
+
+    @staticmethod
+    def rebuild_flock(flock_id, chunk_size=500):
+        """Reconstruye todos los resúmenes de un lote desde los registros fuente.
+
+        Devuelve (filas escritas, filas obsoletas eliminadas).
+        """
+        from apps.inventory.models import FoodConsumptionRecord
+
+        dates = set(DailyWeightRecord.objects.filter(flock_id=flock_id).values_list('date', flat=True))
+        dates.update(MortalityRecord.objects.filter(flock_id=flock_id).values_list('date', flat=True))
+        dates.update(FoodConsumptionRecord.objects.filter(flock_id=flock_id).values_list('date', flat=True))
+
+        removed, _ = FlockDailySnapshot.objects.filter(flock_id=flock_id).exclude(date__in=dates).delete()
+
+        ordered = sorted(dates)
+        written = 0
+        for start in range(0, len(ordered), chunk_size):
+            written += len(FlockSnapshotService.refresh_pairs(
+                [(flock_id, date) for date in ordered[start:start + chunk_size]]
+            ))
+        return written, removed
@@ -0,0 +1,327 @@
+import logging
+from decimal import Decimal
+
+import numpy as np
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from apps.alarms.services import AlarmEvaluationEngine
+from apps.sync.change_log import ChangeLog
+from apps.sync.services import IdempotencyService
+
+from .models import DailyWeightRecord, Flock, SyncConflict
+from .reference_cache import BreedReferenceCache, as_decimal
+from .services_snapshot import FlockSnapshotService
+from .dashboard_cache import DashboardCache
+from .services_forecast import GrowthForecastService
+
+logger = logging.getLogger(__name__)
+
+
+# Diferencia máxima (gramos) para promediar un peso entrante con el existente;
+# por encima de este valor se registra un conflicto para resolución manual.
+AVERAGE_WEIGHT_THRESHOLD = Decimal('50')
+
+
+class WeightSyncService:
+    """Ingesta en bloque de pesos diarios enviados por dispositivos móviles.
+
+    Procesa el lote completo con un número constante de consultas: precarga los
+    registros existentes por (flock_id, date) y los lotes, decide en memoria si cada
+    registro se crea, se promedia o genera conflicto, evalúa las curvas de referencia
+    de todo el lote de una vez y persiste el resultado con bulk_create / bulk_update.
+    Las alarmas por desviación se encolan para después del commit. Los client_id ya
+    sincronizados por el mismo dispositivo devuelven su resultado original.
+    """
+
+    @staticmethod
+    def bulk_sync(weight_records, user, device_id):
+        """Sincroniza una lista de registros de peso y devuelve el resumen por client_id."""
+        sync_results = {
+            'total': len(weight_records),
+            'successful': 0,
+            'conflicts': 0,
+            'errors': 0,
+            'details': []
+        }
+
+        details = IdempotencyService.run(
+            'weight',
+            IdempotencyService.device_key(device_id, user),
+            weight_records,
+            lambda records: WeightSyncService._sync_records(records, user, device_id)
+        )
+
+        for result in details:
+            sync_results['errors' if result['status'] == 'error' else result['status']] += 1
+            sync_results['details'].append(result)
+
+        return sync_results
+
+    @staticmethod
+    def _sync_records(weight_records, user, device_id):
+        try:
+            with transaction.atomic():
+                return WeightSyncService._process_batch(weight_records, user, device_id)
+        except IntegrityError:
+            # Otro dispositivo insertó el mismo (flock, date) en paralelo: se reprocesa
+            # registro a registro para que cada uno se resuelva contra el estado real.
+            logger.warning('Bulk weight sync collided with a concurrent write, falling back to per-record sync')
+            return [WeightSyncService._process_single_safe(r, user, device_id) for r in weight_records]
+
+    @staticmethod
+    def _parse_record(record_data):
+        # Todo valor que llega al bulk_create se valida aquí: un registro inválido queda
+        # como error propio en lugar de abortar el lote completo
+        clean = WeightSyncService._clean
+        return {
+            'flock_id': int(record_data['flock_id']),
+            'date': clean('date', record_data['date']),
+            'weight': clean('average_weight', str(record_data['average_weight'])),
+            'sample_size': clean('sample_size', record_data.get('sample_size', 10)),
+            'client_id': clean('client_id', record_data.get('client_id')),
+        }
+
+    @staticmethod
+    def _clean(name, value):
+        """Convierte y valida `value` con el campo `name` de DailyWeightRecord"""
+        try:
+            return DailyWeightRecord._meta.get_field(name).clean(value, None)
+        except ValidationError as e:
+            raise ValueError(f"{name}: {'; '.join(e.messages)}")
+
+    @staticmethod
+    def _process_batch(weight_records, user, device_id):
+        details = [None] * len(weight_records)
+        parsed = []
+
+        for idx, record_data in enumerate(weight_records):
+            try:
+                parsed.append((idx, WeightSyncService._parse_record(record_data)))
+            except Exception as e:
+                details[idx] = WeightSyncService._error_result(record_data, e)
+
+        flock_ids = {p['flock_id'] for _, p in parsed}
+        dates = {p['date'] for _, p in parsed}
+
+        flocks = Flock.objects.in_bulk(flock_ids) if flock_ids else {}
+        existing = {}
+        if flock_ids:
+            for rec in DailyWeightRecord.objects.filter(flock_id__in=flock_ids, date__in=dates):
+                existing[(rec.flock_id, rec.date)] = rec
+
+        to_create = {}
+        to_update = {}
+        conflicts = []
+        # (idx, result, record) para rellenar server_id una vez persistido
+        pending_ids = []
+
+        for idx, p in parsed:
+            flock = flocks.get(p['flock_id'])
+            if flock is None:
+                details[idx] = {
+                    'client_id': p['client_id'],
+                    'status': 'error',
+                    'error': f"Lote {p['flock_id']} no encontrado"
+                }
+                continue
+
+            key = (p['flock_id'], p['date'])
+            current = to_create.get(key) or existing.get(key)
+
+            if current is not None:
+                if abs(current.average_weight - p['weight']) < AVERAGE_WEIGHT_THRESHOLD:
+                    current.average_weight = (current.average_weight + p['weight']) / 2
+                    current.sync_status = 'SYNCED'
+                    if current.pk:
+                        to_update[key] = current
+                    result = {
+                        'client_id': p['client_id'],
+                        'status': 'successful',
+                        'resolution': 'averaged',
+                        'server_id': current.pk
+                    }
+                    pending_ids.append((idx, result, current))
+                    details[idx] = result
+                else:
+                    conflict = SyncConflict(
+                        source='daily_weight',
+                        client_id=p['client_id'],
+                        payload={
+                            'flock_id': p['flock_id'],
+                            'date': p['date'].isoformat(),
+                            'existing_server_weight': str(current.average_weight),
+                            'incoming_weight': str(p['weight']),
+                        },
+                        flock_id=p['flock_id']
+                    )
+                    conflicts.append((idx, conflict))
+                continue
+
+            record = DailyWeightRecord(
+                flock_id=p['flock_id'],
+                date=p['date'],
+                average_weight=p['weight'],
+                sample_size=p['sample_size'],
+                recorded_by=user,
+                client_id=p['client_id'],
+                created_by_device=device_id
+            )
+            to_create[key] = record
+
+            result = {
+                'client_id': p['client_id'],
+                'status': 'successful',
+                'server_id': None
+            }
+            pending_ids.append((idx, result, record))
+            details[idx] = result
+
+        touched = list(to_create.values()) + list(to_update.values())
+        WeightSyncService._apply_references(touched, flocks)
+
+        created = WeightSyncService._bulk_create(DailyWeightRecord, list(to_create.values()))
+        WeightSyncService._fill_missing_pks(created)
+
+        if to_update:
+            now = timezone.now()
+            for rec in to_update.values():
+                rec.updated_at = now
+            DailyWeightRecord.objects.bulk_update(
+                list(to_update.values()),
+                ['average_weight', 'sync_status', 'expected_weight', 'deviation_percentage', 'updated_at']
+            )
+
+        WeightSyncService._bulk_create(SyncConflict, [c for _, c in conflicts])
+        for idx, conflict in conflicts:
+            details[idx] = {
+                'client_id': conflict.client_id,
+                'status': 'conflicts',
+                'error': 'manual_conflict_required',
+                'server_conflict_id': conflict.pk
+            }
+
+        for idx, result, record in pending_ids:
+            result['server_id'] = record.pk
+
+        FlockSnapshotService.refresh_pairs((r.flock_id, r.date) for r in touched)
+        DashboardCache.bump_sheds({flocks[r.flock_id].shed_id for r in touched})
+        GrowthForecastService.invalidate(r.flock_id for r in touched)
+        ChangeLog.touch('daily_weight', [r.pk for r in touched])
+
+        AlarmEvaluationEngine.schedule_weight_deviation(r.pk for r in touched)
+
+        return details
+
+    @staticmethod
+    def _apply_references(records, flocks):
+        """Replica el cálculo de DailyWeightRecord.save() para todo el lote en una sola evaluación"""
+        if not records:
+            return
+        curve = BreedReferenceCache.lookup_pairs([(flocks[r.flock_id], r.date) for r in records])
+        for rec, expected in zip(records, curve.expected_weight):
+            if not rec.expected_weight:
+                rec.expected_weight = None if np.isnan(expected) else as_decimal(expected)
+            rec._update_deviation()
+
+    @staticmethod
+    def _bulk_create(model, objs):
+        if not objs:
+            return []
+        if connection.features.can_return_rows_from_bulk_insert:
+            return model.objects.bulk_create(objs)
+        # Backends sin RETURNING (MySQL): para conflictos necesitamos el id de cada fila
+        if model is SyncConflict:
+            for obj in objs:
+                obj.save()
+            return objs
+        return model.objects.bulk_create(objs)
+
+    @staticmethod
+    def _fill_missing_pks(records):
+        missing = [r for r in records if r.pk is None]
+        if not missing:
+            return
+        flock_ids = {r.flock_id for r in missing}
+        dates = {r.date for r in missing}
+        ids = {
+            (flock_id, date): pk
+            for pk, flock_id, date in DailyWeightRecord.objects.filter(
+                flock_id__in=flock_ids, date__in=dates
+            ).values_list('id', 'flock_id', 'date')
+        }
+        for r in missing:
+            r.pk = ids.get((r.flock_id, r.date))
+
+    @staticmethod
+    def _process_single_safe(record_data, user, device_id):
+        try:
+            with transaction.atomic():
+                return WeightSyncService.process_single(record_data, user, device_id)
+        except Exception as e:
+            return WeightSyncService._error_result(record_data, e)
+
+    @staticmethod
+    def process_single(record_data, user, device_id):
+        """Procesa un único registro de peso (camino por registro, usado como respaldo)."""
+        p = WeightSyncService._parse_record(record_data)
+        flock_id = p['flock_id']
+        date = p['date']
+        weight = p['weight']
+        client_id = p['client_id']
+
+        existing = DailyWeightRecord.objects.filter(flock_id=flock_id, date=date).first()
+        if existing:
+            if abs(existing.average_weight - weight) < AVERAGE_WEIGHT_THRESHOLD:
+                existing.average_weight = (existing.average_weight + weight) / 2
+                existing.sync_status = 'SYNCED'
+                existing.save()
+                return {
+                    'client_id': client_id,
+                    'status': 'successful',
+                    'resolution': 'averaged',
+                    'server_id': existing.id
+                }
+
+            conflict = SyncConflict.objects.create(
+                source='daily_weight',
+                client_id=client_id,
+                payload={
+                    'flock_id': flock_id,
+                    'date': date.isoformat(),
+                    'existing_server_weight': str(existing.average_weight),
+                    'incoming_weight': str(weight),
+                },
+                flock_id=flock_id
+            )
+            return {
+                'client_id': client_id,
+                'status': 'conflicts',
+                'error': 'manual_conflict_required',
+                'server_conflict_id': conflict.id
+            }
+
+        weight_record = DailyWeightRecord.objects.create(
+            flock_id=flock_id,
+            date=date,
+            average_weight=weight,
+            sample_size=p['sample_size'],
+            recorded_by=user,
+            client_id=client_id,
+            created_by_device=device_id
+        )
+        return {
+            'client_id': client_id,
+            'status': 'successful',
+            'server_id': weight_record.id
+        }
+
+    @staticmethod
+    def _error_result(record_data, exc):
+        return {
+            'client_id': record_data.get('client_id') if isinstance(record_data, dict) else None,
+            'status': 'error',
+            'error': str(exc)
+        }
@@ -0,0 +1,52 @@
+import logging
+
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from .models import ReferenceImportLog
+from .services import BreedReferenceService
+from .services_forecast import GrowthForecastService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def import_breed_references_task(log_id, storage_path):
+    """Importar en segundo plano un Excel de referencias guardado en default_storage"""
+    log = ReferenceImportLog.objects.get(pk=log_id)
+    # default_storage.path puede no existir en algunos despliegues; se usa el nombre tal cual
+    file_path = getattr(default_storage, 'path', lambda p: p)(storage_path)
+
+    try:
+        log = BreedReferenceService.import_from_excel(file_path, log.imported_by, log=log)
+    except Exception as e:
+        log.refresh_from_db()
+        log.status = 'FAILED'
+        log.error_details = list(log.error_details or []) + [str(e)]
+        log.save()
+    finally:
+        try:
+            default_storage.delete(storage_path)
+        except Exception as e:
+            logger.warning('No se pudo eliminar el archivo temporal %s: %s', storage_path, e)
+
+    return {
+        'log_id': log.id,
+        'status': log.status,
+        'successful_imports': log.successful_imports,
+        'errors': log.errors,
+    }
+
+
+@shared_task
+def refresh_growth_forecasts_task():
+    """Reajustar en un solo cálculo las curvas de crecimiento de todos los lotes activos"""
+    return {'fitted_flocks': GrowthForecastService.refresh_active_forecasts()}
+
+
+@shared_task
+def close_out_flocks_task(flock_ids=None):
+    """Escribir el FlockSummary de los lotes cerrados (sin ids: barrido de los que falten)"""
+    from .services_closeout import FlockCloseoutService
+
+    return {'closed_flocks': len(FlockCloseoutService.close_out(flock_ids))}
@@ -89,3 +89,80 @@ class BulkSyncAPITest(APITestCase):
         data = resp.json()
         assert data['conflicts'] == 1
         assert data['details'][0]['status'] == 'conflicts'
+
+    def test_bulk_sync_duplicates_within_batch_are_averaged(self):
+        today = timezone.now().date()
+        payload = {
+            'weight_records': [
+                {'flock_id': self.flock.id, 'date': today.isoformat(), 'average_weight': '40.0', 'client_id': 'd1'},
+                {'flock_id': self.flock.id, 'date': today.isoformat(), 'average_weight': '50.0', 'client_id': 'd2'},
+            ]
+        }
+
+        resp = self.client.post('/api/daily-weights/bulk-sync/', payload, format='json')
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data['successful'] == 2
+        record = DailyWeightRecord.objects.get(flock=self.flock, date=today)
+        assert data['details'][0]['server_id'] == record.id
+        assert data['details'][1]['resolution'] == 'averaged'
+        assert data['details'][1]['server_id'] == record.id
+        self.assertAlmostEqual(float(record.average_weight), 45.0, places=2)
+
+    def test_bulk_sync_reports_unknown_flock_as_error(self):
+        payload = {
+            'weight_records': [
+                {'flock_id': 999999, 'date': timezone.now().date().isoformat(), 'average_weight': '45.0', 'client_id': 'e1'},
+            ]
+        }
+
+        resp = self.client.post('/api/daily-weights/bulk-sync/', payload, format='json')
+        data = resp.json()
+        assert data['errors'] == 1
+        assert data['details'][0]['status'] == 'error'
+
+    def test_bulk_sync_rejects_invalid_fields_per_record(self):
+        from datetime import timedelta
+        today = timezone.now().date()
+        payload = {
+            'weight_records': [
+                {'flock_id': self.flock.id, 'date': today.isoformat(), 'average_weight': '45.0', 'sample_size': 'abc', 'client_id': 'bad-sample'},
+                {'flock_id': self.flock.id, 'date': today.isoformat(), 'average_weight': 'NaN', 'client_id': 'bad-weight'},
+                {'flock_id': self.flock.id, 'date': '2025-02-30', 'average_weight': '45.0', 'client_id': 'bad-date'},
+                {'flock_id': self.flock.id, 'date': (today - timedelta(days=1)).isoformat(), 'average_weight': '45.0', 'sample_size': '8', 'client_id': 'ok'},
+            ]
+        }
+
+        resp = self.client.post('/api/daily-weights/bulk-sync/', payload, format='json')
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert (data['successful'], data['errors']) == (1, 3)
+        assert [d['status'] for d in data['details']] == ['error', 'error', 'error', 'successful']
+        assert data['details'][0]['error'].startswith('sample_size')
+        assert DailyWeightRecord.objects.get(flock=self.flock).sample_size == 8
+
+    def test_bulk_sync_query_count_does_not_grow_with_batch_size(self):
+        from datetime import timedelta
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.flocks.models import BreedReference
+
+        BreedReference.objects.create(breed='Ross', age_days=0, expected_weight='45.0')
+        start = timezone.now().date() - timedelta(days=60)
+        self.flock.arrival_date = start
+        self.flock.save()
+
+        def payload(offset, size):
+            return {'weight_records': [
+                {'flock_id': self.flock.id, 'date': (start + timedelta(days=offset + i)).isoformat(), 'average_weight': '45.0', 'client_id': f'q{offset + i}'}
+                for i in range(size)
+            ]}
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/daily-weights/bulk-sync/', payload(0, 2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.post('/api/daily-weights/bulk-sync/', payload(10, 40), format='json')
+
+        assert resp.json()['successful'] == 40
+        assert len(large.captured_queries) <= len(small.captured_queries)
@@ -0,0 +1,103 @@
+import gzip
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+
+from apps.users.models import User
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import Flock, DailyWeightRecord, MortalityRecord
+
+
+def ndjson(records):
+    return b''.join(json.dumps(r).encode() + b'\n' for r in records)
+
+
+class BulkSyncNDJSONTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='ndjson', email='ndjson@example.com', password='pass1234', identification='ND1')
+        self.client.force_authenticate(self.user)
+
+        self.farm = Farm.objects.create(name='Finca NDJSON', location='Ubicacion', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Galpon 1', farm=self.farm, capacity=1000)
+        self.flock = Flock.objects.create(arrival_date=timezone.now().date() - timedelta(days=10), initial_quantity=100, current_quantity=100, initial_weight=1.2, breed='Ross', gender='X', supplier='Proveedor', shed=self.shed)
+
+    def test_gzip_ndjson_request_streams_gzip_ndjson_results(self):
+        today = timezone.now().date()
+        records = [
+            {'flock_id': self.flock.id, 'date': (today - timedelta(days=i)).isoformat(), 'average_weight': 300 + i, 'client_id': f'c{i}'}
+            for i in range(5)
+        ]
+
+        with mock.patch('apps.sync.streaming.SYNC_CHUNK_SIZE', 2):
+            resp = self.client.post(
+                '/api/daily-weights/bulk-sync/', gzip.compress(ndjson(records)),
+                content_type='application/x-ndjson', HTTP_CONTENT_ENCODING='gzip',
+                HTTP_ACCEPT='application/x-ndjson', HTTP_ACCEPT_ENCODING='gzip'
+            )
+            body = b''.join(resp.streaming_content)
+
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        lines = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual([line['client_id'] for line in lines[:-1]], [f'c{i}' for i in range(5)])
+        self.assertEqual(lines[-1], {'summary': {'total': 5, 'successful': 5, 'conflicts': 0, 'errors': 0}})
+        self.assertEqual(DailyWeightRecord.objects.filter(flock=self.flock).count(), 5)
+
+    def test_ndjson_request_with_json_response(self):
+        payload = ndjson([
+            {'flock_id': self.flock.id, 'date': timezone.now().date().isoformat(), 'deaths': 3, 'client_id': 'm1'},
+            {'flock_id': 999999, 'date': timezone.now().date().isoformat(), 'deaths': 1, 'client_id': 'm2'},
+        ])
+
+        resp = self.client.post('/api/mortality/bulk-sync/', payload, content_type='application/x-ndjson')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data['total'], resp.data['successful'], resp.data['errors']), (2, 1, 1))
+        self.assertEqual(MortalityRecord.objects.get(flock=self.flock).deaths, 3)
+
+    def test_invalid_line_is_rejected_before_processing(self):
+        payload = b'{"flock_id": 1,\n'
+
+        resp = self.client.post('/api/mortality/bulk-sync/', payload, content_type='application/x-ndjson')
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(MortalityRecord.objects.exists())
+
+    def test_invalid_line_after_first_chunk_returns_partial_results(self):
+        today = timezone.now().date()
+        payload = ndjson([
+            {'flock_id': self.flock.id, 'date': (today - timedelta(days=i)).isoformat(), 'deaths': 1, 'client_id': f'm{i}'}
+            for i in range(3)
+        ]) + b'{"flock_id": 1,\n'
+
+        with mock.patch('apps.sync.streaming.SYNC_CHUNK_SIZE', 2):
+            resp = self.client.post('/api/mortality/bulk-sync/', payload, content_type='application/x-ndjson')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data['total'], resp.data['successful'], resp.data['errors']), (3, 2, 1))
+        self.assertIn('Línea 4', resp.data['details'][-1]['error'])
+        self.assertEqual(MortalityRecord.objects.filter(flock=self.flock).count(), 2)
+
+    def test_oversized_line_and_body_are_rejected(self):
+        from django.test import override_settings
+        line = {'flock_id': self.flock.id, 'date': timezone.now().date().isoformat(), 'deaths': 1, 'notes': 'x' * 500, 'client_id': 'big'}
+
+        with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=200):
+            resp = self.client.post(
+                '/api/mortality/bulk-sync/', gzip.compress(ndjson([line])),
+                content_type='application/x-ndjson', HTTP_CONTENT_ENCODING='gzip'
+            )
+        self.assertEqual(resp.status_code, 400)
+
+        # Cuerpo muy comprimible: el límite se aplica a los bytes descomprimidos
+        blank = gzip.compress(b' ' * 10000 + b'\n' + ndjson([line]))
+        with override_settings(BULK_SYNC_MAX_BODY_SIZE=5000):
+            resp = self.client.post(
+                '/api/mortality/bulk-sync/', blank,
+                content_type='application/x-ndjson', HTTP_CONTENT_ENCODING='gzip'
+            )
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(MortalityRecord.objects.exists())
@@ -71,5 +71,95 @@ class ShedDashboardAPITests(APITestCase):
         # Call again immediately
         r2 = self.client.get(url)
         data2 = r2.json()
-        # Because of cache_page(120) the last_updated should be identical
+        # Served from the dashboard cache, so last_updated should be identical
         self.assertEqual(data1.get('last_updated'), data2.get('last_updated'))
+
+    def _add_shed_with_flock(self, index, weight_date):
+        from datetime import timedelta
+        from apps.flocks.models import Flock, DailyWeightRecord
+
+        shed = Shed.objects.create(name=f'Extra{index}', capacity=500, farm=self.farm1)
+        flock = Flock.objects.create(
+            arrival_date=timezone.now().date() - timedelta(days=10), initial_quantity=100, current_quantity=100,
+            initial_weight=40, breed='R', gender='M', supplier='S', shed=shed
+        )
+        DailyWeightRecord.objects.create(flock=flock, date=weight_date, average_weight=500, sample_size=10, recorded_by=self.admin)
+        return shed
+
+    def test_query_count_does_not_grow_with_sheds(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        today = timezone.now().date()
+        first = self._add_shed_with_flock(0, today)
+        self.client.force_authenticate(self.admin)
+        url = reverse('shed-dashboard')
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            resp = self.client.get(url)
+        data = {s['id']: s for s in resp.json()['sheds']}
+        self.assertEqual(data[first.id]['flocks'], {'active_count': 1, 'avg_age': 10.0, 'total_birds': 100})
+        self.assertEqual(data[first.id]['status_indicator']['color'], 'green')
+        self.assertEqual(data[first.id]['last_activity']['weight_date'], today.isoformat())
+
+        for i in range(1, 11):
+            self._add_shed_with_flock(i, today)
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.get(url)
+        self.assertEqual(len(resp.json()['sheds']), 13)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_cache_is_scoped_per_user_and_invalidated_by_writes(self):
+        from apps.flocks.models import Flock, DailyWeightRecord
+
+        url = reverse('shed-dashboard')
+        cache.clear()
+
+        self.client.force_authenticate(self.admin)
+        admin_data = self.client.get(url).json()
+        self.client.force_authenticate(self.galponero)
+        galp_data = self.client.get(url).json()
+        self.assertEqual([s['id'] for s in galp_data['sheds']], [self.shed1.id])
+        self.assertGreaterEqual(len(admin_data['sheds']), 2)
+
+        # Un lote nuevo en el galpón invalida la entrada cacheada
+        flock = Flock.objects.create(
+            arrival_date=timezone.now().date(), initial_quantity=50, current_quantity=50,
+            initial_weight=40, breed='R', gender='M', supplier='S', shed=self.shed1
+        )
+        shed = self.client.get(url).json()['sheds'][0]
+        self.assertEqual(shed['flocks']['total_birds'], 50)
+        self.assertEqual(shed['status_indicator']['color'], 'orange')
+
+        # Y también un pesaje
+        DailyWeightRecord.objects.create(
+            flock=flock, date=timezone.now().date(), average_weight=45, sample_size=10, recorded_by=self.admin
+        )
+        shed = self.client.get(url).json()['sheds'][0]
+        self.assertEqual(shed['status_indicator']['color'], 'green')
+
+        # El alcance del administrador incluye shed1, así que también se recalcula
+        self.client.force_authenticate(self.admin)
+        other = [s for s in self.client.get(url).json()['sheds'] if s['id'] == self.shed2.id]
+        self.assertEqual(other[0]['flocks']['total_birds'], 0)
+
+    def test_shed_edits_and_deletes_invalidate_cache(self):
+        url = reverse('shed-dashboard')
+        cache.clear()
+        self.client.force_authenticate(self.admin)
+        self.client.get(url)
+
+        self.shed1.name = 'ShedA renombrado'
+        self.shed1.capacity = 150
+        self.shed1.save()
+        sheds = {s['id']: s for s in self.client.get(url).json()['sheds']}
+        self.assertEqual(sheds[self.shed1.id]['name'], 'ShedA renombrado')
+        self.assertEqual(sheds[self.shed1.id]['occupancy']['capacity'], 150)
+
+        shed2_id = self.shed2.id
+        self.shed2.delete()
+        sheds = {s['id'] for s in self.client.get(url).json()['sheds']}
+        self.assertNotIn(shed2_id, sheds)
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.users.models import User
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import Flock, DailyWeightRecord, MortalityRecord, FlockSummary
+from apps.inventory.models import InventoryItem, FoodConsumptionRecord
+from apps.reports.models import Report
+from apps.reports.services import ProductivityReportService
+
+
+class FlockCloseoutTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='closeout', email='closeout@example.com', password='pass1234', identification='CO1')
+        farm = Farm.objects.create(name='Finca Cierre', location='Ubicacion', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Galpon 1', farm=farm, capacity=10000)
+        self.item = InventoryItem.objects.create(name='Iniciador', unit='KG', farm=farm)
+        self.today = timezone.now().date()
+        self.flock = self._flock(days=40)
+
+        for days, weight in ((30, 400), (1, 2040)):
+            DailyWeightRecord.objects.create(flock=self.flock, date=self.today - timedelta(days=days), average_weight=weight, recorded_by=self.user)
+        MortalityRecord.objects.create(flock=self.flock, date=self.today - timedelta(days=5), deaths=5, recorded_by=self.user)
+        FoodConsumptionRecord.objects.create(flock=self.flock, inventory_item=self.item, date=self.today - timedelta(days=2), quantity_consumed=Decimal('300'), fifo_details={}, recorded_by=self.user)
+        self.flock.refresh_from_db()
+
+    def _flock(self, days):
+        return Flock.objects.create(
+            arrival_date=self.today - timedelta(days=days), initial_quantity=100, current_quantity=100,
+            initial_weight=40, breed='Ross', gender='X', supplier='P', shed=self.shed
+        )
+
+    def _close(self, flock, status='SOLD'):
+        with self.captureOnCommitCallbacks(execute=True):
+            flock.status = status
+            flock.save()
+
+    def test_leaving_active_writes_summary_once(self):
+        self._close(self.flock)
+
+        summary = FlockSummary.objects.get(flock=self.flock)
+        self.assertEqual((summary.closing_status, summary.days, summary.closed_on), ('SOLD', 40, self.today))
+        self.assertEqual((summary.final_quantity, summary.total_mortality, summary.mortality_rate), (95, 5, Decimal('5.00')))
+        self.assertEqual((summary.final_weight, summary.total_feed_kg), (Decimal('2040.00'), Decimal('300.00')))
+        # (95 * 2040 - 100 * 40) / 1000 = 189.80 kg ganados
+        self.assertEqual((summary.weight_gain_kg, summary.fcr), (Decimal('189.80'), Decimal('1.581')))
+
+        # Otro cambio de estado no recalcula el cierre
+        self._close(self.flock, 'FINISHED')
+        self.assertEqual(FlockSummary.objects.get(flock=self.flock).closing_status, 'SOLD')
+
+        summary.fcr = Decimal('9')
+        with self.assertRaises(ValidationError):
+            summary.save()
+
+    def test_report_reads_closed_flocks_from_summary(self):
+        self._close(self.flock)
+        open_flock = self._flock(days=10)
+        MortalityRecord.objects.create(flock=open_flock, date=self.today, deaths=2, recorded_by=self.user)
+        # Los registros crudos del lote cerrado ya no se consultan para el período
+        MortalityRecord.objects.filter(flock=self.flock).update(deaths=50)
+
+        report = Report.objects.create(name='Cierre', report_type='productivity', date_from=self.today - timedelta(days=60), date_to=self.today, created_by=self.user, export_format='csv')
+        data = ProductivityReportService(report).generate_report()
+
+        summary = data['summary']
+        self.assertEqual((summary['closed_flocks_from_summary'], summary['active_flocks']), (1, 1))
+        self.assertEqual(summary['mortality']['total_deaths'], 7)
+        self.assertEqual(summary['weight']['average_weight'], Decimal('1220.00'))
+        conversion = data['conversion_analysis']['flock_conversions']
+        self.assertEqual([(c['flock_id'], c['feed_conversion_ratio']) for c in conversion], [(self.flock.id, Decimal('1.581'))])
+        self.assertEqual(data['comparative_analysis']['current_period']['total_consumption'], Decimal('300.00'))
+
+    def test_flock_closed_after_period_start_uses_raw_rows(self):
+        self._close(self.flock)
+
+        report = Report.objects.create(name='Parcial', report_type='productivity', date_from=self.today - timedelta(days=10), date_to=self.today, created_by=self.user, export_format='csv')
+        summary = ProductivityReportService(report)._generate_summary(Flock.objects.filter(id=self.flock.id))
+
+        # El lote llegó antes del período: solo cuentan los registros dentro de él
+        self.assertEqual(summary['closed_flocks_from_summary'], 0)
+        self.assertEqual(summary['weight']['records'], 1)
+
+    def test_backfill_command_closes_pending_flocks(self):
+        Flock.objects.filter(pk=self.flock.pk).update(status='FINISHED')
+
+        out = StringIO()
+        call_command('backfill_flock_summaries', stdout=out)
+
+        self.assertEqual(FlockSummary.objects.get(flock=self.flock).total_mortality, 5)
+        self.assertIn('Cierres creados: 1', out.getvalue())
@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+
+from apps.users.models import User
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import Flock, DailyWeightRecord
+
+
+class DailyWeightKeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='pager', email='pager@example.com', password='pass1234', identification='PG1')
+        self.client.force_authenticate(self.user)
+
+        farm = Farm.objects.create(name='Finca Pager', location='Ubicacion', farm_manager=self.user)
+        shed = Shed.objects.create(name='Galpon 1', farm=farm, capacity=10000)
+        self.today = timezone.now().date()
+        self.flocks = [
+            Flock.objects.create(arrival_date=self.today - timedelta(days=20), initial_quantity=100, current_quantity=100, initial_weight=40, breed='Ross', gender='X', supplier='P', shed=shed)
+            for _ in range(3)
+        ]
+        # Varios registros por fecha: los empates se resuelven por id
+        for days in range(3):
+            for flock in self.flocks:
+                DailyWeightRecord.objects.create(flock=flock, date=self.today - timedelta(days=days), average_weight=500, recorded_by=self.user)
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            ids.extend(row['id'] for row in resp.data['results'])
+            url = resp.data['next']
+        return ids
+
+    def test_walks_all_rows_in_date_id_order_without_offset(self):
+        expected = list(
+            DailyWeightRecord.objects.order_by('-date', '-id').values_list('id', flat=True)
+        )
+
+        first = self.client.get('/api/daily-weights/', {'page_size': 2})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+
+        self.assertFalse(any('OFFSET' in q['sql'].upper() for q in ctx.captured_queries))
+        self.assertEqual(self._walk('/api/daily-weights/?page_size=2'), expected)
+
+    def test_inserts_while_paging_do_not_shift_pages(self):
+        first = self.client.get('/api/daily-weights/', {'page_size': 4})
+        seen = [row['id'] for row in first.data['results']]
+
+        # Un registro nuevo (más reciente) no desplaza las páginas siguientes
+        DailyWeightRecord.objects.create(flock=self.flocks[0], date=self.today + timedelta(days=1), average_weight=510, recorded_by=self.user)
+        rest = self._walk(first.data['next'])
+
+        self.assertEqual(len(seen + rest), 9)
+        self.assertFalse(set(seen) & set(rest))
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/daily-weights/', {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_invalid_cursor_returns_404(self):
+        resp = self.client.get('/api/daily-weights/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_forged_cursor_values_return_404(self):
+        # Base64 y JSON válidos pero con tipos que el cursor nunca emite
+        for position in ([False, None, 1], [0, 5, 1], [0, [1], 1], [0, {'a': 1}, 1], [0, '2025-01-01', None], [0, '2025-01-01', 'x']):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+            resp = self.client.get('/api/daily-weights/', {'cursor': cursor})
+            self.assertEqual(resp.status_code, 404, position)
+
+        cursor = base64.urlsafe_b64encode(json.dumps([0, 'no-es-fecha', 1]).encode()).decode()
+        self.assertEqual(self.client.get('/api/daily-weights/', {'cursor': cursor}).status_code, 404)
@@ -62,3 +62,108 @@ def test_register_mortality_exceeds_quantity_raises(django_user_model):
 
     assert len(results) == 1
     assert results[0]['status'] == 'error'
+
+
+def _batch_setup(django_user_model, suffix, flocks=2):
+    from apps.farms.models import Farm, Shed
+    role_galp, _ = Role.objects.get_or_create(name='Galponero')
+    worker = django_user_model.objects.create(username=f'w{suffix}', identification=f'id-w{suffix}', role=role_galp)
+    manager = django_user_model.objects.create(username=f'm{suffix}', identification=f'id-m{suffix}')
+    farm = Farm.objects.create(name=f'FB{suffix}', location='', farm_manager=manager)
+    shed = Shed.objects.create(name=f'SB{suffix}', farm=farm, capacity=10000, assigned_worker=worker)
+    created = [
+        Flock.objects.create(arrival_date=timezone.now().date(), initial_quantity=100, current_quantity=100, initial_weight=40, breed='R', gender='M', supplier='S', shed=shed)
+        for _ in range(flocks)
+    ]
+    return worker, shed, created
+
+
+@pytest.mark.django_db
+def test_batch_groups_records_per_flock_and_keeps_results(django_user_model):
+    from apps.farms.models import Shed
+    from apps.flocks.models import MortalityRecord, MortalityCause
+
+    worker, shed, (f1, f2) = _batch_setup(django_user_model, 'g')
+    today = timezone.now().date().isoformat()
+    payload = [
+        {'flock_id': f1.id, 'date': today, 'deaths': 3, 'client_id': 'a', 'cause_name': 'Calor'},
+        {'flock_id': f2.id, 'date': today, 'deaths': 5, 'client_id': 'b'},
+        {'flock_id': f1.id, 'date': today, 'deaths': 2, 'client_id': 'c'},
+        {'flock_id': f2.id, 'date': today, 'deaths': 500, 'client_id': 'd'},
+        {'flock_id': 999999, 'date': today, 'deaths': 1, 'client_id': 'e'},
+    ]
+
+    results = MortalityService.register_mortality_batch(payload, worker)
+
+    assert [r['status'] for r in results] == ['success', 'success', 'success', 'error', 'error']
+    assert results[0]['action'] == 'created' and results[2]['action'] == 'updated'
+    assert results[0]['server_id'] == results[2]['server_id']
+    assert results[4]['error'] == 'Flock matching query does not exist.'
+
+    record = MortalityRecord.objects.get(flock=f1)
+    assert record.deaths == 5
+    assert record.cause == MortalityCause.objects.get(name='Calor')
+
+    f1.refresh_from_db()
+    f2.refresh_from_db()
+    assert (f1.current_quantity, f2.current_quantity) == (95, 95)
+    assert Shed.objects.get(pk=shed.pk).current_occupancy == 190
+
+
+@pytest.mark.django_db
+def test_batch_query_count_independent_of_flock_count(django_user_model, django_assert_max_num_queries):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    worker, _, small = _batch_setup(django_user_model, 's', flocks=2)
+    _, _, large = _batch_setup(django_user_model, 'l', flocks=10)
+    large_worker = large[0].shed.assigned_worker
+    today = timezone.now().date().isoformat()
+
+    def run(flocks, user):
+        payload = [{'flock_id': f.id, 'date': today, 'deaths': 1, 'client_id': f'c{f.id}'} for f in flocks]
+        with CaptureQueriesContext(connection) as ctx:
+            results = MortalityService.register_mortality_batch(payload, user)
+        assert all(r['status'] == 'success' for r in results)
+        return len(ctx.captured_queries)
+
+    assert run(large, large_worker) <= run(small, worker)
+
+
+@pytest.mark.django_db
+def test_batch_rejects_unassigned_galponero(django_user_model):
+    worker, _, (flock, _) = _batch_setup(django_user_model, 'p')
+    other, _, _ = _batch_setup(django_user_model, 'q')
+
+    results = MortalityService.register_mortality_batch(
+        [{'flock_id': flock.id, 'date': timezone.now().date().isoformat(), 'deaths': 1, 'client_id': 'x'}], other
+    )
+    assert results[0]['status'] == 'error'
+    assert 'permisos' in results[0]['error']
+
+
+@pytest.mark.django_db
+def test_bulk_sync_rejects_invalid_fields_per_record(django_user_model):
+    from rest_framework.test import APIClient
+    from apps.flocks.models import MortalityRecord
+
+    worker, _, (f1, f2) = _batch_setup(django_user_model, 'v')
+    today = timezone.now().date().isoformat()
+    client = APIClient()
+    client.force_authenticate(worker)
+
+    resp = client.post('/api/mortality/bulk-sync/', {'mortality_records': [
+        {'flock_id': f1.id, 'date': today, 'deaths': 2, 'temperature': 'abc', 'client_id': 'bad-temp'},
+        {'flock_id': f1.id, 'date': 'ayer', 'deaths': 2, 'client_id': 'bad-date'},
+        {'flock_id': f1.id, 'date': today, 'deaths': -1, 'client_id': 'bad-deaths'},
+        {'flock_id': f2.id, 'date': today, 'deaths': 3, 'temperature': '31.5', 'client_id': 'ok'},
+    ]}, format='json')
+
+    assert resp.status_code == 200
+    data = resp.json()
+    assert (data['successful'], data['errors']) == (1, 3)
+    assert [d['status'] for d in data['details']] == ['error', 'error', 'error', 'success']
+    assert data['details'][0]['error'].startswith('temperature')
+    assert MortalityRecord.objects.get().temperature == 31.5
+    f1.refresh_from_db()
+    assert f1.current_quantity == 100
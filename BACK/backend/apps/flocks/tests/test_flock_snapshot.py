@@ -0,0 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import DailyWeightRecord, Flock, FlockDailySnapshot, MortalityRecord
+from apps.inventory.models import FoodConsumptionRecord, InventoryItem
+
+
+@pytest.fixture
+def setup_flock():
+    User = get_user_model()
+    user = User.objects.create(username='snap', identification='snap-1', is_staff=True)
+    farm = Farm.objects.create(name='Snap Farm', location='', farm_manager=user)
+    shed = Shed.objects.create(name='Snap Shed', farm=farm, capacity=1000)
+    today = timezone.now().date()
+    flock = Flock.objects.create(
+        arrival_date=today - timedelta(days=20), initial_quantity=100, current_quantity=100,
+        initial_weight=40, breed='Ross', gender='M', supplier='S', shed=shed
+    )
+    item = InventoryItem.objects.create(name='Inicio', unit='KG', farm=farm, current_stock=500)
+    return user, flock, item, today
+
+
+def _snapshot(flock, date):
+    return FlockDailySnapshot.objects.get(flock=flock, date=date)
+
+
+@pytest.mark.django_db
+def test_snapshot_follows_source_writes(setup_flock):
+    user, flock, item, today = setup_flock
+    day1 = today - timedelta(days=3)
+    day2 = today - timedelta(days=1)
+
+    DailyWeightRecord.objects.create(flock=flock, date=day2, average_weight=Decimal('900.00'), sample_size=10, recorded_by=user)
+    FoodConsumptionRecord.objects.create(
+        flock=flock, inventory_item=item, date=day2, quantity_consumed=Decimal('12.50'),
+        fifo_details=[], recorded_by=user
+    )
+    assert _snapshot(flock, day2).live_birds == 100
+    assert _snapshot(flock, day2).feed_kg == Decimal('12.50')
+    assert _snapshot(flock, day2).average_weight == Decimal('900.00')
+
+    # Una mortalidad anterior descuenta aves vivas también en los días siguientes
+    mortality = MortalityRecord.objects.create(flock=flock, date=day1, deaths=4, recorded_by=user)
+    assert _snapshot(flock, day1).deaths == 4
+    assert _snapshot(flock, day1).live_birds == 96
+    assert _snapshot(flock, day2).live_birds == 96
+
+    mortality.delete()
+    assert _snapshot(flock, day1).deaths == 0
+    assert _snapshot(flock, day2).live_birds == 100
+
+
+@pytest.mark.django_db
+def test_backfill_command_rebuilds_snapshots(setup_flock):
+    user, flock, item, today = setup_flock
+    day1 = today - timedelta(days=2)
+    day2 = today - timedelta(days=1)
+    MortalityRecord.objects.create(flock=flock, date=day1, deaths=3, recorded_by=user)
+    MortalityRecord.objects.create(flock=flock, date=day2, deaths=2, recorded_by=user)
+
+    FlockDailySnapshot.objects.all().delete()
+    FlockDailySnapshot.objects.create(flock=flock, date=today - timedelta(days=10), live_birds=1)
+
+    call_command('backfill_flock_snapshots', flocks=[flock.id])
+
+    rows = list(FlockDailySnapshot.objects.filter(flock=flock).values_list('date', 'deaths', 'live_birds'))
+    assert rows == [(day1, 3, 97), (day2, 2, 95)]
+
+
+@pytest.mark.django_db
+def test_snapshot_upsert_without_conflict_target(setup_flock):
+    # MySQL no admite unique_fields en bulk_create(update_conflicts=True)
+    from unittest import mock
+    from django.db import connection
+
+    user, flock, item, today = setup_flock
+    day = today - timedelta(days=1)
+    with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+        weight = DailyWeightRecord.objects.create(flock=flock, date=day, average_weight=Decimal('900.00'), sample_size=10, recorded_by=user)
+        MortalityRecord.objects.create(flock=flock, date=day, deaths=4, recorded_by=user)
+        MortalityRecord.objects.create(flock=flock, date=today, deaths=1, recorded_by=user)
+
+        assert FlockDailySnapshot.objects.filter(flock=flock).count() == 2
+        snapshot = _snapshot(flock, day)
+        assert (snapshot.average_weight, snapshot.deaths, snapshot.live_birds) == (Decimal('900.00'), 4, 96)
+
+        weight.delete()
+        assert _snapshot(flock, day).average_weight is None
@@ -0,0 +1,120 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import BreedReference, DailyWeightRecord, Flock
+from apps.flocks.services_forecast import GrowthForecastService
+
+# Curva de Gompertz usada para generar los pesajes sintéticos
+A, B, K = 6000.0, 4.6, 0.04
+
+
+def gompertz(age):
+    return A * math.exp(-B * math.exp(-K * age))
+
+
+@pytest.fixture
+def farm_setup():
+    User = get_user_model()
+    user = User.objects.create(username='forecast', identification='fc-1', is_staff=True)
+    farm = Farm.objects.create(name='Forecast Farm', location='', farm_manager=user)
+    shed = Shed.objects.create(name='F1', farm=farm, capacity=10000)
+    return user, shed
+
+
+def _flock(shed, breed='Ross', age=30):
+    return Flock.objects.create(
+        arrival_date=timezone.now().date() - timedelta(days=age), initial_quantity=100, current_quantity=100,
+        initial_weight=Decimal(str(round(gompertz(0), 2))), breed=breed, gender='M', supplier='S', shed=shed
+    )
+
+
+def _weigh(flock, user, ages):
+    for age in ages:
+        DailyWeightRecord.objects.create(
+            flock=flock, date=flock.arrival_date + timedelta(days=age),
+            average_weight=Decimal(str(round(gompertz(age), 2))), sample_size=10, recorded_by=user
+        )
+
+
+@pytest.mark.django_db
+def test_batch_fit_projects_weight_and_target_date(farm_setup):
+    user, shed = farm_setup
+    first = _flock(shed)
+    second = _flock(shed, age=20)
+    _weigh(first, user, range(3, 31, 3))
+    _weigh(second, user, range(2, 21, 2))
+
+    assert GrowthForecastService.refresh_active_forecasts() == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        projected = GrowthForecastService.projected_weight(first, 42)
+    assert len(queries.captured_queries) == 0
+    assert abs(float(projected) - gompertz(42)) / gompertz(42) < 0.02
+
+    target = GrowthForecastService.expected_date_for_weight(second, 2500)
+    expected_age = -math.log(-math.log(2500 / A) / B) / K
+    assert abs((target - second.arrival_date).days - expected_age) <= 2
+
+
+@pytest.mark.django_db
+def test_reference_curve_acts_as_prior_and_new_weight_invalidates(farm_setup):
+    user, shed = farm_setup
+    for age in (0, 7, 14, 21, 28, 35, 42):
+        BreedReference.objects.create(breed='Cobb', age_days=age, expected_weight=round(gompertz(age), 2))
+    flock = _flock(shed, breed='Cobb', age=5)
+
+    # Solo el peso inicial: la predicción sigue la curva de referencia
+    projected = float(GrowthForecastService.projected_weight(flock, 35))
+    assert abs(projected - gompertz(35)) / gompertz(35) < 0.05
+
+    _weigh(flock, user, [4])
+    assert GrowthForecastService.get_curve(flock).observations == 2
+
+
+@pytest.mark.django_db
+def test_forecast_endpoint(farm_setup):
+    user, shed = farm_setup
+    flock = _flock(shed)
+    _weigh(flock, user, range(3, 31, 3))
+    empty = _flock(shed, breed='SinReferencia')
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    resp = client.get(f'/api/flocks/{flock.id}/growth-forecast/?day=42&target_weight=2500')
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data['available'] is True
+    assert data['model'] == 'gompertz'
+    assert data['target_date'] is not None
+    assert abs(float(data['projected_weight']) - gompertz(42)) / gompertz(42) < 0.02
+
+    resp = client.get(f'/api/flocks/{empty.id}/growth-forecast/')
+    assert resp.status_code == 200
+    assert resp.json()['available'] is False
+
+    resp = client.get(f'/api/flocks/{flock.id}/growth-forecast/?day=abc')
+    assert resp.status_code == 400
+
+    for value in ('NaN', 'Infinity'):
+        resp = client.get(f'/api/flocks/{flock.id}/growth-forecast/?target_weight={value}')
+        assert resp.status_code == 400
+    assert GrowthForecastService.expected_date_for_weight(flock, float('nan')) is None
+
+    for query in ('day=-1', 'day=-100000', 'day=366', 'target_weight=0', 'target_weight=-5',
+                  'target_weight=123456789', 'target_weight=1e30'):
+        resp = client.get(f'/api/flocks/{flock.id}/growth-forecast/?{query}')
+        assert resp.status_code == 400, query
+
+    # El servicio tampoco desborda si se llama directamente con edades extremas
+    curve = GrowthForecastService.fit_flocks([flock])[flock.id]
+    assert curve.weight_at(-100000) == 0.0
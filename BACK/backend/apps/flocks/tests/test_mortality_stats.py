@@ -43,3 +43,44 @@ def test_mortality_stats_endpoint():
     data = resp.json()
     assert data.get('total_deaths') == 5
     assert 'mortality_rate' in data
+
+
+@pytest.mark.django_db
+def test_mortality_stats_single_query_and_invalidation(django_assert_max_num_queries):
+    from apps.flocks.services import MortalityService
+
+    User = get_user_model()
+    user = User.objects.create_user(username='stats', password='pass', identification='2', is_staff=True, email='stats@example.com')
+    farm = Farm.objects.create(name='Stats Farm', location='Somewhere', farm_manager=user)
+    shed = Shed.objects.create(name='Shed S', capacity=1000, farm=farm)
+    today = timezone.now().date()
+    flock = Flock.objects.create(
+        arrival_date=today - timedelta(days=100),
+        initial_quantity=200,
+        current_quantity=200,
+        initial_weight=100.0,
+        breed='TestBreed',
+        gender='M',
+        supplier='Supplier X',
+        shed=shed,
+        created_by=user
+    )
+    MortalityRecord.objects.create(flock=flock, date=today - timedelta(days=40), deaths=6, recorded_by=user)
+    MortalityRecord.objects.create(flock=flock, date=today - timedelta(days=2), deaths=4, recorded_by=user)
+
+    with django_assert_max_num_queries(1):
+        stats = MortalityService.calculate_mortality_stats(flock, days=90)
+
+    assert len(stats['series']) == 90
+    assert stats['total_deaths'] == 10
+    assert stats['worst_day']['deaths'] == 6
+    assert stats['series'][-3]['deaths'] == 4
+    assert stats['series'][-1]['deaths'] == 0
+
+    # Segunda lectura servida desde caché
+    with django_assert_max_num_queries(0):
+        MortalityService.calculate_mortality_stats(flock, days=90)
+
+    MortalityRecord.objects.create(flock=flock, date=today, deaths=1, recorded_by=user)
+    flock.refresh_from_db()
+    assert MortalityService.calculate_mortality_stats(flock, days=90)['total_deaths'] == 11
@@ -0,0 +1,73 @@
+import pytest
+from decimal import Decimal
+
+from apps.flocks.models import BreedReference
+from apps.flocks.reference_cache import BreedReferenceCache
+
+
+@pytest.mark.django_db
+def test_curve_point_uses_latest_active_version(django_assert_num_queries):
+    BreedReference.objects.create(breed='Ross', age_days=7, expected_weight='150.00', tolerance_range='10.00', version=1, is_active=False)
+    BreedReference.objects.create(breed='Ross', age_days=7, expected_weight='160.00', tolerance_range='8.00', version=2)
+    BreedReference.objects.create(breed='Ross', age_days=14, expected_weight='400.00', version=1)
+
+    point = BreedReferenceCache.get_point('Ross', 7)
+    assert point.expected_weight == Decimal('160.00')
+    assert point.tolerance_range == Decimal('8.00')
+    assert BreedReferenceCache.get_point('Ross', 21) is None
+
+    # Lecturas siguientes no tocan la tabla de referencias
+    with django_assert_num_queries(0):
+        assert BreedReferenceCache.get_point('Ross', 14).expected_weight == Decimal('400.00')
+
+
+@pytest.mark.django_db
+def test_writes_bump_version_and_reload_curve():
+    BreedReference.objects.create(breed='Cobb', age_days=7, expected_weight='150.00')
+    curve = BreedReferenceCache.get_curve('Cobb')
+
+    BreedReference.objects.filter(breed='Cobb', age_days=7).update(is_active=False)
+    BreedReference.objects.create(breed='Cobb', age_days=7, expected_weight='155.00', version=2)
+
+    reloaded = BreedReferenceCache.get_curve('Cobb')
+    assert reloaded is not curve
+    assert reloaded.point(7).expected_weight == Decimal('155.00')
+
+
+@pytest.mark.django_db
+def test_weekly_points_are_interpolated_for_missing_days():
+    BreedReference.objects.create(breed='Ross', age_days=7, expected_weight='160.00', expected_consumption='20.00', tolerance_range='10.00')
+    BreedReference.objects.create(breed='Ross', age_days=14, expected_weight='440.00', expected_consumption='48.00', tolerance_range='6.00')
+
+    point = BreedReferenceCache.get_point('Ross', 10)
+    assert point.expected_weight == Decimal('280.00')
+    assert point.expected_consumption == Decimal('32.00')
+    assert point.tolerance_range == Decimal('8.29')
+    # Sin extrapolación fuera de la tabla
+    assert BreedReferenceCache.get_point('Ross', 3) is None
+
+
+@pytest.mark.django_db
+def test_lookup_pairs_evaluates_many_flocks_at_once(django_assert_max_num_queries):
+    import numpy as np
+    from datetime import date
+    from types import SimpleNamespace
+
+    BreedReference.objects.create(breed='Ross', age_days=0, expected_weight='40.00')
+    BreedReference.objects.create(breed='Ross', age_days=10, expected_weight='240.00')
+    BreedReference.objects.create(breed='Cobb', age_days=0, expected_weight='50.00')
+    BreedReference.objects.create(breed='Cobb', age_days=10, expected_weight='250.00')
+
+    ross = SimpleNamespace(breed='Ross', arrival_date=date(2025, 1, 1))
+    cobb = SimpleNamespace(breed='Cobb', arrival_date=date(2025, 1, 1))
+    pairs = [(ross, date(2025, 1, 6)), (cobb, date(2025, 1, 6)), (ross, date(2025, 3, 1))]
+
+    # Una consulta por raza, independiente del número de pares
+    with django_assert_max_num_queries(2):
+        curve = BreedReferenceCache.lookup_pairs(pairs)
+    assert curve.expected_weight[:2].tolist() == [140.0, 150.0]
+    assert np.isnan(curve.expected_weight[2])
+
+    deviation = BreedReferenceCache.deviation_for_pairs(pairs, [154, 135, 500])
+    assert deviation[:2].round(2).tolist() == [10.0, 10.0]
+    assert np.isnan(deviation[2])
@@ -0,0 +1,146 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from apps.flocks.models import BreedReference, ReferenceImportLog
+from apps.flocks.services import BreedReferenceService
+
+User = get_user_model()
+
+
+class BreedReferenceStreamingImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='importer-stream', identification='importer-2')
+
+    def _make_xlsx(self, rows):
+        wb = Workbook()
+        ws = wb.active
+        for r in rows:
+            ws.append(r)
+
+        tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        wb.save(tmp.name)
+        tmp.close()
+        return tmp.name
+
+    def test_import_versions_existing_rows_and_repeated_keys(self):
+        BreedReference.objects.create(breed='Ross', age_days=7, expected_weight=140.0, version=1)
+
+        path = self._make_xlsx([
+            ['breed', 'age_days', 'expected_weight', 'expected_consumption', 'tolerance_range'],
+            ['Ross', 7, 150.0, 20.0, 10.0],
+            ['Ross', 14, 400.0, 45.0, 8.0],
+            ['Ross', 14, 410.0, 46.0, 8.0],
+            ['Ross', None, 100.0, 10.0, 10.0],
+            ['Ross', 21, 'pesado', 10.0, 10.0],
+        ])
+
+        log = BreedReferenceService.import_from_excel(path, self.user)
+
+        self.assertEqual(log.total_rows, 5)
+        self.assertEqual(log.successful_imports, 3)
+        self.assertEqual(log.errors, 2)
+        self.assertTrue(log.error_details[0].startswith('row 5:'))
+        self.assertTrue(log.error_details[1].startswith('row 6:'))
+
+        active = BreedReference.objects.filter(breed='Ross', is_active=True).order_by('age_days')
+        self.assertEqual([(r.age_days, r.version, float(r.expected_weight)) for r in active], [(7, 2, 150.0), (14, 2, 410.0)])
+        self.assertEqual(BreedReference.objects.filter(breed='Ross').count(), 4)
+
+    def test_import_reports_missing_columns(self):
+        path = self._make_xlsx([['breed', 'expected_weight'], ['Ross', 150.0]])
+
+        log = BreedReferenceService.import_from_excel(path, self.user)
+
+        self.assertEqual(log.successful_imports, 0)
+        self.assertEqual(log.error_details, ["missing columns: ['age_days']"])
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        header = ['breed', 'age_days', 'expected_weight']
+        small = self._make_xlsx([header] + [['Cobb', d, 50.0 + d] for d in range(3)])
+        large = self._make_xlsx([header] + [['Hubbard', d, 50.0 + d] for d in range(300)])
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            BreedReferenceService.import_from_excel(small, self.user)
+        with CaptureQueriesContext(connection) as large_ctx:
+            log = BreedReferenceService.import_from_excel(large, self.user)
+
+        self.assertEqual(log.successful_imports, 300)
+        # Solo crecen los INSERT que el backend parte por límite de parámetros
+        self.assertLess(len(large_ctx.captured_queries), len(small_ctx.captured_queries) + 10)
+
+
+class BreedReferenceAsyncImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='importer-async', identification='importer-3', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _make_xlsx(self, rows):
+        wb = Workbook()
+        ws = wb.active
+        for r in rows:
+            ws.append(r)
+
+        tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        wb.save(tmp.name)
+        tmp.close()
+        return tmp.name
+
+    def test_upload_queues_import_and_reports_progress(self):
+        path = self._make_xlsx([
+            ['breed', 'age_days', 'expected_weight'],
+            ['Ross', 7, 150.0],
+            ['Ross', 14, 'pesado'],
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with open(path, 'rb') as fh:
+                resp = self.client.post('/api/references/import-excel/', {'file': fh}, format='multipart')
+
+            self.assertEqual(resp.status_code, 202)
+            self.assertEqual(resp.json()['status'], 'PENDING')
+
+        log_id = resp.json()['id']
+
+        resp = self.client.get(f'/api/references/import-logs/{log_id}/')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['status'], 'COMPLETED')
+        self.assertEqual(data['total_rows'], 2)
+        self.assertEqual(data['processed_rows'], 2)
+        self.assertEqual(data['successful_imports'], 1)
+        self.assertEqual(data['errors'], 1)
+
+    def test_missing_columns_marks_log_failed(self):
+        path = self._make_xlsx([['breed', 'age_days'], ['Ross', 7]])
+        log = BreedReferenceService.create_import_log('bad.xlsx', self.user)
+
+        log = BreedReferenceService.import_from_excel(path, self.user, log=log)
+
+        log.refresh_from_db()
+        self.assertEqual(log.status, 'FAILED')
+        self.assertEqual(ReferenceImportLog.objects.count(), 1)
+
+    def test_unknown_log_returns_404(self):
+        resp = self.client.get('/api/references/import-logs/999999/')
+        self.assertEqual(resp.status_code, 404)
+
+        resp = self.client.get('/api/references/import-logs/abc/')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_log_is_only_visible_to_its_importer_or_staff(self):
+        log = BreedReferenceService.create_import_log('ajeno.xlsx', self.user)
+        owner = User.objects.create(username='importer-owner', identification='importer-4')
+        own_log = BreedReferenceService.create_import_log('propio.xlsx', owner)
+        other = APIClient()
+        other.force_authenticate(owner)
+
+        self.assertEqual(other.get(f'/api/references/import-logs/{log.id}/').status_code, 404)
+        self.assertEqual(other.get(f'/api/references/import-logs/{own_log.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/references/import-logs/{own_log.id}/').status_code, 200)
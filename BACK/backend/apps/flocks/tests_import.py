@@ -33,12 +33,17 @@ class BreedReferenceEndpointImportTests(TestCase):
             ['Ross', 7, 150.0, 20.0, 10.0],
         ])
 
-        with open(path, 'rb') as fh:
-            resp = self.client.post('/api/references/import-excel/', {'file': fh}, format='multipart')
+        with self.captureOnCommitCallbacks(execute=True):
+            with open(path, 'rb') as fh:
+                resp = self.client.post('/api/references/import-excel/', {'file': fh}, format='multipart')
 
+        self.assertEqual(resp.status_code, 202)
+        log_id = resp.json()['id']
+
+        resp = self.client.get(f'/api/references/import-logs/{log_id}/')
         self.assertEqual(resp.status_code, 200)
         data = resp.json()
-        self.assertIn('successful_imports', data)
+        self.assertEqual(data['status'], 'COMPLETED')
         self.assertEqual(data['successful_imports'], 1)
 
     def test_import_endpoint_missing_file(self):
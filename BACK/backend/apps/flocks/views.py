@@ -6,7 +6,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .services import MortalityService
 from drf_spectacular.utils import extend_schema
-from .serializers import MortalityStatsSerializer
+from .serializers import MortalityStatsSerializer, GrowthForecastSerializer
+from .services_forecast import GrowthForecastService, MAX_FORECAST_AGE, MAX_TARGET_WEIGHT
+from decimal import Decimal, InvalidOperation
 
 
 class FlockViewSet(viewsets.ModelViewSet):
@@ -47,20 +49,36 @@ class FlockViewSet(viewsets.ModelViewSet):
 
         stats = MortalityService.calculate_mortality_stats(flock, days=days)
 
-        # Serialize any model instances (e.g., worst_day) into primitives
-        worst = stats.get('worst_day')
-        if worst is not None:
-            try:
-                stats['worst_day'] = {
-                    'id': worst.id,
-                    'date': worst.date.isoformat(),
-                    'deaths': worst.deaths,
-                }
-            except Exception:
-                # If worst is not a model instance, keep as-is
-                pass
-
         return Response(stats, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='growth-forecast')
+    @extend_schema(
+        responses=GrowthForecastSerializer,
+        description="Predicción de crecimiento (Gompertz) del lote. Query params: `day` (edad en días para el peso proyectado, default edad actual) y `target_weight` (gramos) para estimar la fecha en que se alcanza.",
+    )
+    def growth_forecast(self, request, pk=None):
+        """Return the projected weight at a given age and the date a target weight is reached."""
+        flock = self.get_object()
+        try:
+            day = request.query_params.get('day')
+            day = int(day) if day is not None else None
+            target_weight = request.query_params.get('target_weight')
+            target_weight = Decimal(target_weight) if target_weight is not None else None
+        except (TypeError, ValueError, InvalidOperation):
+            return Response({'detail': 'day y target_weight deben ser numéricos'}, status=status.HTTP_400_BAD_REQUEST)
+        # Decimal acepta 'NaN' e 'Infinity'
+        if target_weight is not None and not target_weight.is_finite():
+            return Response({'detail': 'day y target_weight deben ser numéricos'}, status=status.HTTP_400_BAD_REQUEST)
+        if day is not None and not 0 <= day <= MAX_FORECAST_AGE:
+            return Response({'detail': f'day debe estar entre 0 y {MAX_FORECAST_AGE}'}, status=status.HTTP_400_BAD_REQUEST)
+        if target_weight is not None and not 0 < target_weight <= MAX_TARGET_WEIGHT:
+            return Response(
+                {'detail': f'target_weight debe ser mayor a 0 y no superar {MAX_TARGET_WEIGHT}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        forecast = GrowthForecastService.forecast(flock, age_days=day, target_weight=target_weight)
+        return Response(GrowthForecastSerializer(forecast).data, status=status.HTTP_200_OK)
 from django.shortcuts import render
 
 # Create your views here.
@@ -73,10 +91,12 @@ from django.db import transaction
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
-from .models import BreedReference
+from .models import BreedReference, ReferenceImportLog
 from .serializers import BreedReferenceSerializer, ReferenceImportLogSerializer
 from .permissions import IsAssignedShedWorkerOrFarmAdmin
 from .services import BreedReferenceService
+from .reference_cache import BreedReferenceCache
+from .tasks import import_breed_references_task
 
 
 class BreedReferenceViewSet(viewsets.ModelViewSet):
@@ -97,19 +117,39 @@ class BreedReferenceViewSet(viewsets.ModelViewSet):
 
             serializer.save(created_by=user, version=new_version, is_active=True)
 
+        BreedReferenceCache.invalidate()
+
     @action(detail=False, methods=['post'], url_path='import-excel')
     def import_excel(self, request):
-        """Upload an Excel file and import breed references. Returns import log summary."""
+        """Upload an Excel file and queue the breed reference import.
+
+        Returns 202 with the pending import log; poll import-logs/<id> for progress.
+        """
         uploaded = request.FILES.get('file')
         if not uploaded:
             return Response({'detail': 'file required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # save temporarily
+        # save temporarily; the task removes the file once processed
         path = default_storage.save(f'tmp/{uploaded.name}', ContentFile(uploaded.read()))
-        # default_storage.path may not be available in some deployments; prefer path value
-        file_path = getattr(default_storage, 'path', lambda p: p)(path)
 
-        log = BreedReferenceService.import_from_excel(file_path, request.user)
+        log = BreedReferenceService.create_import_log(uploaded.name, request.user)
+        transaction.on_commit(lambda: import_breed_references_task.delay(log.id, path))
+
+        serializer = ReferenceImportLogSerializer(log)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'import-logs/(?P<log_id>\d+)')
+    def import_log(self, request, log_id=None):
+        """Return the status and progress of a reference import.
+
+        Staff can read any log; other users only the imports they started.
+        """
+        logs = ReferenceImportLog.objects.filter(pk=log_id)
+        if not request.user.is_staff:
+            logs = logs.filter(imported_by=request.user)
+        log = logs.first()
+        if log is None:
+            return Response({'detail': 'not found'}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = ReferenceImportLogSerializer(log)
         return Response(serializer.data)
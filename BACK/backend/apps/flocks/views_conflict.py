@@ -5,6 +5,8 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse
 from drf_spectacular.utils import OpenApiExample
 from django.utils import timezone
 
+from avicolatrack.pagination import KeysetPagination
+
 from .models import SyncConflict
 from .serializers_conflict import FlocksSyncConflictSerializer, FlocksResolveConflictSerializer
 
@@ -13,12 +15,15 @@ class SyncConflictViewSet(viewsets.ModelViewSet):
     queryset = SyncConflict.objects.all().order_by('-created_at')
     # Provide a serializer for schema generation and simple CRUD
     serializer_class = FlocksSyncConflictSerializer
+    pagination_class = KeysetPagination
 
     def list(self, request, *args, **kwargs):
         """
         List unresolved sync conflicts.
         """
-        conflicts = self.queryset.filter(resolved_at__isnull=True)
+        conflicts = self.paginate_queryset(
+            self.queryset.filter(resolved_at__isnull=True).select_related('flock', 'resolved_by')
+        )
         data = [
             {
                 'id': c.id,
@@ -32,7 +37,7 @@ class SyncConflictViewSet(viewsets.ModelViewSet):
             }
             for c in conflicts
         ]
-        return Response(data)
+        return self.get_paginated_response(data)
 
     @extend_schema(request=FlocksResolveConflictSerializer)
     @extend_schema(
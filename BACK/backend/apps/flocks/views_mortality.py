@@ -1,8 +1,10 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
 
+from apps.sync.streaming import BulkSyncStream
+
 from .serializers_mortality import (
     MortalityBulkRequestSerializer,
     MortalityBulkResultSerializer
@@ -12,7 +14,7 @@ from .services import MortalityService
 
 class MortalityViewSet(viewsets.ViewSet):
     @extend_schema(
-        description='Sincroniza en bloque registros de mortalidad desde dispositivos móviles.',
+        description='Sincroniza en bloque registros de mortalidad desde dispositivos móviles. Un reintento con los mismos client_id (cabecera X-Device-ID) devuelve el resultado original sin volver a registrar la mortalidad. Acepta y devuelve opcionalmente NDJSON (application/x-ndjson, un registro por línea, con gzip) procesado por bloques.',
         request=MortalityBulkRequestSerializer,
         responses=OpenApiResponse(response=MortalityBulkResultSerializer),
         examples=[
@@ -27,16 +29,22 @@ class MortalityViewSet(viewsets.ViewSet):
             })
         ]
     )
-    @action(detail=False, methods=['post'], url_path='bulk-sync')
+    @action(
+        detail=False, methods=['post'], url_path='bulk-sync',
+        parser_classes=api_settings.DEFAULT_PARSER_CLASSES + BulkSyncStream.parser_classes,
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + BulkSyncStream.renderer_classes,
+    )
     def bulk_sync(self, request):
-        payload = request.data.get('mortality_records', [])
-        results = MortalityService.register_mortality_batch(payload, request.user)
-
-        summary = {
-            'total': len(payload),
-            'successful': sum(1 for r in results if r.get('status') == 'success'),
-            'errors': sum(1 for r in results if r.get('status') == 'error'),
-            'details': results
-        }
+        payload = BulkSyncStream.records(request, 'mortality_records')
+        device_id = request.META.get('HTTP_X_DEVICE_ID')
 
-        return Response(summary)
+        return BulkSyncStream.response(
+            request,
+            payload,
+            lambda chunk: MortalityService.register_mortality_batch(chunk, request.user, device_id),
+            lambda total, counts: {
+                'total': total,
+                'successful': counts['success'],
+                'errors': counts['error'],
+            }
+        )
@@ -3,14 +3,15 @@ from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from django.utils.dateparse import parse_date
-from decimal import Decimal
+from django.db.models import (
+    Count, DateField, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 
 from .models import DailyWeightRecord, BreedReference
-from .models import SyncConflict
+from .services_weight import WeightSyncService
+from .dashboard_cache import DashboardCache
 from .serializers_weight import (
     DailyWeightSerializer,
     BreedReferenceSerializer,
@@ -19,15 +20,19 @@ from .serializers_weight import (
     DashboardResponseSerializer,
 )
 from drf_spectacular.utils import OpenApiExample
+from rest_framework.settings import api_settings
 from apps.farms.models import Shed
+from apps.sync.streaming import BulkSyncStream
+from avicolatrack.pagination import DateKeysetPagination
 
 
 class DailyWeightViewSet(viewsets.ModelViewSet):
     queryset = DailyWeightRecord.objects.all()
     serializer_class = DailyWeightSerializer
+    pagination_class = DateKeysetPagination
 
     @extend_schema(
-        description='Sincroniza en bloque registros de peso promedio desde dispositivos móviles. Devuelve un resumen con detalles por client_id indicando si se creó, se promedió o se reportó conflicto.',
+        description='Sincroniza en bloque registros de peso promedio desde dispositivos móviles. Devuelve un resumen con detalles por client_id indicando si se creó, se promedió o se reportó conflicto. Un reintento con los mismos client_id (cabecera X-Device-ID) devuelve el resultado original. Acepta y devuelve opcionalmente NDJSON (application/x-ndjson, un registro por línea, con gzip) procesado por bloques.',
         request=BulkSyncRequestSerializer,
         responses=OpenApiResponse(response=BulkSyncResultSerializer),
         examples=[
@@ -46,98 +51,31 @@ class DailyWeightViewSet(viewsets.ModelViewSet):
             )
         ]
     )
-    @action(detail=False, methods=['post'], url_path='bulk-sync')
+    @action(
+        detail=False, methods=['post'], url_path='bulk-sync',
+        parser_classes=api_settings.DEFAULT_PARSER_CLASSES + BulkSyncStream.parser_classes,
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + BulkSyncStream.renderer_classes,
+    )
     def bulk_sync_weights(self, request):
         device_id = request.META.get('HTTP_X_DEVICE_ID', 'unknown')
-        weight_records = request.data.get('weight_records', [])
-
-        sync_results = {
-            'total': len(weight_records),
-            'successful': 0,
-            'conflicts': 0,
-            'errors': 0,
-            'details': []
-        }
-
-        for record_data in weight_records:
-            try:
-                result = self._process_weight_sync(record_data, request.user, device_id)
-                sync_results[result['status']] += 1
-                sync_results['details'].append(result)
-            except Exception as e:
-                sync_results['errors'] += 1
-                sync_results['details'].append({
-                    'client_id': record_data.get('client_id'),
-                    'status': 'error',
-                    'error': str(e)
-                })
-
-        return Response(sync_results)
-
-    def _process_weight_sync(self, record_data, user, device_id):
-        flock_id = record_data['flock_id']
-        date = parse_date(record_data['date'])
-        weight = Decimal(record_data['average_weight'])
-        client_id = record_data.get('client_id')
-
-        existing = DailyWeightRecord.objects.filter(flock_id=flock_id, date=date).first()
-        if existing:
-            if abs(existing.average_weight - weight) < Decimal('50'):
-                new_weight = (existing.average_weight + weight) / 2
-                existing.average_weight = new_weight
-                existing.sync_status = 'SYNCED'
-                existing.save()
-                return {
-                    'client_id': client_id,
-                    'status': 'successful',
-                    'resolution': 'averaged',
-                    'server_id': existing.id
-                }
-            else:
-                # Persist conflict for manual resolution
-                conflict = SyncConflict.objects.create(
-                    source='daily_weight',
-                    client_id=client_id,
-                    payload={
-                        'flock_id': flock_id,
-                        'date': date.isoformat(),
-                        'existing_server_weight': str(existing.average_weight),
-                        'incoming_weight': str(weight),
-                    },
-                    flock_id=flock_id
-                )
-
-                return {
-                    'client_id': client_id,
-                    'status': 'conflicts',
-                    'error': 'manual_conflict_required',
-                    'server_conflict_id': conflict.id
-                }
-
-        weight_record = DailyWeightRecord.objects.create(
-            flock_id=flock_id,
-            date=date,
-            average_weight=weight,
-            sample_size=record_data.get('sample_size', 10),
-            recorded_by=user,
-            client_id=client_id,
-            created_by_device=device_id
+        weight_records = BulkSyncStream.records(request, 'weight_records')
+
+        return BulkSyncStream.response(
+            request,
+            weight_records,
+            lambda chunk: WeightSyncService.bulk_sync(chunk, request.user, device_id)['details'],
+            lambda total, counts: {
+                'total': total,
+                'successful': counts['successful'],
+                'conflicts': counts['conflicts'],
+                'errors': counts['error'],
+            }
         )
 
-        # Placeholder for alarms check
-        # self._check_weight_alarms(weight_record)
-
-        return {
-            'client_id': client_id,
-            'status': 'successful',
-            'server_id': weight_record.id
-        }
-
 
 class ShedDashboardView(APIView):
-    @method_decorator(cache_page(120))
     @extend_schema(
-        description='Vista resumida del estado de los galpones accesibles al usuario. Incluye resumen de capacidad/ocupación, listado de galpones con indicadores y la hora del último cálculo.',
+        description='Vista resumida del estado de los galpones accesibles al usuario. Incluye resumen de capacidad/ocupación, listado de galpones con indicadores y la hora del último cálculo. La respuesta se cachea por conjunto de galpones accesibles y se invalida al registrar pesos, mortalidad o cambios de lotes.',
         responses=OpenApiResponse(response=DashboardResponseSerializer),
         examples=[
             OpenApiExample(
@@ -153,6 +91,7 @@ class ShedDashboardView(APIView):
                             'occupancy': {'current': 200, 'capacity': 300, 'percentage': 66.67},
                             'flocks': {'active_count': 2, 'avg_age': 15.5, 'total_birds': 200},
                             'last_activity': {'weight_date': '2025-09-28'},
+                            'alerts_count': 1,
                             'status_indicator': {'color': 'green', 'message': 'Al día'}
                         }
                     ],
@@ -164,14 +103,20 @@ class ShedDashboardView(APIView):
     )
     def get(self, request):
         user = request.user
-        accessible_sheds = self._get_accessible_sheds(user)
+        shed_ids = list(self._get_accessible_sheds(user).values_list('id', flat=True))
+
+        cache_key, dashboard_data = DashboardCache.get(shed_ids)
+        if dashboard_data is None:
+            sheds = list(self._annotate_sheds(Shed.objects.filter(id__in=shed_ids)))
+            alerts_by_shed = self._count_pending_alerts(sheds)
 
-        dashboard_data = {
-            'summary': self._calculate_farm_summary(accessible_sheds),
-            'sheds': self._get_sheds_detail(accessible_sheds),
-            'alerts_count': self._count_pending_alerts(accessible_sheds),
-            'last_updated': timezone.now().isoformat()
-        }
+            dashboard_data = {
+                'summary': self._calculate_farm_summary(sheds),
+                'sheds': self._get_sheds_detail(sheds, alerts_by_shed),
+                'alerts_count': sum(alerts_by_shed.values()),
+                'last_updated': timezone.now().isoformat()
+            }
+            DashboardCache.set(cache_key, dashboard_data)
 
         return Response(dashboard_data)
 
@@ -200,17 +145,35 @@ class ShedDashboardView(APIView):
 
         return Shed.objects.none()
 
+    def _annotate_sheds(self, sheds):
+        """Una sola consulta con los agregados de lotes activos y la fecha del último pesaje por galpón"""
+        today = timezone.now().date()
+        active = Q(flocks__status='ACTIVE')
+        last_weight = DailyWeightRecord.objects.filter(
+            flock__shed=OuterRef('pk')
+        ).order_by('-date').values('date')[:1]
+
+        return sheds.select_related('farm', 'assigned_worker').annotate(
+            active_flocks=Count('flocks', filter=active),
+            active_birds=Coalesce(Sum('flocks__current_quantity', filter=active), 0),
+            active_age_total=Sum(
+                ExpressionWrapper(Value(today, output_field=DateField()) - F('flocks__arrival_date'),
+                                  output_field=DurationField()),
+                filter=active
+            ),
+            last_weight_date=Subquery(last_weight, output_field=DateField()),
+        ).order_by('farm_id', 'name')
+
     def _calculate_farm_summary(self, sheds):
         total_capacity = sum(s.capacity for s in sheds)
         total_occupancy = sum(s.current_occupancy for s in sheds)
         return {'total_capacity': total_capacity, 'total_occupancy': total_occupancy}
 
-    def _get_sheds_detail(self, sheds):
+    def _get_sheds_detail(self, sheds, alerts_by_shed=None):
+        alerts_by_shed = alerts_by_shed or {}
         sheds_data = []
         for shed in sheds:
-            active_flocks = shed.flocks.filter(status='ACTIVE')
-            last_weight = shed.weight_records.order_by('-date').first() if hasattr(shed, 'weight_records') else None
-            last_mortality = None
+            age_total = shed.active_age_total.days if shed.active_age_total else 0
             sheds_data.append({
                 'id': shed.id,
                 'name': shed.name,
@@ -222,41 +185,42 @@ class ShedDashboardView(APIView):
                     'percentage': shed.occupancy_percentage
                 },
                 'flocks': {
-                    'active_count': active_flocks.count(),
-                    'avg_age': sum(f.current_age_days for f in active_flocks) / (active_flocks.count() or 1),
-                    'total_birds': sum(f.current_quantity for f in active_flocks)
+                    'active_count': shed.active_flocks,
+                    'avg_age': age_total / (shed.active_flocks or 1),
+                    'total_birds': shed.active_birds
                 },
                 'last_activity': {
-                    'weight_date': last_weight.date if last_weight else None,
+                    'weight_date': shed.last_weight_date,
                 },
-                'status_indicator': self._get_status_indicator(shed, last_weight)
+                'alerts_count': alerts_by_shed.get(shed.id, 0),
+                'status_indicator': self._get_status_indicator(shed, shed.last_weight_date)
             })
 
         return sheds_data
 
     def _count_pending_alerts(self, sheds):
         """
-        Placeholder implementation: count weight records with a significant deviation
-        or other pending alerts. For now return 0 or a simple computation to keep
-        the endpoint stable. This can be extended later to include mortality,
-        weight deviations, or manual alerts.
+        Count weight records with a significant deviation (> 10% in the last 7 days)
+        per shed, in a single grouped query. Returns {shed_id: count}.
+        This can be extended later to include mortality or manual alerts.
         """
         try:
-            # Example: count weight records with deviation > 10% in the last 7 days
             from datetime import timedelta
-            from .models import DailyWeightRecord
             cutoff = timezone.now().date() - timedelta(days=7)
             shed_ids = [s.id for s in sheds]
-            return DailyWeightRecord.objects.filter(flock__shed_id__in=shed_ids, date__gte=cutoff, deviation_percentage__gt=10).count()
+            rows = DailyWeightRecord.objects.filter(
+                flock__shed_id__in=shed_ids, date__gte=cutoff, deviation_percentage__gt=10
+            ).values('flock__shed_id').annotate(total=Count('id')).order_by()
+            return {row['flock__shed_id']: row['total'] for row in rows}
         except Exception:
-            return 0
+            return {}
 
-    def _get_status_indicator(self, shed, last_weight):
+    def _get_status_indicator(self, shed, last_weight_date):
         today = timezone.now().date()
-        if not last_weight:
+        if not last_weight_date:
             return {'color': 'orange', 'message': 'Sin registros'}
-        if last_weight.date == today:
+        if last_weight_date == today:
             return {'color': 'green', 'message': 'Al día'}
-        if last_weight.date == today - timezone.timedelta(days=1):
+        if last_weight_date == today - timezone.timedelta(days=1):
             return {'color': 'yellow', 'message': 'Pendiente registro'}
         return {'color': 'red', 'message': 'Registros atrasados'}
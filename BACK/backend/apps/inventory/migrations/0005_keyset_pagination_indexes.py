@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0009_keyset_pagination_indexes'),
+        ('inventory', '0004_foodbatch_foodconsumptionrecord'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodconsumptionrecord',
+            index=models.Index(fields=['date', 'id'], name='foodconsumption_date_id_idx'),
+        ),
+    ]
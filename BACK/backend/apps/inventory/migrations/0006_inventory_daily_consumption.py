@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:59
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK = 2000
+
+
+def seed_daily_consumption(apps, schema_editor):
+    # Consumo diario histórico por item desde ambos tipos de registro; la ventana de cada
+    # item se calcula en su próximo consumo o en la verificación nocturna
+    totals = defaultdict(int)
+    for name in ('FoodConsumptionRecord', 'InventoryConsumptionRecord'):
+        rows = apps.get_model('inventory', name).objects.values('inventory_item_id', 'date').annotate(
+            total=models.Sum('quantity_consumed')
+        ).values_list('inventory_item_id', 'date', 'total')
+        for item_id, date, total in rows:
+            totals[item_id, date] += total
+
+    DailyConsumption = apps.get_model('inventory', 'InventoryDailyConsumption')
+    DailyConsumption.objects.bulk_create(
+        [DailyConsumption(inventory_item_id=item_id, date=date, quantity=total) for (item_id, date), total in totals.items()],
+        batch_size=BACKFILL_CHUNK
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='consumption_window_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='consumption_window_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='InventoryDailyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_consumption', to='inventory.inventoryitem')),
+            ],
+            options={
+                'unique_together': {('inventory_item', 'date')},
+            },
+        ),
+        migrations.RunPython(seed_daily_consumption, migrations.RunPython.noop),
+    ]
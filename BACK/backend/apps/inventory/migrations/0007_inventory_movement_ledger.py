@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BACKFILL_CHUNK = 2000
+
+
+def seed_opening_balances(apps, schema_editor):
+    # El stock actual de cada item abre el libro como ajuste de saldo inicial
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    InventoryMovement = apps.get_model('inventory', 'InventoryMovement')
+    today = timezone.now().date()
+    InventoryMovement.objects.bulk_create(
+        [
+            InventoryMovement(
+                inventory_item_id=item_id, movement_type='ADJUSTMENT', date=today,
+                quantity=stock, balance_after=stock, notes='Saldo inicial'
+            )
+            for item_id, stock in InventoryItem.objects.exclude(current_stock=0).values_list('id', 'current_stock')
+        ],
+        batch_size=BACKFILL_CHUNK
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flocks', '0010_flocksummary'),
+        ('inventory', '0006_inventory_daily_consumption'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('RECEIPT', 'Entrada'), ('CONSUMPTION', 'Consumo'), ('ADJUSTMENT', 'Ajuste'), ('TRANSFER_IN', 'Transferencia recibida'), ('TRANSFER_OUT', 'Transferencia enviada')], max_length=20)),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='inventory.foodbatch')),
+                ('counterpart', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.inventoryitem')),
+                ('flock', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to='flocks.flock')),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.inventoryitem')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['inventory_item', 'date', 'id'], name='inventory_movement_item_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('closing_stock', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('received', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('consumed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('adjusted', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transferred_in', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transferred_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.inventoryitem')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('inventory_item', 'date')},
+            },
+        ),
+        migrations.RunPython(seed_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_inventory_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='draw_down_strategy',
+            field=models.CharField(choices=[('FIFO', 'Primero en entrar, primero en salir'), ('FEFO', 'Primero en vencer, primero en salir')], default='FIFO', max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='foodbatch',
+            index=models.Index(condition=models.Q(('current_quantity__gt', 0)), fields=['inventory_item', 'entry_date', 'id'], name='foodbatch_fifo_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodbatch',
+            index=models.Index(condition=models.Q(('current_quantity__gt', 0)), fields=['inventory_item', 'expiry_date', 'entry_date', 'id'], name='foodbatch_fefo_open_idx'),
+        ),
+    ]
@@ -1,10 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from datetime import timedelta
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
 from apps.farms.models import Farm, Shed
+from apps.sync.change_log import ChangeLog
 
 
 class InventoryItem(models.Model):
@@ -15,17 +15,28 @@ class InventoryItem(models.Model):
 		('BAG', 'Sacos'),
 		('LB', 'Libras')
 	]
+	FIFO = 'FIFO'
+	FEFO = 'FEFO'
+	STRATEGY_CHOICES = [
+		(FIFO, 'Primero en entrar, primero en salir'),
+		(FEFO, 'Primero en vencer, primero en salir'),
+	]
 
 	name = models.CharField(max_length=100)
 	description = models.TextField(blank=True)
 	current_stock = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 	unit = models.CharField(max_length=30, choices=UNIT_CHOICES)
 	minimum_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+	# Orden en que se descuentan los lotes: por fecha de entrada o por vencimiento
+	draw_down_strategy = models.CharField(max_length=4, choices=STRATEGY_CHOICES, default=FIFO)
 
 	farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='inventory')
 	shed = models.ForeignKey(Shed, on_delete=models.CASCADE, null=True, blank=True, related_name='inventory')
 
 	daily_avg_consumption = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+	# Suma de InventoryDailyConsumption en los 30 días que terminan en consumption_window_end
+	consumption_window_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	consumption_window_end = models.DateField(null=True, blank=True)
 	last_restock_date = models.DateField(null=True, blank=True)
 	last_consumption_date = models.DateField(null=True, blank=True)
 
@@ -38,6 +49,27 @@ class InventoryItem(models.Model):
 	def __str__(self):
 		return f"{self.name} - {self.location_display}"
 
+	def save(self, *args, **kwargs):
+		from .services_forecast import StockoutForecastService
+		from .services_ledger import InventoryLedgerService
+		opening = self._state.adding and self.current_stock
+		with transaction.atomic():
+			super().save(*args, **kwargs)
+			if opening:
+				# El stock inicial del item entra al libro como ajuste
+				InventoryLedgerService.record(self, InventoryMovement.ADJUSTMENT, self.current_stock, self.current_stock, notes='Saldo inicial')
+		ChangeLog.touch('inventory_item', [self.pk])
+		# Stock o consumo cambiaron: las proyecciones de agotamiento se recalculan
+		StockoutForecastService.invalidate()
+
+	def delete(self, *args, **kwargs):
+		from .services_forecast import StockoutForecastService
+		tombstones = ChangeLog.tombstones('inventory_item', [self.pk])
+		result = super().delete(*args, **kwargs)
+		ChangeLog.deleted(tombstones)
+		StockoutForecastService.invalidate()
+		return result
+
 	@property
 	def location_display(self):
 		if self.shed:
@@ -46,10 +78,9 @@ class InventoryItem(models.Model):
 
 	@property
 	def projected_stockout_date(self):
-		if self.daily_avg_consumption and self.daily_avg_consumption > 0:
-			days_remaining = float(self.current_stock) / float(self.daily_avg_consumption)
-			return timezone.now().date() + timedelta(days=int(days_remaining))
-		return None
+		"""Fecha estimada de agotamiento según la edad de los lotes que alimenta y el consumo observado"""
+		from .services_forecast import StockoutForecastService
+		return StockoutForecastService.stockout_date(self)
 
 	@property
 	def stock_status(self):
@@ -69,98 +100,71 @@ class InventoryItem(models.Model):
 			return {'status': 'NORMAL', 'color': 'green', 'message': f'{days_remaining:.1f} días'}
 
 	def update_consumption_metrics(self):
-		end_date = timezone.now().date()
-		start_date = end_date - timedelta(days=30)
-
-		total = self.consumption_records.filter(date__range=[start_date, end_date]).aggregate(
-			total=models.Sum('quantity_consumed')
-		)['total'] or 0
-
-		# Promedio por día
-		self.daily_avg_consumption = float(total) / 30 if total else 0
+		"""Recalcular desde los registros de consumo los días de la ventana y el promedio"""
+		from .services import ConsumptionMetricsService
+		ConsumptionMetricsService.rebuild(self)
 
-		last = self.consumption_records.order_by('-date').first()
-		if last:
-			self.last_consumption_date = last.date
-
-		self.save(update_fields=['daily_avg_consumption', 'last_consumption_date'])
-
-	def add_stock(self, quantity, entry_date=None):
+	def add_stock(self, quantity, entry_date=None, user=None):
 		"""Agregar stock creando un lote FIFO"""
+		from .services import to_decimal
+		from .services_ledger import InventoryLedgerService
+
 		if entry_date is None:
 			entry_date = timezone.now().date()
-			
-		# Crear lote FIFO
-		batch = FoodBatch.objects.create(
-			inventory_item=self,
-			entry_date=entry_date,
-			initial_quantity=quantity,
-			current_quantity=quantity
-		)
-		
-		# Actualizar stock total
-		self.current_stock += quantity
+		quantity = to_decimal(quantity)
+
+		with transaction.atomic():
+			# Bloquear el item para no pisar un consumo FIFO concurrente
+			locked = InventoryItem.objects.select_for_update().get(pk=self.pk)
+
+			# Crear lote FIFO
+			batch = FoodBatch.objects.create(
+				inventory_item=locked,
+				entry_date=entry_date,
+				initial_quantity=quantity,
+				current_quantity=quantity
+			)
+
+			# Actualizar stock total
+			locked.current_stock += quantity
+			locked.last_restock_date = entry_date
+			locked.save(update_fields=['current_stock', 'last_restock_date'])
+			InventoryLedgerService.record(
+				locked, InventoryMovement.RECEIPT, quantity, locked.current_stock, batch=batch, recorded_by=user
+			)
+
+		self.current_stock = locked.current_stock
 		self.last_restock_date = entry_date
-		self.save(update_fields=['current_stock', 'last_restock_date'])
-		
 		return batch
 
-	def consume_fifo(self, quantity_to_consume, flock=None, user=None):
+	def consume_fifo(self, quantity_to_consume, flock=None, user=None, date=None, client_id=None):
 		"""Consumir usando FIFO estricto y retornar detalles de trazabilidad"""
-		if quantity_to_consume <= 0:
-			raise ValidationError("La cantidad a consumir debe ser mayor a 0")
-			
-		if float(self.current_stock) < float(quantity_to_consume):
-			raise ValidationError(f"Stock insuficiente. Disponible: {self.current_stock}, Solicitado: {quantity_to_consume}")
-		
-		# Obtener lotes ordenados por fecha (FIFO)
-		batches = self.food_batches.filter(current_quantity__gt=0).order_by('entry_date')
-		
-		remaining_to_consume = float(quantity_to_consume)
-		fifo_details = []
-		
-		for batch in batches:
-			if remaining_to_consume <= 0:
-				break
-				
-			batch_available = float(batch.current_quantity)
-			consume_from_batch = min(remaining_to_consume, batch_available)
-			
-			# Actualizar lote
-			batch.current_quantity -= consume_from_batch
-			batch.save()
-			
-			# Registrar detalle FIFO
-			fifo_details.append({
-				'batch_id': batch.id,
-				'entry_date': batch.entry_date.isoformat(),
-				'quantity_consumed': consume_from_batch,
-				'batch_remaining': float(batch.current_quantity)
-			})
-			
-			remaining_to_consume -= consume_from_batch
-		
-		# Actualizar stock total
-		self.current_stock -= quantity_to_consume
-		self.save(update_fields=['current_stock'])
-		
-		# Crear registro de consumo si se proporciona lote
-		if flock:
-			from apps.flocks.models import Flock
-			if isinstance(flock, int):
-				flock = Flock.objects.get(id=flock)
-				
-			consumption_record = FoodConsumptionRecord.objects.create(
-				flock=flock,
-				inventory_item=self,
-				date=timezone.now().date(),
-				quantity_consumed=quantity_to_consume,
-				fifo_details=fifo_details,
-				recorded_by=user or flock.created_by
+		from .services import FifoConsumptionService
+
+		with transaction.atomic():
+			locked, fifo_details = FifoConsumptionService.consume(
+				self, quantity_to_consume, user, getattr(flock, 'pk', flock)
 			)
-			
-			return consumption_record, fifo_details
-		
+			self.current_stock = locked.current_stock
+
+			# Crear registro de consumo si se proporciona lote
+			if flock:
+				from apps.flocks.models import Flock
+				if isinstance(flock, int):
+					flock = Flock.objects.get(id=flock)
+
+				consumption_record = FoodConsumptionRecord.objects.create(
+					flock=flock,
+					inventory_item=self,
+					date=date or timezone.now().date(),
+					quantity_consumed=quantity_to_consume,
+					fifo_details=fifo_details,
+					recorded_by=user or flock.created_by,
+					client_id=client_id
+				)
+
+				return consumption_record, fifo_details
+
 		return None, fifo_details
 
 
@@ -178,7 +182,17 @@ class FoodBatch(models.Model):
 		ordering = ['entry_date']
 		indexes = [
 			models.Index(fields=['inventory_item', 'entry_date']),
-			models.Index(fields=['current_quantity'])
+			models.Index(fields=['current_quantity']),
+			# Solo lotes con saldo: el siguiente lote a descontar es un rango del índice
+			# aunque el item acumule cientos de lotes agotados
+			models.Index(
+				fields=['inventory_item', 'entry_date', 'id'],
+				condition=models.Q(current_quantity__gt=0), name='foodbatch_fifo_open_idx'
+			),
+			models.Index(
+				fields=['inventory_item', 'expiry_date', 'entry_date', 'id'],
+				condition=models.Q(current_quantity__gt=0), name='foodbatch_fefo_open_idx'
+			),
 		]
 	
 	def __str__(self):
@@ -214,19 +228,32 @@ class FoodConsumptionRecord(models.Model):
 		unique_together = ['flock', 'inventory_item', 'date']
 		indexes = [
 			models.Index(fields=['date', 'flock']),
-			models.Index(fields=['sync_status'])
+			models.Index(fields=['sync_status']),
+			models.Index(fields=['date', 'id'], name='foodconsumption_date_id_idx'),
 		]
 	
 	def __str__(self):
 		return f"Consumo {self.inventory_item.name} - {self.flock} - {self.date}"
 	
 	def save(self, *args, **kwargs):
-		super().save(*args, **kwargs)
-		# Actualizar métricas del item de inventario
-		try:
-			self.inventory_item.update_consumption_metrics()
-		except Exception:
-			pass
+		from .services import ConsumptionMetricsService
+		with transaction.atomic():
+			previous = ConsumptionMetricsService.previous_entry(self)
+			super().save(*args, **kwargs)
+			# Mantener el resumen diario del lote (alimento consumido)
+			from apps.flocks.services_snapshot import FlockSnapshotService
+			FlockSnapshotService.refresh(self.flock_id, self.date)
+			# Consumo diario y promedio móvil del item de inventario
+			ConsumptionMetricsService.record_change(previous, ConsumptionMetricsService.entry(self))
+
+	def delete(self, *args, **kwargs):
+		from .services import ConsumptionMetricsService
+		with transaction.atomic():
+			result = super().delete(*args, **kwargs)
+			from apps.flocks.services_snapshot import FlockSnapshotService
+			FlockSnapshotService.refresh(self.flock_id, self.date)
+			ConsumptionMetricsService.record_change(ConsumptionMetricsService.entry(self), None)
+		return result
 
 
 class InventoryConsumptionRecord(models.Model):
@@ -239,12 +266,112 @@ class InventoryConsumptionRecord(models.Model):
 		unique_together = ['inventory_item', 'date']
 
 	def save(self, *args, **kwargs):
+		from .services import ConsumptionMetricsService
+		with transaction.atomic():
+			previous = ConsumptionMetricsService.previous_entry(self)
+			super().save(*args, **kwargs)
+			# Después de guardar, actualizar el consumo diario y el promedio del item
+			ConsumptionMetricsService.record_change(previous, ConsumptionMetricsService.entry(self))
+
+	def delete(self, *args, **kwargs):
+		from .services import ConsumptionMetricsService
+		with transaction.atomic():
+			result = super().delete(*args, **kwargs)
+			ConsumptionMetricsService.record_change(ConsumptionMetricsService.entry(self), None)
+		return result
+
+
+class InventoryDailyConsumption(models.Model):
+	"""Consumo total de un item por día (FoodConsumptionRecord + InventoryConsumptionRecord).
+
+	Se mantiene de forma incremental en cada registro de consumo (ver
+	ConsumptionMetricsService) y alimenta el promedio móvil de 30 días del item.
+	"""
+	inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='daily_consumption')
+	date = models.DateField()
+	quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+	class Meta:
+		unique_together = ['inventory_item', 'date']
+
+	def __str__(self):
+		return f"Consumo diario {self.inventory_item_id} - {self.date}"
+
+
+class InventoryMovement(models.Model):
+	"""Libro de movimientos de stock (solo inserción).
+
+	Cada cambio de current_stock (entrada de lote, consumo FIFO, ajuste manual o
+	transferencia entre items) deja una fila con la cantidad con signo y el saldo
+	resultante. `date` es siempre el día en que se registró el movimiento, así los días
+	ya consolidados en InventoryStockSnapshot no vuelven a cambiar.
+	"""
+	RECEIPT = 'RECEIPT'
+	CONSUMPTION = 'CONSUMPTION'
+	ADJUSTMENT = 'ADJUSTMENT'
+	TRANSFER_IN = 'TRANSFER_IN'
+	TRANSFER_OUT = 'TRANSFER_OUT'
+	TYPE_CHOICES = [
+		(RECEIPT, 'Entrada'),
+		(CONSUMPTION, 'Consumo'),
+		(ADJUSTMENT, 'Ajuste'),
+		(TRANSFER_IN, 'Transferencia recibida'),
+		(TRANSFER_OUT, 'Transferencia enviada'),
+	]
+
+	inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='movements')
+	movement_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+	date = models.DateField()
+	# Positiva si entra stock, negativa si sale
+	quantity = models.DecimalField(max_digits=12, decimal_places=2)
+	balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+
+	batch = models.ForeignKey(FoodBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+	flock = models.ForeignKey('flocks.Flock', on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_movements')
+	# Item de origen o destino de una transferencia
+	counterpart = models.ForeignKey(InventoryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+	recorded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+	notes = models.CharField(max_length=255, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['date', 'id']
+		indexes = [models.Index(fields=['inventory_item', 'date', 'id'], name='inventory_movement_item_idx')]
+
+	def __str__(self):
+		return f"{self.get_movement_type_display()} {self.quantity} - {self.inventory_item_id} - {self.date}"
+
+	def save(self, *args, **kwargs):
+		if not self._state.adding:
+			raise ValidationError('Un movimiento de inventario no se puede modificar')
 		super().save(*args, **kwargs)
-		# Después de guardar, actualizar métricas en el item
-		try:
-			self.inventory_item.update_consumption_metrics()
-		except Exception:
-			pass
+
+	def delete(self, *args, **kwargs):
+		raise ValidationError('Un movimiento de inventario no se puede eliminar')
+
+
+class InventoryStockSnapshot(models.Model):
+	"""Saldo de cierre y totales por tipo de movimiento de un item en un día.
+
+	Lo consolida la tarea diaria desde InventoryMovement; el stock a una fecha se
+	obtiene del snapshot más cercano anterior más los movimientos posteriores.
+	"""
+	inventory_item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='stock_snapshots')
+	date = models.DateField()
+	closing_stock = models.DecimalField(max_digits=12, decimal_places=2)
+	received = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	consumed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	adjusted = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	transferred_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	transferred_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	movement_count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		unique_together = ['inventory_item', 'date']
+		ordering = ['date']
+
+	def __str__(self):
+		return f"Snapshot {self.inventory_item_id} - {self.date}: {self.closing_stock}"
 
 
 
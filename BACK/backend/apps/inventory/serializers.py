@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field, OpenApiTypes
 
@@ -17,7 +19,7 @@ class InventoryItemSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = InventoryItem
 		fields = [
-			'id', 'name', 'description', 'current_stock', 'unit', 'minimum_stock',
+			'id', 'name', 'description', 'current_stock', 'unit', 'minimum_stock', 'draw_down_strategy',
 			'farm', 'shed', 'daily_avg_consumption', 'last_restock_date', 'last_consumption_date',
 			'alert_threshold_days', 'critical_threshold_days', 'projected_stockout_date', 'stock_status'
 		]
@@ -112,3 +114,23 @@ class AddStockSerializer(serializers.Serializer):
 	lot_number = serializers.CharField(required=False, allow_blank=True)
 	expiry_date = serializers.DateField(required=False, allow_null=True)
 
+
+class StockTransferSerializer(serializers.Serializer):
+	"""Transferencia de stock a otro item (p. ej. de la bodega general a un galpón)"""
+	target_id = serializers.IntegerField()
+	quantity = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+	notes = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
+
+class StockAsOfQuerySerializer(serializers.Serializer):
+	date = serializers.DateField()
+
+
+class MovementReportQuerySerializer(serializers.Serializer):
+	date_from = serializers.DateField()
+	date_to = serializers.DateField()
+
+	def validate(self, data):
+		if data['date_from'] > data['date_to']:
+			raise serializers.ValidationError('date_from debe ser anterior o igual a date_to')
+		return data
@@ -0,0 +1,525 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from apps.sync.change_log import ChangeLog
+from .models import (
+    FoodBatch, FoodConsumptionRecord, InventoryConsumptionRecord, InventoryDailyConsumption, InventoryItem
+)
+
+# Días del promedio móvil de consumo (ventana que termina hoy, inclusive)
+CONSUMPTION_WINDOW_DAYS = 30
+METRIC_FIELDS = ['consumption_window_total', 'consumption_window_end', 'daily_avg_consumption', 'last_consumption_date']
+
+
+def to_decimal(value):
+    """Cantidades de la API (int, float o str) a Decimal sin arrastrar el error binario del float"""
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+class FifoConsumptionService:
+    """Descuento FIFO/FEFO de stock con bloqueo del item.
+
+    Se bloquea la fila del InventoryItem (select_for_update) antes de leer current_stock,
+    así dos consumos simultáneos del mismo item se serializan y ninguno vende stock que el
+    otro ya descontó. Los lotes con saldo se leen en una consulta, el reparto se calcula en
+    memoria con Decimal y todos los lotes tocados se escriben con un único bulk_update.
+    """
+
+    @staticmethod
+    def open_batches(item):
+        """Lotes con saldo del item en el orden de su draw_down_strategy.
+
+        Cada orden coincide con un índice parcial de FoodBatch (current_quantity > 0), así la
+        lectura es un único rango del índice sin recorrer los lotes agotados. En FEFO los lotes
+        sin vencimiento van al final: se reordenan en memoria porque NULLS LAST no se puede
+        indexar en todos los motores.
+        """
+        batches = FoodBatch.objects.filter(inventory_item_id=item.pk, current_quantity__gt=0)
+        if item.draw_down_strategy != InventoryItem.FEFO:
+            return list(batches.order_by('entry_date', 'id'))
+        return sorted(batches.order_by('expiry_date', 'entry_date', 'id'), key=lambda batch: batch.expiry_date is None)
+
+    @staticmethod
+    def consume(item, quantity, user=None, flock_id=None):
+        """Descuenta `quantity` del item; devuelve (item bloqueado y actualizado, fifo_details)"""
+        locked, [outcome] = FifoConsumptionService.consume_many(item, [quantity], user, [flock_id])
+        if isinstance(outcome, ValidationError):
+            raise outcome
+        return locked, outcome
+
+    @staticmethod
+    def consume_many(item, quantities, user=None, flock_ids=None):
+        """Descuenta varias cantidades en orden con un solo bloqueo y una sola lectura de lotes.
+
+        Devuelve (item bloqueado y actualizado, resultados): por cada cantidad su fifo_details
+        o el ValidationError que la rechazó (las demás se descuentan igual). Cada descuento
+        queda en el libro de movimientos (un bulk_create), con el lote de aves de
+        `flock_ids` en la misma posición si se indica.
+        """
+        from .models import InventoryMovement
+        from .services_ledger import InventoryLedgerService
+
+        flock_ids = flock_ids or [None] * len(quantities)
+        with transaction.atomic():
+            locked = InventoryItem.objects.select_for_update().get(pk=item.pk)
+            batches = FifoConsumptionService.open_batches(locked)
+
+            available = locked.current_stock
+            touched = {}
+            outcomes = []
+            movements = []
+            for quantity, flock_id in zip(quantities, flock_ids):
+                quantity = to_decimal(quantity)
+                if quantity <= 0:
+                    outcomes.append(ValidationError("La cantidad a consumir debe ser mayor a 0"))
+                    continue
+                if available < quantity:
+                    outcomes.append(ValidationError(f"Stock insuficiente. Disponible: {available}, Solicitado: {quantity}"))
+                    continue
+
+                changed, fifo_details = FifoConsumptionService.draw_down(batches, quantity)
+                touched.update((batch.pk, batch) for batch in changed)
+                available -= quantity
+                outcomes.append(fifo_details)
+                movements.append(InventoryLedgerService.movement(
+                    locked, InventoryMovement.CONSUMPTION, -quantity, available, flock_id=flock_id, recorded_by=user
+                ))
+
+            if touched:
+                FoodBatch.objects.bulk_update(list(touched.values()), ['current_quantity'])
+            if available != locked.current_stock:
+                locked.current_stock = available
+                locked.save(update_fields=['current_stock'])
+            if movements:
+                InventoryMovement.objects.bulk_create(movements)
+
+        return locked, outcomes
+
+    @staticmethod
+    def draw_down(batches, quantity):
+        """Reparte `quantity` sobre los lotes en el orden dado (sin tocar la base de datos).
+
+        Devuelve los lotes modificados y el detalle de trazabilidad por lote. Si los lotes no
+        cubren toda la cantidad (stock cargado sin lote) se descuenta solo lo disponible.
+        """
+        remaining = to_decimal(quantity)
+        touched = []
+        fifo_details = []
+
+        for batch in batches:
+            if remaining <= 0:
+                break
+            take = min(remaining, batch.current_quantity)
+            if take <= 0:
+                continue
+
+            batch.current_quantity -= take
+            remaining -= take
+            touched.append(batch)
+            fifo_details.append({
+                'batch_id': batch.id,
+                'entry_date': batch.entry_date.isoformat(),
+                'quantity_consumed': float(take),
+                'batch_remaining': float(batch.current_quantity)
+            })
+
+        return touched, fifo_details
+
+
+class ConsumptionMetricsService:
+    """Consumo diario por item y promedio móvil de CONSUMPTION_WINDOW_DAYS días.
+
+    Cada alta, cambio o baja de un registro de consumo suma su diferencia al
+    InventoryDailyConsumption del día y a consumption_window_total del item. Al avanzar la
+    fecha la ventana se desliza: se restan los días que salen y se suman los que entran,
+    sin volver a agregar 30 días de registros. refresh_all (tarea nocturna) recalcula los
+    totales desde los buckets como verificación de consistencia y rebuild los reconstruye
+    desde los registros.
+    """
+
+    @staticmethod
+    def entry(record):
+        """(item_id, fecha, cantidad) que un registro de consumo aporta a los buckets"""
+        return record.inventory_item_id, record.date, to_decimal(record.quantity_consumed)
+
+    @staticmethod
+    def previous_entry(record):
+        """Aporte guardado del registro antes de modificarlo (None si es nuevo)"""
+        if record.pk is None:
+            return None
+        return type(record).objects.filter(pk=record.pk).values_list(
+            'inventory_item_id', 'date', 'quantity_consumed'
+        ).first()
+
+    @staticmethod
+    def record_change(old, new):
+        """Aplica la diferencia entre el aporte anterior y el nuevo de un registro"""
+        changes = defaultdict(lambda: defaultdict(Decimal))
+        if old is not None:
+            changes[old[0]][old[1]] -= old[2]
+        if new is not None:
+            changes[new[0]][new[1]] += new[2]
+
+        for item_id, deltas in changes.items():
+            deltas = {day: delta for day, delta in deltas.items() if delta}
+            if deltas:
+                ConsumptionMetricsService.apply(item_id, deltas)
+
+    @staticmethod
+    def apply(item_id, deltas, today=None):
+        """Suma {fecha: cantidad} a los buckets del item y actualiza su promedio móvil"""
+        today = today or timezone.now().date()
+        with transaction.atomic():
+            item = InventoryItem.objects.select_for_update().get(pk=item_id)
+            # Deslizar antes de tocar los buckets para no contar dos veces el cambio
+            ConsumptionMetricsService._slide(item, today)
+
+            # Con el item bloqueado los buckets se leen y escriben en lote: un SELECT,
+            # un bulk_update para los días existentes y un bulk_create para los nuevos
+            existing = {
+                bucket.date: bucket for bucket in InventoryDailyConsumption.objects.filter(
+                    inventory_item_id=item_id, date__in=list(deltas)
+                )
+            }
+            for day, bucket in existing.items():
+                bucket.quantity = to_decimal(bucket.quantity) + deltas[day]
+            if existing:
+                InventoryDailyConsumption.objects.bulk_update(list(existing.values()), ['quantity'])
+            new_buckets = [
+                InventoryDailyConsumption(inventory_item_id=item_id, date=day, quantity=delta)
+                for day, delta in deltas.items() if day not in existing
+            ]
+            if new_buckets:
+                InventoryDailyConsumption.objects.bulk_create(new_buckets)
+
+            start = today - timedelta(days=CONSUMPTION_WINDOW_DAYS - 1)
+            for day, delta in deltas.items():
+                if start <= day <= today:
+                    item.consumption_window_total += delta
+
+            if any(delta < 0 for delta in deltas.values()):
+                # Una baja puede dejar obsoleta la última fecha de consumo
+                item.last_consumption_date = ConsumptionMetricsService._last_date(item_id)
+            else:
+                last = max(deltas)
+                if item.last_consumption_date is None or last > item.last_consumption_date:
+                    item.last_consumption_date = last
+
+            ConsumptionMetricsService._set_average(item)
+            item.save(update_fields=METRIC_FIELDS)
+        return item
+
+    @staticmethod
+    def _slide(item, today):
+        """Mueve la ventana del item hasta `today` restando los días que salen y sumando los que entran"""
+        end = item.consumption_window_end
+        if end == today:
+            return
+        start = today - timedelta(days=CONSUMPTION_WINDOW_DAYS - 1)
+        buckets = InventoryDailyConsumption.objects.filter(inventory_item_id=item.pk)
+
+        if end is None or end > today or (today - end).days >= CONSUMPTION_WINDOW_DAYS:
+            item.consumption_window_total = buckets.filter(date__range=[start, today]).aggregate(
+                total=models.Sum('quantity')
+            )['total'] or Decimal('0')
+        else:
+            old_start = end - timedelta(days=CONSUMPTION_WINDOW_DAYS - 1)
+            moved = buckets.filter(date__range=[old_start, today]).aggregate(
+                expired=models.Sum('quantity', filter=models.Q(date__gte=old_start, date__lt=start)),
+                entered=models.Sum('quantity', filter=models.Q(date__gt=end, date__lte=today)),
+            )
+            item.consumption_window_total += (moved['entered'] or 0) - (moved['expired'] or 0)
+        item.consumption_window_end = today
+
+    @staticmethod
+    def _set_average(item):
+        item.daily_avg_consumption = (
+            Decimal(item.consumption_window_total) / CONSUMPTION_WINDOW_DAYS
+        ).quantize(Decimal('0.01'))
+
+    @staticmethod
+    def _last_date(item_id):
+        return InventoryDailyConsumption.objects.filter(
+            inventory_item_id=item_id, quantity__gt=0
+        ).aggregate(last=models.Max('date'))['last']
+
+    @staticmethod
+    def rebuild(item, today=None):
+        """Reconstruye desde los registros los buckets de la ventana del item y su promedio"""
+        today = today or timezone.now().date()
+        start = today - timedelta(days=CONSUMPTION_WINDOW_DAYS - 1)
+        totals = defaultdict(Decimal)
+        for model in (FoodConsumptionRecord, InventoryConsumptionRecord):
+            for day, total in model.objects.filter(inventory_item_id=item.pk, date__range=[start, today]).values(
+                'date'
+            ).annotate(total=models.Sum('quantity_consumed')).values_list('date', 'total'):
+                totals[day] += total
+
+        with transaction.atomic():
+            locked = InventoryItem.objects.select_for_update().get(pk=item.pk)
+            InventoryDailyConsumption.objects.filter(inventory_item_id=item.pk, date__range=[start, today]).delete()
+            InventoryDailyConsumption.objects.bulk_create([
+                InventoryDailyConsumption(inventory_item_id=item.pk, date=day, quantity=total)
+                for day, total in totals.items()
+            ])
+            locked.consumption_window_total = sum(totals.values(), Decimal('0'))
+            locked.consumption_window_end = today
+            locked.last_consumption_date = ConsumptionMetricsService._last_date(item.pk)
+            ConsumptionMetricsService._set_average(locked)
+            locked.save(update_fields=METRIC_FIELDS)
+
+        for field in METRIC_FIELDS:
+            setattr(item, field, getattr(locked, field))
+        return item
+
+    @staticmethod
+    def refresh_all(today=None):
+        """Verificación nocturna: recalcula desde los buckets la ventana de todos los items.
+
+        Una consulta agrupada para los totales y otra para la última fecha; solo se
+        escriben (bulk_update) los items cuyo valor difiere, p. ej. los que no tuvieron
+        consumo hoy y necesitan deslizar la ventana.
+        """
+        today = today or timezone.now().date()
+        start = today - timedelta(days=CONSUMPTION_WINDOW_DAYS - 1)
+        buckets = InventoryDailyConsumption.objects.values('inventory_item_id')
+        totals = dict(
+            buckets.filter(date__range=[start, today]).annotate(total=models.Sum('quantity'))
+            .values_list('inventory_item_id', 'total')
+        )
+        last_dates = dict(
+            buckets.filter(quantity__gt=0).annotate(last=models.Max('date'))
+            .values_list('inventory_item_id', 'last')
+        )
+
+        changed = []
+        items = InventoryItem.objects.only('id', *METRIC_FIELDS)
+        for item in items.iterator():
+            current = [getattr(item, field) for field in METRIC_FIELDS]
+            item.consumption_window_total = totals.get(item.pk) or Decimal('0')
+            item.consumption_window_end = today
+            item.last_consumption_date = last_dates.get(item.pk)
+            ConsumptionMetricsService._set_average(item)
+            if [getattr(item, field) for field in METRIC_FIELDS] != current:
+                changed.append(item)
+
+        InventoryItem.objects.bulk_update(changed, METRIC_FIELDS, batch_size=500)
+        ChangeLog.touch('inventory_item', [item.pk for item in changed])
+        if changed:
+            from .services_forecast import StockoutForecastService
+            StockoutForecastService.invalidate()
+        return len(changed)
+
+
+class StockAlertService:
+    """Barrido de stock crítico basado en consultas.
+
+    Los días de stock se calculan en SQL y en la misma consulta se filtran los items
+    críticos (sin stock o por debajo de critical_threshold_days), se une la configuración
+    STOCK activa de su granja y se descartan los que ya tienen una alarma pendiente.
+    Las alarmas nuevas se crean con un solo bulk_create.
+    """
+
+    @staticmethod
+    def critical_items():
+        """Items en estado CRITICAL u OUT_OF_STOCK (mismo criterio que InventoryItem.stock_status)"""
+        days_of_stock = models.Case(
+            models.When(
+                daily_avg_consumption__gt=0,
+                then=Cast('current_stock', models.FloatField()) / Cast('daily_avg_consumption', models.FloatField())
+            ),
+            output_field=models.FloatField(),
+        )
+        return InventoryItem.objects.annotate(days_of_stock=days_of_stock).filter(
+            models.Q(current_stock__lte=0) | models.Q(days_of_stock__lte=models.F('critical_threshold_days'))
+        )
+
+    @staticmethod
+    def scan():
+        """Crea las alarmas STOCK que falten; devuelve {'critical_items_count', 'alarms_generated'}"""
+        from apps.alarms.models import Alarm, AlarmConfiguration
+
+        critical = StockAlertService.critical_items()
+        config = AlarmConfiguration.objects.filter(
+            alarm_type='STOCK', farm=models.OuterRef('farm'), is_active=True
+        ).order_by('id')
+        pending = Alarm.objects.filter(alarm_type='STOCK', inventory_item=models.OuterRef('pk'), status='PENDING')
+        items = list(
+            critical.annotate(config_id=models.Subquery(config.values('id')[:1]))
+            .filter(config_id__isnull=False)
+            .exclude(models.Exists(pending))
+            .select_related('farm', 'shed')
+        )
+
+        today = timezone.now().date()
+        new_alarms = []
+        for item in items:
+            out_of_stock = item.current_stock <= 0
+            detail = 'Sin stock' if out_of_stock else f'{item.days_of_stock:.1f} días'
+            new_alarms.append(Alarm(
+                alarm_type='STOCK',
+                description=f'Stock crítico - {item.name} en {item.location_display}: {detail} ({item.current_stock} {item.unit})',
+                priority='HIGH' if out_of_stock else 'MEDIUM',
+                farm_id=item.farm_id,
+                shed_id=item.shed_id,
+                inventory_item=item,
+                configuration_id=item.config_id,
+                source_type='inventory',
+                source_date=today,
+                source_id=item.id,
+            ))
+
+        if new_alarms:
+            if connection.features.can_return_rows_from_bulk_insert:
+                Alarm.objects.bulk_create(new_alarms)
+                ChangeLog.touch('alarm', [alarm.pk for alarm in new_alarms])
+            else:
+                for alarm in new_alarms:
+                    alarm.save()
+
+        return {
+            'critical_items_count': critical.count(),
+            'alarms_generated': len(new_alarms)
+        }
+
+
+class BulkFifoConsumptionService:
+    """Consumo FIFO masivo (sincronización de dispositivos) agrupado por item.
+
+    Lotes, items y consumos ya registrados se leen con una consulta cada uno. Por item se
+    comprueba el permiso una vez, se hace un único descuento FIFO sobre todo el grupo
+    (consume_many) y los FoodConsumptionRecord se insertan con bulk_create; el resumen
+    diario de los lotes y el promedio de consumo del item se actualizan una vez por grupo.
+    """
+
+    @staticmethod
+    def consume_records(records, user, can_manage):
+        """`records` validados por FoodConsumptionRequestSerializer; `can_manage(item)` -> bool.
+
+        Devuelve un resultado por registro, en el mismo orden.
+        """
+        from apps.flocks.models import Flock
+        from apps.flocks.services_snapshot import FlockSnapshotService
+
+        today = timezone.now().date()
+        results = [None] * len(records)
+        flocks = Flock.objects.in_bulk({record['flock_id'] for record in records})
+        items = InventoryItem.objects.select_related('farm', 'shed').in_bulk(
+            {record['inventory_item_id'] for record in records}
+        )
+
+        groups = defaultdict(list)
+        for index, record in enumerate(records):
+            if record['flock_id'] not in flocks:
+                results[index] = BulkFifoConsumptionService._error(record, 'Lote no encontrado')
+            elif record['inventory_item_id'] not in items:
+                results[index] = BulkFifoConsumptionService._error(record, 'Item de inventario no encontrado')
+            else:
+                groups[record['inventory_item_id']].append(index)
+
+        existing = set(FoodConsumptionRecord.objects.filter(
+            inventory_item_id__in=list(groups),
+            flock_id__in={records[i]['flock_id'] for indices in groups.values() for i in indices},
+            date__in={records[i].get('date') or today for indices in groups.values() for i in indices},
+        ).values_list('inventory_item_id', 'flock_id', 'date'))
+
+        snapshot_pairs = set()
+        for item_id, indices in groups.items():
+            item = items[item_id]
+            if not can_manage(item):
+                for i in indices:
+                    results[i] = BulkFifoConsumptionService._error(records[i], 'Sin permisos para este inventario')
+                continue
+
+            pending = []
+            for i in indices:
+                key = (item_id, records[i]['flock_id'], records[i].get('date') or today)
+                if key in existing:
+                    results[i] = BulkFifoConsumptionService._error(
+                        records[i], 'Ya existe un consumo de este lote e item para esa fecha'
+                    )
+                else:
+                    existing.add(key)
+                    pending.append(i)
+            if not pending:
+                continue
+
+            try:
+                with transaction.atomic():
+                    created = BulkFifoConsumptionService._consume_group(
+                        item, [(i, records[i]) for i in pending], flocks, user, today, results
+                    )
+            except Exception as e:
+                for i in pending:
+                    results[i] = BulkFifoConsumptionService._error(records[i], str(e))
+                continue
+            snapshot_pairs.update((record.flock_id, record.date) for record in created)
+
+        FlockSnapshotService.refresh_pairs(snapshot_pairs)
+        return results
+
+    @staticmethod
+    def _consume_group(item, pending, flocks, user, today, results):
+        """Descuenta e inserta los consumos de un item; escribe los resultados en `results`"""
+        _, outcomes = FifoConsumptionService.consume_many(
+            item, [record['quantity_consumed'] for _, record in pending], user,
+            [record['flock_id'] for _, record in pending]
+        )
+
+        new = []
+        for (index, record), outcome in zip(pending, outcomes):
+            if isinstance(outcome, ValidationError):
+                results[index] = BulkFifoConsumptionService._error(record, '; '.join(outcome.messages))
+                continue
+            new.append((index, outcome, FoodConsumptionRecord(
+                flock=flocks[record['flock_id']],
+                inventory_item=item,
+                date=record.get('date') or today,
+                quantity_consumed=to_decimal(record['quantity_consumed']),
+                fifo_details=outcome,
+                recorded_by=user,
+                client_id=record.get('client_id'),
+            )))
+        if not new:
+            return []
+
+        created = [consumption for _, _, consumption in new]
+        FoodConsumptionRecord.objects.bulk_create(created)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Sin RETURNING (MySQL): recuperar los ids por la clave única (lote, item, fecha)
+            ids = {
+                (flock_id, day): pk for pk, flock_id, day in FoodConsumptionRecord.objects.filter(
+                    inventory_item=item, flock_id__in={c.flock_id for c in created}, date__in={c.date for c in created}
+                ).values_list('id', 'flock_id', 'date')
+            }
+            for consumption in created:
+                consumption.pk = ids.get((consumption.flock_id, consumption.date))
+
+        for index, fifo_details, consumption in new:
+            results[index] = {
+                'client_id': consumption.client_id,
+                'server_id': consumption.pk,
+                'status': 'success',
+                'fifo_details': fifo_details
+            }
+
+        deltas = defaultdict(Decimal)
+        for consumption in created:
+            deltas[consumption.date] += consumption.quantity_consumed
+        ConsumptionMetricsService.apply(item.pk, deltas)
+        return created
+
+    @staticmethod
+    def _error(record, message):
+        return {
+            'client_id': record.get('client_id'),
+            'server_id': None,
+            'status': 'error',
+            'error': message
+        }
@@ -0,0 +1,208 @@
+import math
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.flocks.reference_cache import BreedReferenceCache
+from .models import FoodConsumptionRecord, InventoryDailyConsumption, InventoryItem
+from .services import CONSUMPTION_WINDOW_DAYS
+
+STOCKOUT_VERSION_KEY = 'inventory:stockout:version'
+STOCKOUT_KEY = 'inventory:stockout:{version}:{day}:{item_id}'
+# Vida máxima de una proyección; se descarta antes con cualquier consumo o cambio de stock.
+STOCKOUT_TTL = 86400
+
+# Días proyectados día a día; más allá se extrapola con el consumo del último día.
+HORIZON_DAYS = 180
+# Límite de la extrapolación: un agotamiento más lejano se informa como desconocido (None)
+MAX_STOCKOUT_DAYS = 3650
+# Factor de suavizado exponencial: peso del día más reciente frente a los anteriores.
+SMOOTHING_ALPHA = 0.3
+# Kilos por unidad del item (los sacos no tienen peso fijo: solo consumo observado).
+KG_PER_UNIT = {'KG': 1.0, 'TON': 1000.0, 'LB': 0.45359237}
+
+StockoutForecast = namedtuple('StockoutForecast', ['daily_consumption', 'stockout_date'])
+
+
+class StockoutForecastService:
+    """Proyección de agotamiento de stock para todos los items a la vez.
+
+    El consumo esperado de cada item es la suma, día a día, de aves vivas × expected_consumption
+    (gramos/ave/día de BreedReference) de los lotes activos que alimenta, según la edad que
+    tendrá cada lote ese día. El consumo observado (InventoryDailyConsumption) de los
+    últimos CONSUMPTION_WINDOW_DAYS días corrige esa curva con un cociente observado/esperado
+    suavizado exponencialmente (los días recientes pesan más). Items sin curva (raza sin
+    referencias, unidad sin peso fijo) proyectan el promedio observado suavizado.
+
+    Todo se calcula con matrices items × días de NumPy y se guarda en caché hasta el
+    siguiente consumo o cambio de stock.
+    """
+
+    @staticmethod
+    def current_version():
+        version = cache.get(STOCKOUT_VERSION_KEY)
+        if version is None:
+            cache.add(STOCKOUT_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(STOCKOUT_VERSION_KEY)
+        return version
+
+    @staticmethod
+    def bump_version():
+        cache.set(STOCKOUT_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    @classmethod
+    def invalidate(cls):
+        """Invalida ahora y al confirmar la transacción (descarta proyecciones con datos previos al commit)"""
+        cls.bump_version()
+        transaction.on_commit(cls.bump_version)
+
+    @classmethod
+    def get(cls, item):
+        """Proyección del item desde caché; si falta se recalculan todos los items"""
+        today = timezone.now().date()
+        version = cls.current_version()
+        cached = cache.get(STOCKOUT_KEY.format(version=version, day=today.isoformat(), item_id=item.pk))
+        if cached is not None:
+            return cached
+
+        forecasts = cls.forecast_items(InventoryItem.objects.all(), today)
+        cache.set_many(
+            {
+                STOCKOUT_KEY.format(version=version, day=today.isoformat(), item_id=item_id): forecast
+                for item_id, forecast in forecasts.items()
+            },
+            STOCKOUT_TTL,
+        )
+        return forecasts.get(item.pk)
+
+    @classmethod
+    def stockout_date(cls, item):
+        forecast = cls.get(item)
+        return forecast.stockout_date if forecast else None
+
+    @staticmethod
+    def forecast_items(items, today=None):
+        """{item_id: StockoutForecast} para los items dados"""
+        today = today or timezone.now().date()
+        items = list(items.only('id', 'farm_id', 'shed_id', 'unit', 'current_stock'))
+        if not items:
+            return {}
+
+        history, horizon = CONSUMPTION_WINDOW_DAYS, HORIZON_DAYS
+        row = {item.pk: index for index, item in enumerate(items)}
+        # Columnas: días today-history .. today-1 (observados) y today .. today+horizon-1
+        offsets = np.arange(-history, horizon)
+
+        expected, has_curve = StockoutForecastService._expected_kg(items, row, offsets, today)
+        kg_per_unit = np.array([KG_PER_UNIT.get(item.unit, np.nan) for item in items])
+        has_curve &= ~np.isnan(kg_per_unit)
+        expected = np.where(has_curve[:, None], expected / np.where(np.isnan(kg_per_unit), 1.0, kg_per_unit)[:, None], 0.0)
+
+        observed = np.zeros((len(items), history))
+        start = today - timedelta(days=history)
+        for item_id, day, quantity in InventoryDailyConsumption.objects.filter(
+            inventory_item_id__in=list(row), date__gte=start, date__lt=today
+        ).values_list('inventory_item_id', 'date', 'quantity'):
+            observed[row[item_id], (day - start).days] = float(quantity)
+
+        # Pesos exponenciales: alpha * (1 - alpha)^k, k = días hacia atrás desde ayer
+        weights = SMOOTHING_ALPHA * (1 - SMOOTHING_ALPHA) ** np.arange(history - 1, -1, -1)
+        observed_level = observed @ weights
+        expected_level = expected[:, :history] @ weights
+        has_observations = observed.sum(axis=1) > 0
+
+        ratio = np.ones(len(items))
+        calibrate = has_curve & has_observations & (expected_level > 0)
+        ratio[calibrate] = observed_level[calibrate] / expected_level[calibrate]
+
+        projected = np.where(
+            has_curve[:, None],
+            expected[:, history:] * ratio[:, None],
+            (observed_level / weights.sum())[:, None]
+        )
+
+        stock = np.array([float(item.current_stock) for item in items])
+        return {
+            item.pk: StockoutForecast(
+                daily_consumption=round(float(projected[index, 0]), 2),
+                stockout_date=StockoutForecastService._stockout_date(stock[index], projected[index], today)
+            )
+            for index, item in enumerate(items)
+        }
+
+    @staticmethod
+    def _stockout_date(stock, projected, today):
+        """Primer día sin stock según el consumo proyectado (None si no se consume)"""
+        if stock <= 0:
+            return today
+        cumulative = np.cumsum(projected)
+        reached = np.flatnonzero(cumulative >= stock)
+        if reached.size:
+            return today + timedelta(days=int(reached[0]) + 1)
+        if projected[-1] <= 0:
+            return None
+        days = projected.size + (stock - cumulative[-1]) / projected[-1]
+        # Un consumo residual casi nulo daría fechas fuera del rango de date
+        if not math.isfinite(days) or days > MAX_STOCKOUT_DAYS:
+            return None
+        return today + timedelta(days=math.ceil(days))
+
+    @staticmethod
+    def _expected_kg(items, row, offsets, today):
+        """Matriz items × días de consumo esperado (kg) de los lotes activos que alimenta cada item"""
+        from apps.flocks.models import Flock
+
+        farm_ids = {item.farm_id for item in items}
+        flocks = {
+            flock['id']: flock for flock in Flock.objects.filter(status='ACTIVE', shed__farm_id__in=farm_ids).values(
+                'id', 'shed_id', 'shed__farm_id', 'breed', 'arrival_date', 'current_quantity'
+            )
+        }
+
+        # Lotes que alimenta cada item: los que registraron consumo de él en la ventana o,
+        # si no hay registros, los activos de su galpón (o de toda la granja si es general)
+        fed = defaultdict(set)
+        for item_id, flock_id in FoodConsumptionRecord.objects.filter(
+            inventory_item_id__in=list(row), flock_id__in=list(flocks),
+            date__gte=today - timedelta(days=CONSUMPTION_WINDOW_DAYS)
+        ).values_list('inventory_item_id', 'flock_id').distinct():
+            fed[item_id].add(flock_id)
+        for item in items:
+            if not fed[item.pk]:
+                fed[item.pk] = {
+                    flock_id for flock_id, flock in flocks.items()
+                    if flock['shed__farm_id'] == item.farm_id and (item.shed_id is None or flock['shed_id'] == item.shed_id)
+                }
+
+        pairs = [(row[item_id], flocks[flock_id]) for item_id, flock_ids in fed.items() for flock_id in flock_ids]
+        expected = np.zeros((len(items), offsets.size))
+        has_curve = np.zeros(len(items), dtype=bool)
+        if not pairs:
+            return expected, has_curve
+
+        rows = np.array([index for index, _ in pairs])
+        ages = np.array([(today - flock['arrival_date']).days for _, flock in pairs])[:, None] + offsets[None, :]
+        birds = np.array([flock['current_quantity'] for _, flock in pairs], dtype=np.float64)
+        breeds = np.array([flock['breed'] for _, flock in pairs], dtype=object)
+
+        grams = np.full(ages.shape, np.nan)
+        for breed in set(breeds.tolist()):
+            idx = np.flatnonzero(breeds == breed)
+            curve = BreedReferenceCache.get_curve(breed)
+            if not len(curve):
+                continue
+            # Pasada la última edad de la tabla se mantiene el último consumo conocido
+            breed_ages = np.minimum(ages[idx], curve.consumption.size - 1)
+            grams[idx] = curve.lookup(breed_ages)[1]
+
+        # Antes de la llegada del lote (edad negativa) no hay consumo
+        valid = ~np.isnan(grams)
+        kg = np.where(valid & (ages >= 0), grams, 0.0) * birds[:, None] / 1000
+        np.add.at(expected, rows, kg)
+        np.logical_or.at(has_curve, rows, valid.any(axis=1))
+        return expected, has_curve
@@ -0,0 +1,265 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import FoodBatch, InventoryItem, InventoryMovement, InventoryStockSnapshot
+from .services import FifoConsumptionService, to_decimal
+
+# Columna del snapshot que acumula cada tipo de movimiento (y signo con que suma al saldo)
+SNAPSHOT_TOTALS = {
+    InventoryMovement.RECEIPT: ('received', 1),
+    InventoryMovement.CONSUMPTION: ('consumed', -1),
+    InventoryMovement.ADJUSTMENT: ('adjusted', 1),
+    InventoryMovement.TRANSFER_IN: ('transferred_in', 1),
+    InventoryMovement.TRANSFER_OUT: ('transferred_out', -1),
+}
+
+
+class InventoryLedgerService:
+    """Libro de movimientos de inventario y saldos consolidados.
+
+    Toda escritura de current_stock pasa por aquí (o por FifoConsumptionService) con el
+    item bloqueado y deja su InventoryMovement en la misma transacción. roll_up consolida
+    cada día en InventoryStockSnapshot; stock_as_of y movement_report parten del snapshot
+    más cercano y solo leen del libro los movimientos posteriores.
+    """
+
+    @staticmethod
+    def movement(item, movement_type, quantity, balance_after, **extra):
+        """InventoryMovement sin guardar fechado hoy (para bulk_create)"""
+        return InventoryMovement(
+            inventory_item_id=item.pk, movement_type=movement_type, date=timezone.now().date(),
+            quantity=quantity, balance_after=balance_after, **extra
+        )
+
+    @staticmethod
+    def record(item, movement_type, quantity, balance_after, **extra):
+        movement = InventoryLedgerService.movement(item, movement_type, quantity, balance_after, **extra)
+        movement.save()
+        return movement
+
+    @staticmethod
+    def adjust(item, new_stock, user=None, notes=''):
+        """Fija el stock del item (conteo físico) registrando la diferencia como ajuste"""
+        new_stock = to_decimal(new_stock)
+        with transaction.atomic():
+            locked = InventoryItem.objects.select_for_update().get(pk=item.pk)
+            difference = new_stock - locked.current_stock
+            locked.current_stock = new_stock
+            locked.save(update_fields=['current_stock'])
+            if difference:
+                InventoryLedgerService.record(
+                    locked, InventoryMovement.ADJUSTMENT, difference, new_stock, recorded_by=user, notes=notes
+                )
+
+        item.current_stock = new_stock
+        return item
+
+    @staticmethod
+    def transfer(source, target, quantity, user=None, notes=''):
+        """Mueve stock entre items conservando la antigüedad FIFO de los lotes.
+
+        Los lotes del origen se descuentan según su draw_down_strategy; cada lote tocado crea
+        en el destino un lote con la misma fecha de entrada, proveedor, número y vencimiento.
+        Devuelve los lotes creados.
+        """
+        quantity = to_decimal(quantity)
+        if source.pk == target.pk:
+            raise ValidationError('El item de origen y destino deben ser distintos')
+        if quantity <= 0:
+            raise ValidationError('La cantidad a transferir debe ser mayor a 0')
+
+        with transaction.atomic():
+            # Bloqueo en orden de pk para que dos transferencias cruzadas no se bloqueen entre sí
+            locked = {
+                item.pk: item for item in
+                InventoryItem.objects.select_for_update().filter(pk__in=[source.pk, target.pk]).order_by('pk')
+            }
+            origin, destination = locked[source.pk], locked[target.pk]
+            # Sin conversión: BAG no tiene un peso fijo y el libro registra la misma cantidad en ambos items
+            if origin.unit != destination.unit:
+                raise ValidationError(
+                    f"El item de origen ({origin.get_unit_display()}) y el de destino ({destination.get_unit_display()}) deben usar la misma unidad"
+                )
+            if origin.current_stock < quantity:
+                raise ValidationError(f"Stock insuficiente. Disponible: {origin.current_stock}, Solicitado: {quantity}")
+
+            changed, fifo_details = FifoConsumptionService.draw_down(FifoConsumptionService.open_batches(origin), quantity)
+            FoodBatch.objects.bulk_update(changed, ['current_quantity'])
+
+            taken = {detail['batch_id']: to_decimal(detail['quantity_consumed']) for detail in fifo_details}
+            created = [
+                FoodBatch(
+                    inventory_item_id=destination.pk, entry_date=batch.entry_date, initial_quantity=taken[batch.pk],
+                    current_quantity=taken[batch.pk], supplier=batch.supplier, lot_number=batch.lot_number,
+                    expiry_date=batch.expiry_date
+                )
+                for batch in changed
+            ]
+            moved = sum(taken.values(), Decimal('0'))
+            # Stock cargado sin lote: llega al destino como un lote de hoy
+            if moved < quantity:
+                created.append(FoodBatch(
+                    inventory_item_id=destination.pk, entry_date=timezone.now().date(),
+                    initial_quantity=quantity - moved, current_quantity=quantity - moved
+                ))
+            FoodBatch.objects.bulk_create(created)
+
+            origin.current_stock -= quantity
+            destination.current_stock += quantity
+            origin.save(update_fields=['current_stock'])
+            destination.save(update_fields=['current_stock'])
+
+            InventoryMovement.objects.bulk_create([
+                InventoryLedgerService.movement(
+                    origin, InventoryMovement.TRANSFER_OUT, -quantity, origin.current_stock,
+                    counterpart_id=destination.pk, recorded_by=user, notes=notes
+                ),
+                InventoryLedgerService.movement(
+                    destination, InventoryMovement.TRANSFER_IN, quantity, destination.current_stock,
+                    counterpart_id=origin.pk, recorded_by=user, notes=notes
+                ),
+            ])
+
+        source.current_stock = origin.current_stock
+        target.current_stock = destination.current_stock
+        return created
+
+    @staticmethod
+    def _latest_snapshot(day, inclusive=True, outer='inventory_item_id'):
+        """Subconsulta del snapshot más reciente hasta `day` del item OuterRef(outer)"""
+        lookup = 'date__lte' if inclusive else 'date__lt'
+        return InventoryStockSnapshot.objects.filter(
+            inventory_item_id=models.OuterRef(outer), **{lookup: day}
+        ).order_by('-date')
+
+    @staticmethod
+    def _tail(item_ids, day, inclusive=True):
+        """Movimientos hasta `day` posteriores al snapshot base de cada item"""
+        base = InventoryLedgerService._latest_snapshot(day, inclusive)
+        return InventoryMovement.objects.filter(inventory_item_id__in=item_ids, date__lte=day).annotate(
+            base_date=models.Subquery(base.values('date')[:1])
+        ).filter(models.Q(base_date__isnull=True) | models.Q(date__gt=models.F('base_date')))
+
+    @staticmethod
+    def stock_as_of(item_ids, day):
+        """{item_id: stock al cierre de `day`}: snapshot más cercano + cola del libro"""
+        item_ids = list(item_ids)
+        stock = {item_id: Decimal('0') for item_id in item_ids}
+        base = InventoryLedgerService._latest_snapshot(day, outer='pk')
+        for item_id, closing in InventoryItem.objects.filter(pk__in=item_ids).annotate(
+            base_stock=models.Subquery(base.values('closing_stock')[:1])
+        ).values_list('id', 'base_stock'):
+            stock[item_id] = closing or Decimal('0')
+
+        for item_id, tail in InventoryLedgerService._tail(item_ids, day).values('inventory_item_id').annotate(
+            total=models.Sum('quantity')
+        ).values_list('inventory_item_id', 'total'):
+            stock[item_id] += tail
+        return stock
+
+    @staticmethod
+    def roll_up(day=None):
+        """Consolida el día (ayer por defecto) de todos los items con movimientos.
+
+        Dos consultas de lectura (saldo base y cola agrupada) y un bulk_create; volver a
+        ejecutarlo para el mismo día reemplaza sus filas. Devuelve los snapshots creados.
+        """
+        day = day or timezone.now().date() - timedelta(days=1)
+        item_ids = list(
+            InventoryMovement.objects.filter(date__lte=day).values_list('inventory_item_id', flat=True).distinct()
+        )
+        if not item_ids:
+            return []
+
+        base = InventoryLedgerService._latest_snapshot(day, inclusive=False, outer='pk')
+        closing = dict(InventoryItem.objects.filter(pk__in=item_ids).annotate(
+            base_stock=models.Subquery(base.values('closing_stock')[:1])
+        ).values_list('id', 'base_stock'))
+
+        today_filter = models.Q(date=day)
+        totals = {
+            column: models.Sum('quantity', filter=today_filter & models.Q(movement_type=movement_type))
+            for movement_type, (column, _) in SNAPSHOT_TOTALS.items()
+        }
+        snapshots = []
+        for row in InventoryLedgerService._tail(item_ids, day, inclusive=False).values('inventory_item_id').annotate(
+            tail=models.Sum('quantity'), movement_count=models.Count('id', filter=today_filter), **totals
+        ):
+            values = {column: abs(row[column] or Decimal('0')) for column, _ in SNAPSHOT_TOTALS.values()}
+            # Los ajustes conservan el signo: pueden subir o bajar el stock
+            values['adjusted'] = row['adjusted'] or Decimal('0')
+            snapshots.append(InventoryStockSnapshot(
+                inventory_item_id=row['inventory_item_id'], date=day,
+                closing_stock=(closing.get(row['inventory_item_id']) or Decimal('0')) + row['tail'],
+                movement_count=row['movement_count'], **values
+            ))
+
+        # Items sin movimientos desde su último snapshot: el saldo se arrastra
+        pending = set(item_ids) - {snapshot.inventory_item_id for snapshot in snapshots}
+        snapshots.extend(
+            InventoryStockSnapshot(inventory_item_id=item_id, date=day, closing_stock=closing[item_id] or Decimal('0'))
+            for item_id in sorted(pending)
+        )
+
+        with transaction.atomic():
+            InventoryStockSnapshot.objects.filter(date=day, inventory_item_id__in=item_ids).delete()
+            InventoryStockSnapshot.objects.bulk_create(snapshots)
+        return snapshots
+
+    @staticmethod
+    def movement_report(item, date_from, date_to):
+        """Saldo inicial, totales por tipo y detalle diario de un item entre dos fechas.
+
+        Los días consolidados salen de InventoryStockSnapshot; solo los días sin snapshot
+        (hoy, o días que la tarea no consolidó) se agregan desde el libro.
+        """
+        opening = InventoryLedgerService.stock_as_of([item.pk], date_from - timedelta(days=1))[item.pk]
+        columns = [column for column, _ in SNAPSHOT_TOTALS.values()]
+
+        days = {}
+        for snapshot in InventoryStockSnapshot.objects.filter(
+            inventory_item_id=item.pk, date__range=[date_from, date_to]
+        ):
+            days[snapshot.date] = {column: getattr(snapshot, column) for column in columns}
+            days[snapshot.date].update(movements=snapshot.movement_count, closing_stock=snapshot.closing_stock)
+
+        loose = defaultdict(lambda: dict({column: Decimal('0') for column in columns}, movements=0))
+        for day, movement_type, total, count in InventoryMovement.objects.filter(
+            inventory_item_id=item.pk, date__range=[date_from, date_to]
+        ).exclude(date__in=list(days)).values('date', 'movement_type').annotate(
+            total=models.Sum('quantity'), count=models.Count('id')
+        ).values_list('date', 'movement_type', 'total', 'count'):
+            column, sign = SNAPSHOT_TOTALS[movement_type]
+            loose[day][column] += total if column == 'adjusted' else total * sign
+            loose[day]['movements'] += count
+
+        balance = opening
+        totals = dict({column: Decimal('0') for column in columns}, movements=0)
+        detail = []
+        for day in sorted(set(days) | set(loose)):
+            if day in days:
+                row = days[day]
+                balance = row['closing_stock']
+            else:
+                row = loose[day]
+                balance += sum(row[column] * sign for column, sign in SNAPSHOT_TOTALS.values())
+                row['closing_stock'] = balance
+            for key in totals:
+                totals[key] += row[key]
+            if row['movements']:
+                detail.append(dict(row, date=day))
+
+        return {
+            'inventory_item': item.pk,
+            'date_from': date_from,
+            'date_to': date_to,
+            'opening_stock': opening,
+            'closing_stock': balance,
+            'totals': totals,
+            'days': detail,
+        }
@@ -4,75 +4,33 @@ from .models import InventoryItem
 
 @shared_task
 def update_all_inventory_metrics_task():
-    """Actualizar métricas de consumo de todos los items de inventario"""
-    items = InventoryItem.objects.all()
-    updated_count = 0
-    
-    for item in items:
-        try:
-            item.update_consumption_metrics()
-            updated_count += 1
-        except Exception as e:
-            # Log el error pero continúa con los demás items
-            print(f"Error actualizando métricas de {item.name}: {str(e)}")
-    
+    """Verificar el promedio móvil de consumo de todos los items.
+
+    El promedio se mantiene en cada registro de consumo; aquí solo se desliza la ventana
+    de los items sin consumo reciente y se corrige cualquier desviación frente a los
+    consumos diarios.
+    """
+    from .services import ConsumptionMetricsService
+
     return {
-        'total_items': items.count(),
-        'updated_items': updated_count
+        'total_items': InventoryItem.objects.count(),
+        'updated_items': ConsumptionMetricsService.refresh_all()
     }
 
 
 @shared_task
 def check_stock_alerts_task():
     """Verificar y generar alarmas por stock crítico"""
-    from apps.alarms.models import AlarmConfiguration, Alarm
-    
-    critical_items = []
-    
-    # Obtener items con stock crítico
-    for item in InventoryItem.objects.all():
-        status = item.stock_status
-        if status['status'] in ['CRITICAL', 'OUT_OF_STOCK']:
-            critical_items.append(item)
-            
-            # Verificar configuración de alarmas de stock
-            config = AlarmConfiguration.objects.filter(
-                alarm_type='STOCK',
-                farm=item.farm,
-                is_active=True
-            ).first()
-            
-            if config:
-                # Verificar si no existe alarma similar reciente
-                recent_alarms = Alarm.objects.filter(
-                    alarm_type='STOCK',
-                    entity_type='INVENTORY',
-                    entity_id=item.id,
-                    status='PENDING'
-                )
-                
-                if not recent_alarms.exists():
-                    priority = 'HIGH' if status['status'] == 'OUT_OF_STOCK' else 'MEDIUM'
-                    
-                    Alarm.objects.create(
-                        alarm_type='STOCK',
-                        entity_type='INVENTORY',
-                        entity_id=item.id,
-                        priority=priority,
-                        title=f'Stock crítico - {item.name}',
-                        message=f'{item.name} en {item.location_display}: {status["message"]}',
-                        farm=item.farm,
-                        shed=item.shed,
-                        data={
-                            'inventory_id': item.id,
-                            'current_stock': float(item.current_stock),
-                            'unit': item.unit,
-                            'status': status['status'],
-                            'projected_stockout': item.projected_stockout_date.isoformat() if item.projected_stockout_date else None
-                        }
-                    )
-    
-    return {
-        'critical_items_count': len(critical_items),
-        'alarms_generated': len([item for item in critical_items if AlarmConfiguration.objects.filter(alarm_type='STOCK', farm=item.farm, is_active=True).exists()])
-    }
\ No newline at end of file
+    from .services import StockAlertService
+
+    return StockAlertService.scan()
+
+
+@shared_task
+def roll_up_inventory_snapshots_task(day=None):
+    """Consolidar en InventoryStockSnapshot los movimientos de un día (ayer por defecto)"""
+    from django.utils.dateparse import parse_date
+    from .services_ledger import InventoryLedgerService
+
+    snapshots = InventoryLedgerService.roll_up(parse_date(day) if day else None)
+    return {'snapshots': len(snapshots)}
@@ -1,5 +1,6 @@
 import io
 import tempfile
+from datetime import timedelta
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -63,3 +64,468 @@ class InventoryMetricsTests(TestCase):
         self.assertAlmostEqual(float(self.item.daily_avg_consumption), 10.0, places=2)
         projected = self.item.projected_stockout_date
         self.assertIsNotNone(projected)
+
+
+class FifoConsumptionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='fifo')
+        self.farm = Farm.objects.create(name='Finca FIFO', location='', farm_manager=self.user)
+        self.item = InventoryItem.objects.create(name='Alimento FIFO', unit='KG', farm=self.farm)
+
+    def test_draw_down_in_decimal_across_batches(self):
+        from datetime import date
+        from decimal import Decimal
+        first = self.item.add_stock(100, entry_date=date(2025, 1, 1))
+        second = self.item.add_stock('100.25', entry_date=date(2025, 1, 2))
+
+        _, details = self.item.consume_fifo(150.5)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((first.current_quantity, second.current_quantity), (Decimal('0.00'), Decimal('49.75')))
+        self.assertEqual(self.item.current_stock, Decimal('49.75'))
+        self.assertEqual([d['quantity_consumed'] for d in details], [100.0, 50.5])
+
+    def test_touched_batches_are_written_with_one_update(self):
+        from datetime import date, timedelta
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for day in range(20):
+            self.item.add_stock(5, entry_date=date(2025, 1, 1) + timedelta(days=day))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.item.consume_fifo(97)
+
+        batch_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "inventory_foodbatch"')]
+        self.assertEqual(len(batch_updates), 1)
+        self.assertEqual(self.item.food_batches.filter(current_quantity__gt=0).count(), 1)
+
+    def test_insufficient_stock_leaves_batches_untouched(self):
+        from django.core.exceptions import ValidationError
+        batch = self.item.add_stock(10)
+
+        with self.assertRaises(ValidationError):
+            self.item.consume_fifo(10.01)
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.current_quantity, 10)
+
+
+class RollingConsumptionTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        self.user = User.objects.create(username='rolling')
+        self.farm = Farm.objects.create(name='Finca Rolling', location='', farm_manager=self.user)
+        self.item = InventoryItem.objects.create(name='Alimento Rolling', unit='KG', farm=self.farm)
+        self.today = date.today()
+
+    def _record(self, days_ago, quantity):
+        from datetime import timedelta
+        return InventoryConsumptionRecord.objects.create(
+            inventory_item=self.item, date=self.today - timedelta(days=days_ago), quantity_consumed=quantity
+        )
+
+    def test_each_record_updates_average_without_rescanning_window(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._record(1, 45)
+
+        with CaptureQueriesContext(connection) as ctx:
+            record = self._record(0, 15)
+
+        self.item.refresh_from_db()
+        self.assertEqual(float(self.item.daily_avg_consumption), 2.0)
+        self.assertEqual(self.item.last_consumption_date, self.today)
+        self.assertFalse(any('"inventory_inventoryconsumptionrecord"' in q['sql'] and 'SUM(' in q['sql'] for q in ctx.captured_queries))
+
+        # Cambiar o borrar el registro ajusta el mismo bucket
+        record.quantity_consumed = 45
+        record.save()
+        self.item.refresh_from_db()
+        self.assertEqual(float(self.item.consumption_window_total), 90.0)
+        record.delete()
+        self.item.refresh_from_db()
+        self.assertEqual(float(self.item.consumption_window_total), 45.0)
+
+    def test_window_slides_dropping_expired_days(self):
+        from datetime import timedelta
+        from apps.inventory.services import ConsumptionMetricsService
+        self._record(29, 300)
+        self._record(0, 30)
+
+        ConsumptionMetricsService.apply(self.item.pk, {self.today + timedelta(days=1): 60}, today=self.today + timedelta(days=1))
+
+        self.item.refresh_from_db()
+        self.assertEqual(float(self.item.consumption_window_total), 90.0)
+        self.assertEqual(float(self.item.daily_avg_consumption), 3.0)
+
+    def test_nightly_check_slides_idle_items(self):
+        from datetime import timedelta
+        from apps.inventory.services import ConsumptionMetricsService
+        self._record(29, 300)
+
+        updated = ConsumptionMetricsService.refresh_all(today=self.today + timedelta(days=1))
+
+        self.item.refresh_from_db()
+        self.assertEqual(updated, 1)
+        self.assertEqual(float(self.item.daily_avg_consumption), 0.0)
+        self.assertEqual(ConsumptionMetricsService.refresh_all(today=self.today + timedelta(days=1)), 0)
+
+
+class StockAlertScanTests(TestCase):
+    def setUp(self):
+        from apps.alarms.models import AlarmConfiguration
+        self.user = User.objects.create(username='stockscan')
+        self.farm = Farm.objects.create(name='Finca Stock', location='', farm_manager=self.user)
+        self.other_farm = Farm.objects.create(name='Finca Sin Config', location='', farm_manager=self.user)
+        self.config = AlarmConfiguration.objects.create(alarm_type='STOCK', farm=self.farm, threshold_value=2)
+
+    def _item(self, name, stock, avg, farm=None):
+        return InventoryItem.objects.create(
+            name=name, unit='KG', farm=farm or self.farm, current_stock=stock, daily_avg_consumption=avg
+        )
+
+    def test_scan_creates_missing_alarms_with_fixed_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.alarms.models import Alarm
+        from apps.inventory.tasks import check_stock_alerts_task
+
+        empty = self._item('Vacio', 0, 0)
+        low = self._item('Bajo', 15, 10)
+        self._item('Normal', 500, 10)
+        self._item('Sin historico', 50, 0)
+        self._item('Sin config', 0, 0, farm=self.other_farm)
+        already = self._item('Ya alertado', 5, 10)
+        Alarm.objects.create(alarm_type='STOCK', description='previa', farm=self.farm, inventory_item=already)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = check_stock_alerts_task()
+
+        self.assertEqual(result, {'critical_items_count': 4, 'alarms_generated': 2})
+        created = Alarm.objects.filter(configuration=self.config).order_by('inventory_item_id')
+        self.assertEqual(
+            [(a.inventory_item_id, a.priority) for a in created],
+            [(empty.id, 'HIGH'), (low.id, 'MEDIUM')]
+        )
+        self.assertIn('1.5 días', created[1].description)
+        self.assertLessEqual(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]), 4)
+
+        # Las alarmas pendientes no se duplican en el siguiente barrido
+        self.assertEqual(check_stock_alerts_task()['alarms_generated'], 0)
+
+
+class StockoutForecastTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from apps.flocks.models import Flock
+        self.user = User.objects.create(username='forecast')
+        self.farm = Farm.objects.create(name='Finca Forecast', location='', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Galpon F', farm=self.farm, capacity=5000)
+        self.today = date.today()
+        # Consumo de referencia lineal: 50 g/ave/día al llegar, +1 g por día de edad
+        for age in (0, 100):
+            BreedReference.objects.create(breed='Cobb', age_days=age, expected_weight=40 + age * 30, expected_consumption=50 + age)
+        self.flock = Flock.objects.create(
+            arrival_date=self.today - timedelta(days=40), initial_quantity=1000, current_quantity=1000,
+            initial_weight=40, breed='Cobb', gender='X', supplier='P', shed=self.shed
+        )
+        self.item = InventoryItem.objects.create(name='Engorde', unit='KG', farm=self.farm, shed=self.shed, current_stock=3000)
+
+    def test_projection_follows_flock_age(self):
+        from apps.inventory.services_forecast import StockoutForecastService
+        forecast = StockoutForecastService.get(self.item)
+
+        # Hoy: 1000 aves × 90 g = 90 kg, y sube 1 kg por día
+        self.assertEqual(forecast.daily_consumption, 90.0)
+        # 90 + 91 + ... supera 3000 kg en el día 29 (a 90 kg/día constantes serían 33)
+        self.assertEqual(forecast.stockout_date, self.today + timedelta(days=29))
+
+    def test_observed_consumption_scales_the_curve(self):
+        from apps.inventory.models import InventoryDailyConsumption
+        from apps.inventory.services_forecast import StockoutForecastService
+        # Los últimos 30 días se consumió la mitad de lo esperado (edades 10..39)
+        InventoryDailyConsumption.objects.bulk_create([
+            InventoryDailyConsumption(inventory_item=self.item, date=self.today - timedelta(days=back), quantity=(50 + 40 - back) / 2)
+            for back in range(1, 31)
+        ])
+        StockoutForecastService.invalidate()
+
+        self.assertEqual(StockoutForecastService.get(self.item).daily_consumption, 45.0)
+
+    def test_items_without_curve_use_smoothed_observed_level(self):
+        item = InventoryItem.objects.create(name='Vitaminas', unit='BAG', farm=self.farm, shed=self.shed, current_stock=100)
+        for back in range(1, 31):
+            InventoryConsumptionRecord.objects.create(inventory_item=item, date=self.today - timedelta(days=back), quantity_consumed=2)
+
+        self.assertEqual(item.projected_stockout_date, self.today + timedelta(days=50))
+
+    def test_residual_consumption_does_not_extrapolate_past_the_cap(self):
+        from apps.users.models import Role
+        role, _ = Role.objects.get_or_create(name='Administrador Sistema')
+        self.user.role = role
+        self.user.save()
+        item = InventoryItem.objects.create(name='Sacos', unit='BAG', farm=self.farm, shed=self.shed, current_stock=10000)
+        # Un solo consumo antiguo: el nivel suavizado queda casi en cero
+        InventoryConsumptionRecord.objects.create(inventory_item=item, date=self.today - timedelta(days=25), quantity_consumed=5)
+
+        self.assertIsNone(item.projected_stockout_date)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/inventory/').status_code, 200)
+
+    def test_forecasts_are_cached_until_next_consumption(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        first = self.item.projected_stockout_date
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.item.projected_stockout_date, first)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        InventoryConsumptionRecord.objects.create(inventory_item=self.item, date=self.today, quantity_consumed=5)
+        with CaptureQueriesContext(connection) as ctx:
+            self.item.projected_stockout_date
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+
+class BulkConsumeFifoTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from apps.flocks.models import Flock
+        from apps.users.models import Role
+        role, _ = Role.objects.get_or_create(name='Administrador Sistema')
+        self.user = User.objects.create(username='bulkfifo', role=role)
+        self.farm = Farm.objects.create(name='Finca Bulk', location='', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Galpon B', farm=self.farm, capacity=5000)
+        self.today = date.today()
+        self.flocks = [
+            Flock.objects.create(arrival_date=self.today - timedelta(days=20), initial_quantity=100, current_quantity=100,
+                                 initial_weight=40, breed='Ross', gender='X', supplier='P', shed=self.shed)
+            for _ in range(3)
+        ]
+        self.items = [InventoryItem.objects.create(name=f'Alimento {n}', unit='KG', farm=self.farm) for n in range(2)]
+        for item in self.items:
+            item.add_stock(100, entry_date=date(2025, 1, 1))
+            item.add_stock(100, entry_date=date(2025, 1, 2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _records(self, days):
+        return [
+            {'flock_id': flock.id, 'inventory_item_id': item.id, 'quantity_consumed': '2.5',
+             'date': (self.today - timedelta(days=day)).isoformat(), 'client_id': f'{item.id}-{flock.id}-{day}'}
+            for item in self.items for flock in self.flocks for day in range(days)
+        ]
+
+    def test_groups_by_item_with_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.inventory.models import FoodBatch, FoodConsumptionRecord
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/inventory/bulk-consume-fifo/', {'consumption_records': self._records(1)}, format='json')
+        records = [r for r in self._records(20) if not r['client_id'].endswith('-0')]
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.post('/api/inventory/bulk-consume-fifo/', {'consumption_records': records}, format='json')
+
+        self.assertEqual((resp.data['total'], resp.data['successful']), (114, 114))
+        self.assertLessEqual(len(large.captured_queries), len(small.captured_queries) + 2)
+        for item in self.items:
+            item.refresh_from_db()
+            self.assertEqual(float(item.current_stock), 50.0)
+            self.assertEqual(float(item.consumption_window_total), 150.0)
+        self.assertEqual(FoodConsumptionRecord.objects.count(), 120)
+        self.assertEqual(list(FoodBatch.objects.order_by('id').values_list('current_quantity', flat=True)), [0, 50, 0, 50])
+
+    def test_rejected_records_do_not_block_the_group(self):
+        item = self.items[0]
+        flock = self.flocks[0]
+        payload = {'consumption_records': [
+            {'flock_id': flock.id, 'inventory_item_id': item.id, 'quantity_consumed': '150', 'client_id': 'a'},
+            {'flock_id': flock.id, 'inventory_item_id': item.id, 'quantity_consumed': '10', 'client_id': 'b'},
+            {'flock_id': self.flocks[1].id, 'inventory_item_id': item.id, 'quantity_consumed': '60', 'client_id': 'c'},
+            {'flock_id': 999999, 'inventory_item_id': item.id, 'quantity_consumed': '1', 'client_id': 'd'},
+        ]}
+
+        resp = self.client.post('/api/inventory/bulk-consume-fifo/', payload, format='json')
+
+        self.assertEqual([d['status'] for d in resp.data['details']], ['success', 'error', 'error', 'error'])
+        self.assertIn('Ya existe', resp.data['details'][1]['error'])
+        self.assertIn('Stock insuficiente', resp.data['details'][2]['error'])
+        self.assertEqual(resp.data['details'][0]['fifo_details'][1]['quantity_consumed'], 50.0)
+        item.refresh_from_db()
+        self.assertEqual(float(item.current_stock), 50.0)
+
+
+class InventoryLedgerTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from apps.users.models import Role
+        role, _ = Role.objects.get_or_create(name='Administrador Sistema')
+        self.user = User.objects.create(username='ledger', role=role)
+        self.farm = Farm.objects.create(name='Finca Libro', location='', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='Galpon L', farm=self.farm, capacity=1000)
+        self.item = InventoryItem.objects.create(name='Bodega', unit='KG', farm=self.farm, current_stock=20)
+        self.target = InventoryItem.objects.create(name='Galpon', unit='KG', farm=self.farm, shed=self.shed)
+        self.today = date.today()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _move(self, days_ago, movement_type, quantity):
+        from apps.inventory.models import InventoryMovement
+        return InventoryMovement.objects.create(
+            inventory_item=self.target, movement_type=movement_type, date=self.today - timedelta(days=days_ago),
+            quantity=quantity, balance_after=0
+        )
+
+    def test_every_stock_change_is_written_to_the_ledger(self):
+        from datetime import date
+        from decimal import Decimal
+        from django.core.exceptions import ValidationError
+        from apps.inventory.models import InventoryMovement
+        self.item.add_stock(100, entry_date=date(2025, 3, 1), user=self.user)
+        self.item.consume_fifo(30, user=self.user)
+        self.client.post('/api/inventory/bulk-update-stock/', {'stock_updates': [{'inventory_id': self.item.id, 'new_stock': '85'}]}, format='json')
+        resp = self.client.post(f'/api/inventory/{self.item.id}/transfer/', {'target_id': self.target.id, 'quantity': '25'}, format='json')
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual([b['entry_date'] for b in resp.data], ['2025-03-01'])
+        rows = list(InventoryMovement.objects.filter(inventory_item=self.item).values_list('movement_type', 'quantity', 'balance_after'))
+        self.assertEqual(rows, [
+            ('ADJUSTMENT', Decimal('20.00'), Decimal('20.00')),
+            ('RECEIPT', Decimal('100.00'), Decimal('120.00')),
+            ('CONSUMPTION', Decimal('-30.00'), Decimal('90.00')),
+            ('ADJUSTMENT', Decimal('-5.00'), Decimal('85.00')),
+            ('TRANSFER_OUT', Decimal('-25.00'), Decimal('60.00')),
+        ])
+        self.item.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual((self.item.current_stock, self.target.current_stock), (Decimal('60.00'), Decimal('25.00')))
+        self.assertEqual(self.target.movements.get().movement_type, 'TRANSFER_IN')
+
+        movement = self.item.movements.first()
+        with self.assertRaises(ValidationError):
+            movement.save()
+        with self.assertRaises(ValidationError):
+            movement.delete()
+
+    def test_transfer_rejects_items_with_different_units(self):
+        from decimal import Decimal
+        from apps.inventory.models import InventoryMovement
+        self.target.unit = 'TON'
+        self.target.save()
+        resp = self.client.post(f'/api/inventory/{self.item.id}/transfer/', {'target_id': self.target.id, 'quantity': '10'}, format='json')
+
+        self.assertEqual(resp.status_code, 400)
+        self.item.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual((self.item.current_stock, self.target.current_stock), (Decimal('20.00'), Decimal('0.00')))
+        self.assertFalse(InventoryMovement.objects.filter(movement_type__in=['TRANSFER_IN', 'TRANSFER_OUT']).exists())
+
+    def test_item_update_records_stock_change_as_adjustment(self):
+        from decimal import Decimal
+        from apps.inventory.services_ledger import InventoryLedgerService
+        resp = self.client.patch(f'/api/inventory/{self.item.id}/', {'current_stock': '500', 'name': 'Bodega central'}, format='json')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['current_stock'], '500.00')
+        adjustment = self.item.movements.last()
+        self.assertEqual((adjustment.movement_type, adjustment.quantity, adjustment.balance_after), ('ADJUSTMENT', Decimal('480.00'), Decimal('500.00')))
+        self.assertEqual(InventoryLedgerService.stock_as_of([self.item.id], self.today), {self.item.id: Decimal('500.00')})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.name, 'Bodega central')
+
+    def test_stock_as_of_reads_snapshot_plus_tail(self):
+        from decimal import Decimal
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.inventory.services_ledger import InventoryLedgerService
+        self._move(4, 'RECEIPT', 100)
+        self._move(3, 'CONSUMPTION', -30)
+        self._move(2, 'ADJUSTMENT', 5)
+        self._move(0, 'CONSUMPTION', -10)
+
+        InventoryLedgerService.roll_up(self.today - timedelta(days=3))
+        snapshot = InventoryLedgerService.roll_up(self.today - timedelta(days=3))
+        self.assertEqual(self.target.stock_snapshots.count(), 1)
+        self.assertEqual((snapshot[0].closing_stock, snapshot[0].received, snapshot[0].consumed), (Decimal('70'), 0, Decimal('30')))
+
+        with CaptureQueriesContext(connection) as ctx:
+            stock = InventoryLedgerService.stock_as_of([self.target.id], self.today - timedelta(days=1))
+        self.assertEqual(stock, {self.target.id: Decimal('75')})
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(InventoryLedgerService.stock_as_of([self.target.id], self.today - timedelta(days=4)), {self.target.id: Decimal('100')})
+
+    def test_movement_report_combines_snapshots_and_ledger(self):
+        from decimal import Decimal
+        from apps.inventory.tasks import roll_up_inventory_snapshots_task
+        self._move(4, 'RECEIPT', 100)
+        self._move(3, 'CONSUMPTION', -30)
+        self._move(2, 'ADJUSTMENT', -5)
+        self._move(2, 'TRANSFER_OUT', -15)
+        self._move(0, 'CONSUMPTION', -10)
+        roll_up_inventory_snapshots_task((self.today - timedelta(days=3)).isoformat())
+
+        resp = self.client.get(f'/api/inventory/{self.target.id}/movements/', {
+            'date_from': (self.today - timedelta(days=3)).isoformat(), 'date_to': self.today.isoformat()
+        })
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data['opening_stock'], resp.data['closing_stock']), (Decimal('100'), Decimal('40')))
+        totals = resp.data['totals']
+        self.assertEqual((totals['consumed'], totals['adjusted'], totals['transferred_out'], totals['movements']), (Decimal('40'), Decimal('-5'), Decimal('15'), 4))
+        self.assertEqual([(d['date'], d['closing_stock']) for d in resp.data['days']], [
+            (self.today - timedelta(days=3), Decimal('70')), (self.today - timedelta(days=2), Decimal('50')), (self.today, Decimal('40'))
+        ])
+
+        resp = self.client.get('/api/inventory/stock-as-of/', {'date': (self.today - timedelta(days=2)).isoformat()})
+        # El saldo inicial de la bodega entró al libro hoy
+        self.assertEqual({row['id']: row['stock'] for row in resp.data['items']}, {self.item.id: Decimal('0'), self.target.id: Decimal('50')})
+
+
+class FefoConsumptionTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        self.user = User.objects.create(username='fefo')
+        self.farm = Farm.objects.create(name='Finca FEFO', location='', farm_manager=self.user)
+        self.item = InventoryItem.objects.create(name='Alimento FEFO', unit='KG', farm=self.farm, draw_down_strategy='FEFO')
+        self.undated = self._batch(date(2025, 1, 1), None)
+        self.late = self._batch(date(2025, 1, 2), date(2025, 9, 1))
+        self.early = self._batch(date(2025, 1, 3), date(2025, 6, 1))
+
+    def _batch(self, entry_date, expiry_date):
+        batch = self.item.add_stock(10, entry_date=entry_date)
+        batch.expiry_date = expiry_date
+        batch.save()
+        return batch
+
+    def test_consumes_first_expiring_batch_and_undated_last(self):
+        _, details = self.item.consume_fifo(25)
+
+        self.assertEqual(
+            [(d['batch_id'], d['quantity_consumed']) for d in details],
+            [(self.early.id, 10.0), (self.late.id, 10.0), (self.undated.id, 5.0)]
+        )
+
+        # En FIFO manda la fecha de entrada aunque el lote no tenga vencimiento
+        self.item.draw_down_strategy = 'FIFO'
+        self.item.save()
+        self.item.add_stock(10, entry_date=self.late.entry_date)
+        _, details = self.item.consume_fifo(6)
+        self.assertEqual([d['batch_id'] for d in details][0], self.undated.id)
+
+    def test_open_batches_use_partial_index_for_each_strategy(self):
+        from django.db import connection
+        from apps.inventory.models import FoodBatch
+        if connection.vendor != 'sqlite':
+            self.skipTest('plan de consulta específico de SQLite')
+        for day in range(200):
+            FoodBatch.objects.create(inventory_item=self.item, entry_date=self.undated.entry_date, initial_quantity=1, current_quantity=0)
+
+        open_batches = FoodBatch.objects.filter(inventory_item_id=self.item.id, current_quantity__gt=0)
+        plan = open_batches.order_by('expiry_date', 'entry_date', 'id').explain()
+        self.assertIn('foodbatch_fefo_open_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIn('foodbatch_fifo_open_idx', open_batches.order_by('entry_date', 'id').explain())
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from django.utils import timezone
 from decimal import Decimal
@@ -12,10 +13,15 @@ from .serializers import (
     InventoryItemSerializer, BulkStockUpdateSerializer, FoodBatchSerializer,
     FoodConsumptionRecordSerializer, FoodConsumptionRequestSerializer,
     BulkFoodConsumptionSerializer, FIFOConsumptionResultSerializer,
-    AddStockSerializer
+    AddStockSerializer, StockTransferSerializer, StockAsOfQuerySerializer,
+    MovementReportQuerySerializer
 )
 from .permissions import CanManageInventory
+from .services import BulkFifoConsumptionService
+from .services_ledger import InventoryLedgerService
 from apps.flocks.models import Flock
+from apps.sync.services import IdempotencyService
+from avicolatrack.pagination import DateKeysetPagination
 
 
 class InventoryViewSet(viewsets.ModelViewSet):
@@ -36,6 +42,15 @@ class InventoryViewSet(viewsets.ModelViewSet):
         # Default: restrict to user's assigned sheds/farms
         return InventoryItem.objects.filter(farm__in=user.farms.all())
 
+    def perform_update(self, serializer):
+        # Un cambio de current_stock por PATCH/PUT es un ajuste y debe quedar en el libro
+        new_stock = serializer.validated_data.pop('current_stock', None)
+        with transaction.atomic():
+            serializer.instance = InventoryItem.objects.select_for_update().get(pk=serializer.instance.pk)
+            item = serializer.save()
+            if new_stock is not None:
+                InventoryLedgerService.adjust(item, new_stock, self.request.user, notes='Edición del item')
+
     @action(detail=False, methods=['get'], url_path='stock-alerts')
     def stock_alerts(self, request):
         user = request.user
@@ -92,8 +107,8 @@ class InventoryViewSet(viewsets.ModelViewSet):
                     if not CanManageInventory().has_object_permission(request, self, item):
                         raise PermissionError('Sin permisos para actualizar este inventario')
 
-                    item.current_stock = bs.validated_data['new_stock']
-                    item.save()
+                    # El conteo queda en el libro como ajuste por la diferencia
+                    InventoryLedgerService.adjust(item, bs.validated_data['new_stock'], request.user, notes='Actualización de stock')
                     item.update_consumption_metrics()
 
                     results.append({'client_id': bs.validated_data.get('client_id'), 'status': 'success', 'new_stock': float(item.current_stock)})
@@ -117,7 +132,8 @@ class InventoryViewSet(viewsets.ModelViewSet):
         # Crear lote FIFO
         batch = item.add_stock(
             quantity=serializer.validated_data['quantity'],
-            entry_date=serializer.validated_data.get('entry_date')
+            entry_date=serializer.validated_data.get('entry_date'),
+            user=request.user
         )
         
         # Actualizar campos opcionales del lote
@@ -149,16 +165,11 @@ class InventoryViewSet(viewsets.ModelViewSet):
             consumption_record, fifo_details = item.consume_fifo(
                 quantity_to_consume=serializer.validated_data['quantity_consumed'],
                 flock=flock,
-                user=request.user
+                user=request.user,
+                date=serializer.validated_data.get('date'),
+                client_id=serializer.validated_data.get('client_id')
             )
             
-            # Actualizar campos opcionales
-            if serializer.validated_data.get('date'):
-                consumption_record.date = serializer.validated_data['date']
-            if serializer.validated_data.get('client_id'):
-                consumption_record.client_id = serializer.validated_data['client_id']
-            consumption_record.save()
-            
             return Response({
                 'consumption_record_id': consumption_record.id,
                 'fifo_details': fifo_details,
@@ -170,6 +181,60 @@ class InventoryViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        request=StockTransferSerializer,
+        responses=OpenApiResponse(response=FoodBatchSerializer(many=True))
+    )
+    @action(detail=True, methods=['post'], url_path='transfer', permission_classes=[IsAuthenticated, CanManageInventory])
+    def transfer(self, request, pk=None):
+        """Transferir stock a otro item conservando la antigüedad FIFO de los lotes"""
+        item = self.get_object()
+        serializer = StockTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            target = InventoryItem.objects.get(id=serializer.validated_data['target_id'])
+        except InventoryItem.DoesNotExist:
+            return Response({'error': 'Item de destino no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        self.check_object_permissions(request, target)
+
+        try:
+            batches = InventoryLedgerService.transfer(
+                item, target, serializer.validated_data['quantity'], request.user,
+                notes=serializer.validated_data.get('notes', '')
+            )
+        except DjangoValidationError as e:
+            return Response({'error': '; '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(FoodBatchSerializer(batches, many=True).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(parameters=[StockAsOfQuerySerializer], responses=OpenApiResponse(response=None))
+    @action(detail=False, methods=['get'], url_path='stock-as-of')
+    def stock_as_of(self, request):
+        """Stock de cada item al cierre de una fecha (?date=AAAA-MM-DD)"""
+        params = StockAsOfQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        day = params.validated_data['date']
+
+        items = list(self.get_queryset().order_by('id').values('id', 'name', 'unit'))
+        stock = InventoryLedgerService.stock_as_of([item['id'] for item in items], day)
+        return Response({
+            'date': day,
+            'items': [dict(item, stock=stock[item['id']]) for item in items]
+        })
+
+    @extend_schema(parameters=[MovementReportQuerySerializer], responses=OpenApiResponse(response=None))
+    @action(detail=True, methods=['get'], url_path='movements')
+    def movements(self, request, pk=None):
+        """Saldo inicial, totales por tipo y detalle diario de movimientos (?date_from=&date_to=)"""
+        item = self.get_object()
+        params = MovementReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        return Response(InventoryLedgerService.movement_report(
+            item, params.validated_data['date_from'], params.validated_data['date_to']
+        ))
+
     @action(detail=True, methods=['get'], url_path='fifo-batches')
     def fifo_batches(self, request, pk=None):
         """Obtener lotes FIFO de un item"""
@@ -183,59 +248,35 @@ class InventoryViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['post'], url_path='bulk-consume-fifo')
     def bulk_consume_fifo(self, request):
-        """Sincronización masiva de consumo FIFO desde dispositivos móviles"""
+        """Sincronización masiva de consumo FIFO desde dispositivos móviles.
+
+        Los client_id ya sincronizados por el dispositivo (cabecera X-Device-ID) devuelven
+        su resultado original sin volver a descontar stock.
+        """
         serializer = BulkFoodConsumptionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
-        results = []
-        
-        with transaction.atomic():
-            for consumption_data in serializer.validated_data['consumption_records']:
-                try:
-                    # Obtener objetos
-                    flock = Flock.objects.get(id=consumption_data['flock_id'])
-                    item = InventoryItem.objects.get(id=consumption_data['inventory_item_id'])
-                    
-                    # Verificar permisos
-                    if not CanManageInventory().has_object_permission(request, self, item):
-                        raise PermissionError('Sin permisos para este inventario')
-                    
-                    # Realizar consumo FIFO
-                    consumption_record, fifo_details = item.consume_fifo(
-                        quantity_to_consume=consumption_data['quantity_consumed'],
-                        flock=flock,
-                        user=request.user
-                    )
-                    
-                    # Configurar campos adicionales
-                    if consumption_data.get('date'):
-                        consumption_record.date = consumption_data['date']
-                    if consumption_data.get('client_id'):
-                        consumption_record.client_id = consumption_data['client_id']
-                    consumption_record.save()
-                    
-                    results.append({
-                        'client_id': consumption_data.get('client_id'),
-                        'server_id': consumption_record.id,
-                        'status': 'success',
-                        'fifo_details': fifo_details
-                    })
-                    
-                except Exception as e:
-                    results.append({
-                        'client_id': consumption_data.get('client_id'),
-                        'server_id': None,
-                        'status': 'error',
-                        'error': str(e)
-                    })
+        records = serializer.validated_data['consumption_records']
+
+        results = IdempotencyService.run(
+            'food_consumption',
+            IdempotencyService.device_key(request.META.get('HTTP_X_DEVICE_ID'), request.user),
+            records,
+            lambda pending: self._consume_fifo_records(request, pending)
+        )
         
         return Response({
-            'total': len(serializer.validated_data['consumption_records']),
+            'total': len(records),
             'successful': len([r for r in results if r['status'] == 'success']),
             'errors': len([r for r in results if r['status'] == 'error']),
             'details': results
         })
 
+    def _consume_fifo_records(self, request, records):
+        permission = CanManageInventory()
+        return BulkFifoConsumptionService.consume_records(
+            records, request.user, lambda item: permission.has_object_permission(request, self, item)
+        )
+
     # uses CanManageInventory permission for object-level checks
 
 
@@ -263,6 +304,7 @@ class FoodConsumptionRecordViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = FoodConsumptionRecord.objects.all().order_by('-date')
     serializer_class = FoodConsumptionRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DateKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:55
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_alter_reportschedule_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='data',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from apps.farms.models import Farm, Shed
 from apps.flocks.models import Flock
 import json
@@ -49,8 +50,8 @@ class Report(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    # Resultado del reporte
-    data = models.JSONField(default=dict, blank=True)
+    # Resultado del reporte (Decimal y fechas de los agregados se guardan como texto)
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
     file_path = models.CharField(max_length=500, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     
@@ -2,6 +2,7 @@ from django.db.models import Avg, Sum, Count, Q, F, Max, Min
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
+import numpy as np
 import pandas as pd
 import openpyxl
 from openpyxl.chart import LineChart, BarChart, PieChart, Reference
@@ -10,7 +11,8 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 import os
 from typing import Dict, List, Optional, Any
 
-from apps.flocks.models import Flock, DailyWeightRecord, MortalityRecord
+from apps.flocks.models import Flock, DailyWeightRecord, MortalityRecord, FlockSummary
+from apps.flocks.reference_cache import BreedReferenceCache, as_decimal
 from apps.inventory.models import InventoryItem, FoodConsumptionRecord
 from apps.alarms.models import Alarm
 from apps.farms.models import Farm, Shed
@@ -48,7 +50,7 @@ class ProductivityReportService:
                     'scope': {
                         'farm': self.farm.name if self.farm else 'Todas las fincas',
                         'shed': self.shed.name if self.shed else 'Todos los galpones',
-                        'flock': self.flock.name if self.flock else 'Todos los lotes',
+                        'flock': self._flock_label(self.flock) if self.flock else 'Todos los lotes',
                         'flocks_analyzed': flocks.count()
                     },
                     'generated_at': timezone.now().isoformat()
@@ -88,62 +90,84 @@ class ProductivityReportService:
         elif self.farm:
             queryset = queryset.filter(shed__farm=self.farm)
         
-        # Solo lotes que tengan datos en el período
-        queryset = queryset.filter(
-            Q(placement_date__lte=self.date_to) &
-            (Q(sale_date__gte=self.date_from) | Q(sale_date__isnull=True))
+        # Solo lotes que tengan datos en el período (los cerrados, hasta su fecha de cierre)
+        queryset = queryset.filter(arrival_date__lte=self.date_to).filter(
+            Q(summary__isnull=True) | Q(summary__closed_on__gte=self.date_from)
         )
         
-        return queryset.select_related('shed', 'shed__farm', 'breed')
+        return queryset.select_related('shed', 'shed__farm')
     
-    def _generate_summary(self, flocks) -> Dict[str, Any]:
-        """Genera resumen ejecutivo"""
-        total_birds = flocks.aggregate(Sum('initial_quantity'))['initial_quantity__sum'] or 0
-        active_flocks = flocks.filter(sale_date__isnull=True).count()
+    @staticmethod
+    def _flock_label(flock) -> str:
+        return f"Lote {flock.id}"
+    
+    def _closed_summaries(self, flocks, date_from, date_to) -> Dict[int, FlockSummary]:
+        """Cierres de los lotes cuya vida completa cae dentro del período.
         
-        # Mortalidad total en el período
-        mortality_data = MortalityRecord.objects.filter(
-            flock__in=flocks,
-            date__range=[self.date_from, self.date_to]
-        ).aggregate(
-            total_deaths=Sum('quantity'),
-            records_count=Count('id')
-        )
+        Para esos lotes los totales del período son los de toda su vida: se leen de
+        FlockSummary y sus registros diarios no se vuelven a recorrer.
+        """
+        return {
+            summary.flock_id: summary
+            for summary in FlockSummary.objects.filter(
+                flock__in=flocks,
+                arrival_date__gte=date_from,
+                closed_on__lte=date_to
+            )
+        }
+    
+    def _period_totals(self, flocks, date_from, date_to) -> Dict[str, Any]:
+        """Mortalidad, pesajes y consumo del período: cierres para lotes cerrados, registros para el resto"""
+        closed = self._closed_summaries(flocks, date_from, date_to)
+        open_filter = {'flock__in': flocks, 'date__range': [date_from, date_to]}
         
-        # Peso promedio actual
-        latest_weights = DailyWeightRecord.objects.filter(
-            flock__in=flocks,
-            date__range=[self.date_from, self.date_to]
-        ).aggregate(
-            avg_weight=Avg('average_weight'),
-            records_count=Count('id')
+        mortality = MortalityRecord.objects.filter(**open_filter).exclude(flock_id__in=list(closed)).aggregate(
+            total=Sum('deaths'), records=Count('id')
         )
-        
-        # Consumo total
-        consumption_data = FoodConsumptionRecord.objects.filter(
-            flock__in=flocks,
-            consumption_date__range=[self.date_from, self.date_to]
-        ).aggregate(
-            total_consumption=Sum('quantity_kg'),
-            records_count=Count('id')
+        weights = DailyWeightRecord.objects.filter(**open_filter).exclude(flock_id__in=list(closed)).aggregate(
+            total=Sum('average_weight'), records=Count('id')
+        )
+        consumption = FoodConsumptionRecord.objects.filter(**open_filter).exclude(flock_id__in=list(closed)).aggregate(
+            total=Sum('quantity_consumed'), records=Count('id')
         )
         
+        summaries = closed.values()
+        return {
+            'closed_flocks': len(closed),
+            'deaths': (mortality['total'] or 0) + sum(s.total_mortality for s in summaries),
+            'mortality_records': mortality['records'] + sum(s.mortality_records for s in summaries),
+            'weight_total': (weights['total'] or 0) + sum(
+                (s.average_weight or 0) * s.weight_records for s in summaries
+            ),
+            'weight_records': weights['records'] + sum(s.weight_records for s in summaries),
+            'feed_kg': (consumption['total'] or 0) + sum(s.total_feed_kg for s in summaries),
+            'feed_records': consumption['records'] + sum(s.feed_records for s in summaries),
+        }
+    
+    def _generate_summary(self, flocks) -> Dict[str, Any]:
+        """Genera resumen ejecutivo"""
+        total_birds = flocks.aggregate(Sum('initial_quantity'))['initial_quantity__sum'] or 0
+        active_flocks = flocks.filter(status='ACTIVE').count()
+        totals = self._period_totals(flocks, self.date_from, self.date_to)
+        average_weight = totals['weight_total'] / totals['weight_records'] if totals['weight_records'] else 0
+        
         return {
             'total_flocks': flocks.count(),
             'active_flocks': active_flocks,
+            'closed_flocks_from_summary': totals['closed_flocks'],
             'total_birds': total_birds,
             'mortality': {
-                'total_deaths': mortality_data['total_deaths'] or 0,
-                'mortality_rate': round((mortality_data['total_deaths'] or 0) / max(total_birds, 1) * 100, 2),
-                'records': mortality_data['records_count'] or 0
+                'total_deaths': totals['deaths'],
+                'mortality_rate': round(totals['deaths'] / max(total_birds, 1) * 100, 2),
+                'records': totals['mortality_records']
             },
             'weight': {
-                'average_weight': round(latest_weights['avg_weight'] or 0, 2),
-                'records': latest_weights['records_count'] or 0
+                'average_weight': round(average_weight, 2),
+                'records': totals['weight_records']
             },
             'consumption': {
-                'total_kg': round(consumption_data['total_consumption'] or 0, 2),
-                'records': consumption_data['records_count'] or 0
+                'total_kg': round(totals['feed_kg'], 2),
+                'records': totals['feed_records']
             }
         }
     
@@ -152,52 +176,59 @@ class ProductivityReportService:
         weight_records = DailyWeightRecord.objects.filter(
             flock__in=flocks,
             date__range=[self.date_from, self.date_to]
-        ).select_related('flock', 'flock__breed')
+        )
+        
+        # Pesajes del período agrupados por lote en una sola consulta
+        weights_by_flock = {}
+        for record in weight_records.order_by('flock_id', 'date'):
+            weights_by_flock.setdefault(record.flock_id, []).append(record)
+        weighed = [flock for flock in flocks if flock.id in weights_by_flock]
+        
+        # Estándar de la raza a la fecha del último pesaje, resuelto en bloque desde las curvas cacheadas
+        expected = BreedReferenceCache.lookup_pairs(
+            (flock, weights_by_flock[flock.id][-1].date) for flock in weighed
+        ).expected_weight
         
         # Análisis por lote
         flock_analysis = []
         
-        for flock in flocks:
-            flock_weights = weight_records.filter(flock=flock).order_by('date')
+        for index, flock in enumerate(weighed):
+            flock_weights = weights_by_flock[flock.id]
+            first_weight = flock_weights[0]
+            last_weight = flock_weights[-1]
+            avg_weight = sum(w.average_weight for w in flock_weights) / len(flock_weights)
             
-            if flock_weights.exists():
-                first_weight = flock_weights.first()
-                last_weight = flock_weights.last()
-                avg_weight = flock_weights.aggregate(Avg('average_weight'))['average_weight__avg']
-                
-                # Calcular ganancia diaria promedio
-                if flock_weights.count() > 1:
-                    weight_gain = (last_weight.average_weight - first_weight.average_weight) / max((last_weight.date - first_weight.date).days, 1)
-                else:
-                    weight_gain = 0
-                
-                # Comparar con estándar de la raza
-                breed_standard = None
-                deviation = None
-                if flock.breed and hasattr(flock.breed, 'weight_standards'):
-                    age_days = (timezone.now().date() - flock.placement_date).days
-                    breed_standard = flock.breed.get_expected_weight(age_days)
-                    if breed_standard and avg_weight:
-                        deviation = ((avg_weight - breed_standard) / breed_standard) * 100
-                
-                flock_analysis.append({
-                    'flock_id': flock.id,
-                    'flock_name': flock.name,
-                    'breed': flock.breed.name if flock.breed else None,
-                    'age_days': (timezone.now().date() - flock.placement_date).days,
-                    'records_count': flock_weights.count(),
-                    'weights': {
-                        'first': round(first_weight.average_weight, 2),
-                        'last': round(last_weight.average_weight, 2),
-                        'average': round(avg_weight, 2),
-                        'daily_gain': round(weight_gain, 3)
-                    },
-                    'comparison': {
-                        'breed_standard': round(breed_standard, 2) if breed_standard else None,
-                        'deviation_percent': round(deviation, 2) if deviation else None,
-                        'performance': 'above' if deviation and deviation > 5 else 'below' if deviation and deviation < -5 else 'normal'
-                    }
-                })
+            # Calcular ganancia diaria promedio
+            if len(flock_weights) > 1:
+                weight_gain = (last_weight.average_weight - first_weight.average_weight) / max((last_weight.date - first_weight.date).days, 1)
+            else:
+                weight_gain = 0
+            
+            # Comparar con estándar de la raza
+            breed_standard = None
+            deviation = None
+            if not np.isnan(expected[index]) and expected[index] > 0 and avg_weight:
+                breed_standard = as_decimal(expected[index])
+                deviation = ((avg_weight - breed_standard) / breed_standard) * 100
+            
+            flock_analysis.append({
+                'flock_id': flock.id,
+                'flock_name': self._flock_label(flock),
+                'breed': flock.breed or None,
+                'age_days': (timezone.now().date() - flock.arrival_date).days,
+                'records_count': len(flock_weights),
+                'weights': {
+                    'first': round(first_weight.average_weight, 2),
+                    'last': round(last_weight.average_weight, 2),
+                    'average': round(avg_weight, 2),
+                    'daily_gain': round(weight_gain, 3)
+                },
+                'comparison': {
+                    'breed_standard': round(breed_standard, 2) if breed_standard else None,
+                    'deviation_percent': round(deviation, 2) if deviation else None,
+                    'performance': 'above' if deviation and deviation > 5 else 'below' if deviation and deviation < -5 else 'normal'
+                }
+            })
         
         # Tendencias generales
         daily_weights = weight_records.values('date').annotate(
@@ -223,25 +254,25 @@ class ProductivityReportService:
         ).select_related('flock')
         
         # Análisis por causa
-        by_cause = mortality_records.values('cause').annotate(
-            total_deaths=Sum('quantity'),
+        by_cause = mortality_records.values('cause__name').annotate(
+            total_deaths=Sum('deaths'),
             records_count=Count('id')
         ).order_by('-total_deaths')
         
         # Análisis por lote
-        by_flock = mortality_records.values('flock__name', 'flock__id').annotate(
-            total_deaths=Sum('quantity'),
-            mortality_rate=Sum('quantity') * 100.0 / F('flock__initial_quantity')
+        by_flock = mortality_records.values('flock__id', 'flock__initial_quantity').annotate(
+            total_deaths=Sum('deaths'),
+            mortality_rate=Sum('deaths') * 100.0 / F('flock__initial_quantity')
         ).order_by('-total_deaths')
         
         # Tendencia diaria
         daily_mortality = mortality_records.values('date').annotate(
-            total_deaths=Sum('quantity'),
+            total_deaths=Sum('deaths'),
             records_count=Count('id')
         ).order_by('date')
         
         return {
-            'total_deaths': mortality_records.aggregate(Sum('quantity'))['quantity__sum'] or 0,
+            'total_deaths': mortality_records.aggregate(Sum('deaths'))['deaths__sum'] or 0,
             'total_records': mortality_records.count(),
             'by_cause': list(by_cause),
             'by_flock': list(by_flock),
@@ -253,30 +284,30 @@ class ProductivityReportService:
         """Analiza el consumo de alimento"""
         consumption_records = FoodConsumptionRecord.objects.filter(
             flock__in=flocks,
-            consumption_date__range=[self.date_from, self.date_to]
-        ).select_related('flock', 'food_batch', 'food_batch__inventory_item')
+            date__range=[self.date_from, self.date_to]
+        ).select_related('flock', 'inventory_item')
         
         # Consumo por lote
-        by_flock = consumption_records.values('flock__name', 'flock__id').annotate(
-            total_consumption=Sum('quantity_kg'),
-            avg_daily_consumption=Avg('quantity_kg'),
+        by_flock = consumption_records.values('flock__id').annotate(
+            total_consumption=Sum('quantity_consumed'),
+            avg_daily_consumption=Avg('quantity_consumed'),
             records_count=Count('id')
         ).order_by('-total_consumption')
         
         # Consumo por tipo de alimento
-        by_food_type = consumption_records.values('food_batch__inventory_item__name').annotate(
-            total_consumption=Sum('quantity_kg'),
+        by_food_type = consumption_records.values('inventory_item__name').annotate(
+            total_consumption=Sum('quantity_consumed'),
             records_count=Count('id')
         ).order_by('-total_consumption')
         
         # Tendencia diaria
-        daily_consumption = consumption_records.values('consumption_date').annotate(
-            total_consumption=Sum('quantity_kg'),
+        daily_consumption = consumption_records.values('date').annotate(
+            total_consumption=Sum('quantity_consumed'),
             records_count=Count('id')
-        ).order_by('consumption_date')
+        ).order_by('date')
         
         return {
-            'total_consumption': consumption_records.aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0,
+            'total_consumption': consumption_records.aggregate(Sum('quantity_consumed'))['quantity_consumed__sum'] or 0,
             'by_flock': list(by_flock),
             'by_food_type': list(by_food_type),
             'daily_trends': list(daily_consumption),
@@ -286,13 +317,28 @@ class ProductivityReportService:
     def _analyze_feed_conversion(self, flocks) -> Dict[str, Any]:
         """Analiza la conversión alimenticia"""
         conversion_data = []
+        closed = self._closed_summaries(flocks, self.date_from, self.date_to)
         
         for flock in flocks:
+            summary = closed.get(flock.id)
+            if summary is not None:
+                # Lote cerrado dentro del período: conversión de toda su vida ya calculada
+                if summary.fcr is not None:
+                    conversion_data.append({
+                        'flock_id': flock.id,
+                        'flock_name': self._flock_label(flock),
+                        'total_consumption_kg': round(summary.total_feed_kg, 2),
+                        'total_weight_gain_kg': round(summary.weight_gain_kg, 2),
+                        'feed_conversion_ratio': round(summary.fcr, 3),
+                        'efficiency': 'excellent' if summary.fcr < Decimal('1.8') else 'good' if summary.fcr < Decimal('2.2') else 'poor'
+                    })
+                continue
+            
             # Consumo total del lote en el período
             total_consumption = FoodConsumptionRecord.objects.filter(
                 flock=flock,
-                consumption_date__range=[self.date_from, self.date_to]
-            ).aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0
+                date__range=[self.date_from, self.date_to]
+            ).aggregate(Sum('quantity_consumed'))['quantity_consumed__sum'] or 0
             
             # Ganancia de peso en el período
             weight_records = DailyWeightRecord.objects.filter(
@@ -304,14 +350,15 @@ class ProductivityReportService:
                 first_weight = weight_records.first().average_weight
                 last_weight = weight_records.last().average_weight
                 weight_gain_per_bird = last_weight - first_weight
-                total_weight_gain = weight_gain_per_bird * flock.current_quantity
+                # Pesos en gramos: ganancia total en kg
+                total_weight_gain = weight_gain_per_bird * flock.current_quantity / 1000
                 
                 # Conversión alimenticia (kg alimento / kg ganancia)
-                feed_conversion = total_consumption / max(total_weight_gain, 0.001)
+                feed_conversion = total_consumption / max(total_weight_gain, Decimal('0.001'))
                 
                 conversion_data.append({
                     'flock_id': flock.id,
-                    'flock_name': flock.name,
+                    'flock_name': self._flock_label(flock),
                     'total_consumption_kg': round(total_consumption, 2),
                     'total_weight_gain_kg': round(total_weight_gain, 2),
                     'feed_conversion_ratio': round(feed_conversion, 3),
@@ -347,27 +394,13 @@ class ProductivityReportService:
     
     def _get_period_metrics(self, flocks, date_from, date_to) -> Dict[str, Any]:
         """Obtiene métricas para un período específico"""
-        mortality = MortalityRecord.objects.filter(
-            flock__in=flocks,
-            date__range=[date_from, date_to]
-        ).aggregate(Sum('quantity'))['quantity__sum'] or 0
-        
-        weight = DailyWeightRecord.objects.filter(
-            flock__in=flocks,
-            date__range=[date_from, date_to]
-        ).aggregate(Avg('average_weight'))['average_weight__avg'] or 0
-        
-        consumption = FoodConsumptionRecord.objects.filter(
-            flock__in=flocks,
-            consumption_date__range=[date_from, date_to]
-        ).aggregate(Sum('quantity_kg'))['quantity_kg__sum'] or 0
-        
+        totals = self._period_totals(flocks, date_from, date_to)
         total_birds = flocks.aggregate(Sum('initial_quantity'))['initial_quantity__sum'] or 1
         
         return {
-            'mortality_rate': (mortality / total_birds) * 100,
-            'avg_weight': weight,
-            'total_consumption': consumption
+            'mortality_rate': (totals['deaths'] / total_birds) * 100,
+            'avg_weight': totals['weight_total'] / totals['weight_records'] if totals['weight_records'] else 0,
+            'total_consumption': totals['feed_kg']
         }
     
     def _calculate_change(self, current, previous) -> Dict[str, Any]:
@@ -401,7 +434,7 @@ class ProductivityReportService:
             mortality_rate = MortalityRecord.objects.filter(
                 flock=flock,
                 date__range=[self.date_from, self.date_to]
-            ).aggregate(Sum('quantity'))['quantity__sum'] or 0
+            ).aggregate(Sum('deaths'))['deaths__sum'] or 0
             
             mortality_percent = (mortality_rate / flock.initial_quantity) * 100
             
@@ -409,8 +442,8 @@ class ProductivityReportService:
                 alerts.append({
                     'type': 'high_mortality',
                     'severity': 'high',
-                    'flock': flock.name,
-                    'message': f'Mortalidad alta: {mortality_percent:.1f}% en {flock.name}',
+                    'flock': self._flock_label(flock),
+                    'message': f'Mortalidad alta: {mortality_percent:.1f}% en {self._flock_label(flock)}',
                     'value': mortality_percent
                 })
         
@@ -516,7 +549,7 @@ class ProductivityReportService:
             ws.cell(row=7, column=col, value=header).font = Font(bold=True)
         
         for row, cause_data in enumerate(mortality_data['by_cause'], 8):
-            ws.cell(row=row, column=1, value=cause_data['cause'])
+            ws.cell(row=row, column=1, value=cause_data['cause__name'] or 'Sin causa')
             ws.cell(row=row, column=2, value=cause_data['total_deaths'])
             ws.cell(row=row, column=3, value=cause_data['records_count'])
     
@@ -538,7 +571,7 @@ class ProductivityReportService:
             ws.cell(row=7, column=col, value=header).font = Font(bold=True)
         
         for row, flock_data in enumerate(consumption_data['by_flock'], 8):
-            ws.cell(row=row, column=1, value=flock_data['flock__name'])
+            ws.cell(row=row, column=1, value=f"Lote {flock_data['flock__id']}")
             ws.cell(row=row, column=2, value=round(flock_data['total_consumption'], 2))
             ws.cell(row=row, column=3, value=round(flock_data['avg_daily_consumption'], 2))
             ws.cell(row=row, column=4, value=flock_data['records_count'])
\ No newline at end of file
@@ -83,3 +83,52 @@ def test_reports_list_requires_auth(client):
     """Test que la lista de reportes requiere autenticación"""
     response = client.get('/api/reports/')
     assert response.status_code == 401
+
+
+@pytest.mark.django_db
+def test_weight_performance_uses_cached_breed_curves(user):
+    """Test comparación con la raza desde las curvas cacheadas, sin consultas por lote"""
+    from decimal import Decimal
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.farms.models import Farm, Shed
+    from apps.flocks.models import BreedReference, DailyWeightRecord, Flock
+    from apps.reports.models import Report, ReportType
+    from apps.reports.services import ProductivityReportService
+
+    farm = Farm.objects.create(name='Report Farm', location='', farm_manager=user)
+    shed = Shed.objects.create(name='R1', farm=farm, capacity=10000)
+    BreedReference.objects.create(breed='Ross', age_days=7, expected_weight='160.00')
+    BreedReference.objects.create(breed='Ross', age_days=14, expected_weight='440.00')
+
+    arrival = date.today() - timedelta(days=20)
+    flocks = []
+    for breed, weights in (('Ross', ['150.00', '300.00']), ('Ross', ['160.00', '330.00']), ('Sin curva', ['200.00'])):
+        flock = Flock.objects.create(
+            arrival_date=arrival, initial_quantity=100, current_quantity=100, initial_weight=Decimal('40.00'),
+            breed=breed, gender='M', supplier='S', shed=shed
+        )
+        for offset, weight in zip((7, 10), weights):
+            DailyWeightRecord.objects.create(
+                flock=flock, date=arrival + timedelta(days=offset), average_weight=Decimal(weight),
+                sample_size=10, recorded_by=user
+            )
+        flocks.append(flock)
+
+    report = Report.objects.create(
+        name='Pesos', report_type=ReportType.PRODUCTIVITY, date_from=arrival, date_to=date.today(), created_by=user
+    )
+    service = ProductivityReportService(report)
+    with CaptureQueriesContext(connection) as queries:
+        analysis = service._analyze_weight_performance(flocks)
+
+    # Pesajes, tendencia diaria y carga de la curva: no crece con la cantidad de lotes
+    assert len(queries) <= 4
+    by_flock = {row['flock_id']: row['comparison'] for row in analysis['flock_analysis']}
+    # Día 10 interpolado entre 160 (día 7) y 440 (día 14)
+    assert by_flock[flocks[0].id]['breed_standard'] == Decimal('280.00')
+    assert by_flock[flocks[0].id]['deviation_percent'] == Decimal('-19.64')
+    assert by_flock[flocks[0].id]['performance'] == 'below'
+    assert by_flock[flocks[1].id]['breed_standard'] == Decimal('280.00')
+    assert by_flock[flocks[2].id]['breed_standard'] is None
+    assert by_flock[flocks[2].id]['performance'] == 'normal'
@@ -0,0 +1,115 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+UPSERT = 'UPSERT'
+DELETE = 'DELETE'
+
+# Entidades publicadas en el feed de cambios: modelo, columnas de alcance (granja, galpón)
+# y campos compactos que se envían al dispositivo.
+ENTITIES = {
+    'flock': {
+        'model': 'flocks.Flock',
+        'farm': F('shed__farm_id'),
+        'shed': F('shed_id'),
+        'fields': [
+            'id', 'shed_id', 'arrival_date', 'initial_quantity', 'current_quantity', 'initial_weight',
+            'breed', 'gender', 'supplier', 'status', 'updated_at',
+        ],
+    },
+    'daily_weight': {
+        'model': 'flocks.DailyWeightRecord',
+        'farm': F('flock__shed__farm_id'),
+        'shed': F('flock__shed_id'),
+        'fields': [
+            'id', 'flock_id', 'date', 'average_weight', 'sample_size', 'expected_weight',
+            'deviation_percentage', 'client_id', 'updated_at',
+        ],
+    },
+    'mortality': {
+        'model': 'flocks.MortalityRecord',
+        'farm': F('flock__shed__farm_id'),
+        'shed': F('flock__shed_id'),
+        'fields': ['id', 'flock_id', 'date', 'deaths', 'cause_id', 'temperature', 'notes', 'client_id', 'updated_at'],
+    },
+    'inventory_item': {
+        'model': 'inventory.InventoryItem',
+        'farm': F('farm_id'),
+        'shed': F('shed_id'),
+        'fields': [
+            'id', 'name', 'farm_id', 'shed_id', 'unit', 'current_stock', 'minimum_stock',
+            'daily_avg_consumption', 'last_restock_date', 'last_consumption_date',
+        ],
+    },
+    'alarm': {
+        'model': 'alarms.Alarm',
+        'farm': Coalesce('farm_id', 'flock__shed__farm_id', 'shed__farm_id'),
+        'shed': Coalesce('shed_id', 'flock__shed_id'),
+        'fields': [
+            'id', 'alarm_type', 'description', 'priority', 'status', 'farm_id', 'shed_id', 'flock_id',
+            'inventory_item_id', 'source_type', 'source_date', 'created_at', 'updated_at',
+        ],
+    },
+}
+
+
+def entity_model(entity, registry=apps):
+    return registry.get_model(ENTITIES[entity]['model'])
+
+
+def scope_rows(entity, ids, registry=apps):
+    """[(object_id, farm_id, shed_id)] de las filas existentes con esos ids"""
+    spec = ENTITIES[entity]
+    return list(
+        entity_model(entity, registry).objects.filter(id__in=ids)
+        .annotate(scope_farm=spec['farm'], scope_shed=spec['shed'])
+        .values_list('id', 'scope_farm', 'scope_shed')
+    )
+
+
+class ChangeLog:
+    """Registro monótono de cambios (SyncChange) para la sincronización incremental.
+
+    Las escrituras anotan qué filas cambiaron y el registro se inserta al confirmar la
+    transacción: el id autoincremental del registro es el cursor del feed, una escritura
+    revertida no deja rastro y los ids se asignan casi en orden de commit. Cada entrada
+    guarda la granja y el galpón de la fila para filtrar por alcance, incluso después de
+    que la fila se elimine.
+    """
+
+    @staticmethod
+    def touch(entity, ids):
+        """Publica como modificadas las filas `ids` de la entidad (alcance resuelto al confirmar)"""
+        ids = {pk for pk in ids if pk is not None}
+        if not ids:
+            return
+        transaction.on_commit(lambda: ChangeLog._write(entity, UPSERT, scope_rows(entity, ids)), robust=True)
+
+    @staticmethod
+    def tombstones(entity, ids):
+        """Alcance de filas a punto de eliminarse; se llama antes del delete y se pasa a deleted()"""
+        ids = [pk for pk in ids if pk is not None]
+        return (entity, scope_rows(entity, ids)) if ids else (entity, [])
+
+    @staticmethod
+    def deleted(tombstones):
+        entity, rows = tombstones
+        if rows:
+            transaction.on_commit(lambda: ChangeLog._write(entity, DELETE, rows), robust=True)
+
+    @staticmethod
+    def _write(entity, action, rows):
+        from .models import SyncChange
+
+        if not rows:
+            return
+        SyncChange.objects.bulk_create([
+            SyncChange(entity=entity, object_id=object_id, action=action, farm_id=farm_id, shed_id=shed_id)
+            for object_id, farm_id, shed_id in rows
+        ])
+        logger.debug('Published %s %s change(s) for %s', len(rows), action, entity)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:37
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0002_alter_syncconflict_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=100)),
+                ('record_type', models.CharField(choices=[('weight', 'Peso Diario'), ('mortality', 'Mortalidad'), ('food_consumption', 'Consumo de Alimento')], max_length=20)),
+                ('client_id', models.CharField(max_length=100)),
+                ('result', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='sync_idem_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('device_id', 'record_type', 'client_id'), name='sync_idempotency_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:41
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+BACKFILL_CHUNK = 2000
+
+# Copia fija de las entidades del feed al crear esta migración (no depende de change_log)
+ENTITIES = {
+    'flock': ('flocks', 'Flock', F('shed__farm_id'), F('shed_id')),
+    'daily_weight': ('flocks', 'DailyWeightRecord', F('flock__shed__farm_id'), F('flock__shed_id')),
+    'mortality': ('flocks', 'MortalityRecord', F('flock__shed__farm_id'), F('flock__shed_id')),
+    'inventory_item': ('inventory', 'InventoryItem', F('farm_id'), F('shed_id')),
+    'alarm': (
+        'alarms', 'Alarm',
+        Coalesce('farm_id', 'flock__shed__farm_id', 'shed__farm_id'), Coalesce('shed_id', 'flock__shed_id'),
+    ),
+}
+
+
+def seed_existing_rows(apps, schema_editor):
+    # Una entrada por fila existente: un dispositivo nuevo puede sincronizar desde since=0
+    SyncChange = apps.get_model('sync', 'SyncChange')
+    for entity, (app_label, model_name, farm, shed) in ENTITIES.items():
+        rows = (
+            apps.get_model(app_label, model_name).objects.order_by('id')
+            .annotate(scope_farm=farm, scope_shed=shed)
+            .values_list('id', 'scope_farm', 'scope_shed')
+        )
+        batch = []
+        for object_id, farm_id, shed_id in rows.iterator(chunk_size=BACKFILL_CHUNK):
+            batch.append(SyncChange(entity=entity, object_id=object_id, action='UPSERT', farm_id=farm_id, shed_id=shed_id))
+            if len(batch) >= BACKFILL_CHUNK:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0003_sync_idempotency_key'),
+        ('flocks', '0008_flockdailysnapshot'),
+        ('inventory', '0004_foodbatch_foodconsumptionrecord'),
+        ('alarms', '0002_alter_alarmconfiguration_alarm_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('UPSERT', 'Alta o Modificación'), ('DELETE', 'Eliminación')], max_length=10)),
+                ('farm_id', models.IntegerField(blank=True, null=True)),
+                ('shed_id', models.IntegerField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['farm_id', 'id'], name='sync_change_farm_idx'), models.Index(fields=['shed_id', 'id'], name='sync_change_shed_idx')],
+            },
+        ),
+        migrations.RunPython(seed_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0003_shed_current_occupancy'),
+        ('sync', '0004_sync_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='syncconflict',
+            index=models.Index(fields=['created_at', 'id'], name='sync_conflict_created_idx'),
+        ),
+    ]
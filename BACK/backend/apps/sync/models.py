@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -52,6 +53,66 @@ class SyncConflict(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [models.Index(fields=['created_at', 'id'], name='sync_conflict_created_idx')]
 
 	def __str__(self):
 		return f"SyncConflict({self.record_type}, {self.conflict_type}, farm={self.farm_id})"
+
+
+class SyncIdempotencyKey(models.Model):
+	"""Resultado original de cada registro sincronizado, por (dispositivo, tipo, client_id).
+
+	Un dispositivo que reintenta un lote completo (respuesta perdida) recibe el mismo
+	resultado sin que se repitan las escrituras.
+	"""
+	RECORD_TYPES = [
+		('weight', 'Peso Diario'),
+		('mortality', 'Mortalidad'),
+		('food_consumption', 'Consumo de Alimento'),
+	]
+
+	device_id = models.CharField(max_length=100)
+	record_type = models.CharField(max_length=20, choices=RECORD_TYPES)
+	client_id = models.CharField(max_length=100)
+	result = models.JSONField(encoder=DjangoJSONEncoder)
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		constraints = [
+			# El índice único es también el de búsqueda: (device_id, record_type, client_id__in)
+			models.UniqueConstraint(fields=['device_id', 'record_type', 'client_id'], name='sync_idempotency_key'),
+		]
+		indexes = [
+			models.Index(fields=['created_at'], name='sync_idem_created_idx'),
+		]
+
+	def __str__(self):
+		return f"SyncIdempotencyKey({self.record_type}, {self.device_id}, {self.client_id})"
+
+
+class SyncChange(models.Model):
+	"""Entrada del feed de cambios; el id es el cursor monótono que guardan los dispositivos"""
+	ACTIONS = [
+		('UPSERT', 'Alta o Modificación'),
+		('DELETE', 'Eliminación'),
+	]
+
+	id = models.BigAutoField(primary_key=True)
+	entity = models.CharField(max_length=20)
+	object_id = models.BigIntegerField()
+	action = models.CharField(max_length=10, choices=ACTIONS)
+
+	# Alcance copiado de la fila (sin FK: la entrada debe sobrevivir a la eliminación)
+	farm_id = models.IntegerField(null=True, blank=True)
+	shed_id = models.IntegerField(null=True, blank=True)
+	changed_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		ordering = ['id']
+		indexes = [
+			models.Index(fields=['farm_id', 'id'], name='sync_change_farm_idx'),
+			models.Index(fields=['shed_id', 'id'], name='sync_change_shed_idx'),
+		]
+
+	def __str__(self):
+		return f"SyncChange({self.id}, {self.entity}:{self.object_id}, {self.action})"
@@ -1,11 +1,27 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 import logging
 
-from .models import SyncConflict
+from apps.farms.models import Farm, Shed
+
+from .change_log import DELETE, ENTITIES, entity_model
+from .models import SyncChange, SyncConflict, SyncIdempotencyKey
 
 logger = logging.getLogger(__name__)
 
+# Días que se conserva el resultado de un client_id; un reintento posterior se procesa como nuevo.
+IDEMPOTENCY_RETENTION_DAYS = 30
+
+CHANGE_FEED_LIMIT = 500
+CHANGE_FEED_MAX_LIMIT = 2000
+# Las entradas más recientes que esto no se entregan todavía: cubre inserciones con ids
+# asignados fuera de orden de commit entre transacciones concurrentes.
+CHANGE_SETTLE_SECONDS = 2
+
 
 class ConflictResolutionService:
     """Servicio para crear y resolver conflictos de sincronización"""
@@ -215,3 +231,178 @@ class ConflictResolutionService:
         except Exception:
             return {}
 
+
+
+class IdempotencyService:
+    """Registro de idempotencia para los endpoints de sincronización en bloque.
+
+    Cada registro con client_id que se procesa sin error deja su resultado en
+    SyncIdempotencyKey. Cuando el dispositivo reintenta el lote (por ejemplo porque se
+    perdió la respuesta) los client_id ya registrados se resuelven con una sola consulta
+    por lote y devuelven el resultado original sin repetir las escrituras. Los errores no
+    se registran: el dispositivo puede reintentarlos una vez corregidos.
+    """
+
+    @staticmethod
+    def device_key(device_id, user):
+        """Identificador del dispositivo para el registro; sin cabecera X-Device-ID se usa el usuario"""
+        if device_id and device_id != 'unknown':
+            return str(device_id)[:100]
+        return f'user:{getattr(user, "pk", None)}'
+
+    @staticmethod
+    def run(record_type, device_key, records, process):
+        """Procesa solo los registros no vistos y devuelve resultados alineados con `records`.
+
+        `process(records)` recibe la sublista de registros nuevos y devuelve un resultado
+        (dict con 'status') por cada uno, en el mismo orden.
+        """
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    return IdempotencyService._run_once(record_type, device_key, records, process)
+            except IntegrityError:
+                # Un reintento concurrente registró los mismos client_id primero: se revierte
+                # este lote y se vuelve a leer el registro para devolver sus resultados.
+                if attempt:
+                    raise
+                logger.info('Concurrent retry for %s batch from %s, replaying stored results', record_type, device_key)
+
+    @staticmethod
+    def _run_once(record_type, device_key, records, process):
+        results = [None] * len(records)
+        first_seen = {}
+        fresh = []
+        # Registros repetidos dentro del mismo lote: (idx, idx del primero)
+        repeated = []
+
+        for idx, record in enumerate(records):
+            client_id = IdempotencyService._client_id(record)
+            if client_id is None:
+                fresh.append(idx)
+            elif client_id in first_seen:
+                repeated.append((idx, first_seen[client_id]))
+            else:
+                first_seen[client_id] = idx
+                fresh.append(idx)
+
+        if first_seen:
+            stored = SyncIdempotencyKey.objects.filter(
+                device_id=device_key, record_type=record_type, client_id__in=list(first_seen)
+            ).values_list('client_id', 'result')
+            for client_id, result in stored:
+                results[first_seen[client_id]] = dict(result, replayed=True)
+            fresh = [idx for idx in fresh if results[idx] is None]
+
+        processed = process([records[idx] for idx in fresh]) if fresh else []
+
+        ledger = []
+        for idx, result in zip(fresh, processed):
+            results[idx] = result
+            client_id = IdempotencyService._client_id(records[idx])
+            if client_id is not None and result.get('status') != 'error':
+                ledger.append(SyncIdempotencyKey(
+                    device_id=device_key,
+                    record_type=record_type,
+                    client_id=client_id,
+                    result=result,
+                ))
+        if ledger:
+            SyncIdempotencyKey.objects.bulk_create(ledger)
+
+        for idx, first in repeated:
+            results[idx] = dict(results[first], replayed=True)
+        return results
+
+    @staticmethod
+    def _client_id(record):
+        client_id = record.get('client_id') if isinstance(record, dict) else None
+        if client_id is None or client_id == '':
+            return None
+        return str(client_id)[:100]
+
+    @staticmethod
+    def purge(days=IDEMPOTENCY_RETENTION_DAYS):
+        """Elimina resultados más antiguos que `days` días; devuelve cuántos se borraron"""
+        deleted, _ = SyncIdempotencyKey.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=days)
+        ).delete()
+        return deleted
+
+
+class ChangeFeedService:
+    """Feed incremental para que un dispositivo descargue solo lo que cambió desde su cursor.
+
+    Lee SyncChange por id (> since) filtrado por el alcance del usuario, colapsa varias
+    entradas de una misma fila y devuelve las filas vigentes en formato compacto (una
+    consulta por entidad) junto con los ids eliminados. El cursor devuelto es el id de la
+    última entrada entregada; con has_more el dispositivo repite la llamada.
+    """
+
+    @staticmethod
+    def scope_for(user):
+        """Filtro Q sobre SyncChange según el rol; None si el usuario no ve ningún galpón"""
+        role_name = getattr(getattr(user, 'role', None), 'name', None)
+
+        if role_name == 'Administrador Sistema' or getattr(user, 'is_superuser', False):
+            return Q()
+        if role_name == 'Administrador de Granja':
+            return Q(farm_id__in=Farm.objects.filter(farm_manager=user).values('id'))
+        if role_name == 'Veterinario' and hasattr(user, 'assigned_farms'):
+            return Q(farm_id__in=user.assigned_farms.values('id'))
+        if role_name == 'Galponero':
+            return ChangeFeedService._worker_scope(user)
+
+        # Igual que el dashboard: sin rol reconocido se usa la relación con granjas o galpones
+        if Farm.objects.filter(farm_manager=user).exists():
+            return Q(farm_id__in=Farm.objects.filter(farm_manager=user).values('id'))
+        if Shed.objects.filter(assigned_worker=user).exists():
+            return ChangeFeedService._worker_scope(user)
+        return None
+
+    @staticmethod
+    def _worker_scope(user):
+        sheds = Shed.objects.filter(assigned_worker=user)
+        # Filas de sus galpones y filas de nivel granja (inventario general, alarmas sin galpón)
+        return Q(shed_id__in=sheds.values('id')) | Q(shed_id__isnull=True, farm_id__in=sheds.values('farm_id'))
+
+    @staticmethod
+    def changes(user, since=0, limit=CHANGE_FEED_LIMIT):
+        limit = max(1, min(int(limit), CHANGE_FEED_MAX_LIMIT))
+        result = {'cursor': since, 'has_more': False, 'changes': {}, 'deleted': {}}
+
+        scope = ChangeFeedService.scope_for(user)
+        if scope is None:
+            return result
+
+        settled = timezone.now() - timedelta(seconds=CHANGE_SETTLE_SECONDS)
+        entries = list(
+            SyncChange.objects.filter(scope, id__gt=since, changed_at__lte=settled)
+            .order_by('id')
+            .values_list('id', 'entity', 'object_id', 'action')[:limit + 1]
+        )
+        result['has_more'] = len(entries) > limit
+        entries = entries[:limit]
+        if not entries:
+            return result
+        result['cursor'] = entries[-1][0]
+
+        # La última entrada de cada fila decide si se envía la fila o su eliminación
+        latest = {}
+        for _, entity, object_id, action in entries:
+            if entity in ENTITIES:
+                latest[(entity, object_id)] = action
+
+        upserts = defaultdict(set)
+        deleted = defaultdict(set)
+        for (entity, object_id), action in latest.items():
+            (deleted if action == DELETE else upserts)[entity].add(object_id)
+
+        for entity, ids in upserts.items():
+            rows = list(entity_model(entity).objects.filter(id__in=ids).values(*ENTITIES[entity]['fields']))
+            result['changes'][entity] = rows
+            # Eliminadas después de la entrada (su borrado llegará en una entrada posterior)
+            deleted[entity].update(ids - {row['id'] for row in rows})
+
+        result['deleted'] = {entity: sorted(ids) for entity, ids in deleted.items() if ids}
+        return result
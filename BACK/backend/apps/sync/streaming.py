@@ -0,0 +1,189 @@
+import gzip
+import json
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+# Registros procesados por cada llamada al servicio cuando el cuerpo llega como stream
+SYNC_CHUNK_SIZE = 500
+# Tamaño máximo del cuerpo NDJSON ya descomprimido (BULK_SYNC_MAX_BODY_SIZE lo reemplaza);
+# una línea no puede superar DATA_UPLOAD_MAX_MEMORY_SIZE
+MAX_BODY_SIZE = 50 * 1024 * 1024
+
+
+def dumps_line(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def bounded_lines(stream):
+    """Líneas del cuerpo sin leer nunca más de una línea máxima ni más del cuerpo máximo.
+
+    Evita que un gzip muy comprimido o una línea gigante agoten la memoria del proceso.
+    """
+    max_line = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    max_body = getattr(settings, 'BULK_SYNC_MAX_BODY_SIZE', MAX_BODY_SIZE)
+    read = 0
+    number = 0
+    while True:
+        line = stream.readline(max_line + 1) if max_line else stream.readline()
+        if not line:
+            return
+        number += 1
+        read += len(line)
+        if max_line and len(line) > max_line:
+            raise ParseError(f'Línea {number}: supera el máximo de {max_line} bytes')
+        if max_body and read > max_body:
+            raise ParseError(f'El cuerpo supera el máximo de {max_body} bytes')
+        yield line
+
+
+class RecordStream:
+    """Registros de un cuerpo NDJSON decodificados bajo demanda (se puede recorrer una sola vez)"""
+
+    def __init__(self, lines):
+        self._lines = lines
+
+    def __iter__(self):
+        try:
+            for number, line in enumerate(self._lines, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ParseError(f'Línea {number}: JSON inválido ({e})')
+        except (OSError, EOFError, zlib.error) as e:
+            raise ParseError(f'Cuerpo gzip inválido: {e}')
+
+    def chunks(self, size=None):
+        size = size or SYNC_CHUNK_SIZE
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class NDJSONParser(BaseParser):
+    """Un registro JSON por línea; admite Content-Encoding: gzip.
+
+    No lee el cuerpo al parsear: devuelve un RecordStream que la vista consume por bloques.
+    """
+    media_type = NDJSON_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '') if request is not None else ''
+        if stream is None:
+            return RecordStream([])
+        if 'gzip' in encoding.lower():
+            stream = gzip.GzipFile(fileobj=stream)
+        return RecordStream(bounded_lines(stream))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Respuestas no streaming en NDJSON (p. ej. errores de validación): una línea por objeto"""
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, list):
+            return b''.join(dumps_line(item) for item in data)
+        if isinstance(data, dict) and isinstance(data.get('details'), list):
+            summary = {key: value for key, value in data.items() if key != 'details'}
+            return b''.join(dumps_line(item) for item in data['details']) + dumps_line({'summary': summary})
+        return dumps_line(data)
+
+
+class BulkSyncStream:
+    """Formato compacto opcional para los endpoints bulk-sync.
+
+    Con Content-Type application/x-ndjson (opcionalmente gzip) los registros se leen del
+    cuerpo por bloques de SYNC_CHUNK_SIZE y cada bloque pasa al servicio de ingesta sin
+    construir la lista completa. Con Accept: application/x-ndjson los resultados por
+    registro se envían a medida que se procesan, seguidos de una línea {"summary": ...};
+    la salida se comprime con gzip si el cliente lo acepta. Sin estas cabeceras el
+    endpoint responde JSON como siempre.
+    """
+
+    parser_classes = [NDJSONParser]
+    renderer_classes = [NDJSONRenderer]
+
+    @staticmethod
+    def records(request, key):
+        data = request.data
+        if isinstance(data, RecordStream):
+            return data
+        return data.get(key, [])
+
+    @staticmethod
+    def response(request, records, process, summarize):
+        """`process(bloque)` devuelve un resultado por registro; `summarize(total, Counter(status))` el resumen"""
+        chunks = records.chunks() if isinstance(records, RecordStream) else [records]
+
+        if not isinstance(getattr(request, 'accepted_renderer', None), NDJSONRenderer):
+            details = []
+            try:
+                for chunk in chunks:
+                    details.extend(process(chunk))
+            except ParseError as e:
+                if not details:
+                    raise
+                # Los bloques anteriores ya se guardaron: se informan junto al error de la línea
+                details.append({'status': 'error', 'error': str(e.detail)})
+            summary = summarize(len(details), Counter(r.get('status') for r in details))
+            return Response({**summary, 'details': details})
+
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+        body = BulkSyncStream._lines(chunks, process, summarize)
+        response = StreamingHttpResponse(
+            BulkSyncStream._gzip(body) if use_gzip else body,
+            content_type=NDJSON_MEDIA_TYPE
+        )
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        return response
+
+    @staticmethod
+    def _lines(chunks, process, summarize):
+        counts = Counter()
+        total = 0
+        try:
+            for chunk in chunks:
+                for result in process(chunk):
+                    counts[result.get('status')] += 1
+                    total += 1
+                    yield dumps_line(result)
+        except ParseError as e:
+            # Los bloques anteriores ya se guardaron; el cliente reintenta desde la línea fallida
+            yield dumps_line({'status': 'error', 'error': str(e.detail)})
+            counts['error'] += 1
+        yield dumps_line({'summary': summarize(total, counts)})
+
+    @staticmethod
+    def _gzip(lines):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for count, line in enumerate(lines, start=1):
+            data = compressor.compress(line)
+            # Vaciar cada bloque para que el cliente reciba progreso y no un único buffer final
+            if count % SYNC_CHUNK_SIZE == 0:
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
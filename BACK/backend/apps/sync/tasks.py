@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .services import IdempotencyService
+
+
+@shared_task
+def purge_idempotency_keys_task():
+    """Eliminar resultados de idempotencia vencidos"""
+    return {'deleted': IdempotencyService.purge()}
@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import DailyWeightRecord, Flock, MortalityRecord
+from apps.inventory.models import InventoryItem
+from apps.users.models import Role
+
+User = get_user_model()
+
+
+@mock.patch('apps.sync.services.CHANGE_SETTLE_SECONDS', 0)
+class SyncChangeFeedTests(APITestCase):
+    def setUp(self):
+        role, _ = Role.objects.get_or_create(name='Administrador de Granja')
+        worker_role, _ = Role.objects.get_or_create(name='Galponero')
+        self.manager = User.objects.create(username='feedmgr', email='feedmgr@example.com', identification='feed-01', role=role)
+        self.other = User.objects.create(username='feedother', email='feedother@example.com', identification='feed-02', role=role)
+        self.worker = User.objects.create(username='feedworker', email='feedworker@example.com', identification='feed-03', role=worker_role)
+
+        self.farm = Farm.objects.create(name='FeedFarm', location='Loc', farm_manager=self.manager)
+        self.shed = Shed.objects.create(name='FeedShed', capacity=500, farm=self.farm, assigned_worker=self.worker)
+        self.other_farm = Farm.objects.create(name='OtherFarm', location='Loc', farm_manager=self.other)
+        self.other_shed = Shed.objects.create(name='OtherShed', capacity=500, farm=self.other_farm)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flock = self._flock(self.shed)
+            self.other_flock = self._flock(self.other_shed)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('sync-changes')
+
+    def _flock(self, shed):
+        return Flock.objects.create(
+            arrival_date=timezone.now().date(), initial_quantity=100, current_quantity=100, initial_weight=40,
+            breed='BR', gender='M', supplier='S', shed=shed, created_by=self.manager
+        )
+
+    def _weight(self, flock):
+        return DailyWeightRecord.objects.create(
+            flock=flock, date=timezone.now().date(), average_weight=120, recorded_by=self.manager
+        )
+
+    def test_feed_is_scoped_and_resumes_from_cursor(self):
+        first = self.client.get(self.url, {'since': 0})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([row['id'] for row in first.data['changes']['flock']], [self.flock.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            weight = self._weight(self.flock)
+            self._weight(self.other_flock)
+
+        second = self.client.get(self.url, {'since': first.data['cursor']})
+        self.assertEqual(list(second.data['changes']), ['daily_weight'])
+        self.assertEqual([row['id'] for row in second.data['changes']['daily_weight']], [weight.id])
+
+        third = self.client.get(self.url, {'since': second.data['cursor']})
+        self.assertEqual(third.data['changes'], {})
+        self.assertEqual(third.data['cursor'], second.data['cursor'])
+
+    def test_mortality_updates_flock_and_deletes_are_published(self):
+        cursor = self.client.get(self.url, {'since': 0}).data['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record = MortalityRecord.objects.create(
+                flock=self.flock, date=timezone.now().date(), deaths=4, recorded_by=self.manager
+            )
+        changed = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(changed.data['changes']['flock'][0]['current_quantity'], 96)
+        self.assertEqual(changed.data['changes']['mortality'][0]['id'], record.id)
+
+        record_id = record.id
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delete()
+        deleted = self.client.get(self.url, {'since': changed.data['cursor']})
+        self.assertEqual(deleted.data['deleted'], {'mortality': [record_id]})
+
+    def test_worker_sees_farm_level_inventory_and_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = InventoryItem.objects.create(name='General', unit='KG', farm=self.farm)
+            InventoryItem.objects.create(name='Ajeno', unit='KG', farm=self.other_farm)
+
+        self.client.force_authenticate(user=self.worker)
+        page = self.client.get(self.url, {'since': 0, 'limit': 1})
+        self.assertTrue(page.data['has_more'])
+        self.assertEqual(list(page.data['changes']), ['flock'])
+
+        rest = self.client.get(self.url, {'since': page.data['cursor']})
+        self.assertFalse(rest.data['has_more'])
+        self.assertEqual([row['id'] for row in rest.data['changes']['inventory_item']], [item.id])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.farms.models import Farm, Shed
+from apps.flocks.models import DailyWeightRecord, Flock, MortalityRecord
+from apps.flocks.services import MortalityService
+from apps.flocks.services_weight import WeightSyncService
+from apps.inventory.models import InventoryItem
+from apps.sync.models import SyncIdempotencyKey
+from apps.users.models import Role
+
+User = get_user_model()
+
+
+class IdempotentBulkSyncTests(APITestCase):
+    def setUp(self):
+        role, _ = Role.objects.get_or_create(name='Administrador Sistema')
+        self.user = User.objects.create(username='idem', email='idem@example.com', identification='idem-01', role=role)
+        self.farm = Farm.objects.create(name='IdemFarm', location='Loc', farm_manager=self.user)
+        self.shed = Shed.objects.create(name='ShedIdem', capacity=500, farm=self.farm)
+        self.flock = Flock.objects.create(
+            arrival_date=timezone.now().date(), initial_quantity=100, current_quantity=100, initial_weight=40,
+            breed='BR', gender='M', supplier='S', shed=self.shed, created_by=self.user
+        )
+        self.today = timezone.now().date().isoformat()
+
+    def test_mortality_retry_does_not_add_deaths_twice(self):
+        payload = [{'flock_id': self.flock.id, 'date': self.today, 'deaths': 5, 'client_id': 'm1'}]
+
+        first = MortalityService.register_mortality_batch(payload, self.user, 'dev-1')
+        retry = MortalityService.register_mortality_batch(payload, self.user, 'dev-1')
+
+        self.flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 95)
+        self.assertEqual(MortalityRecord.objects.get(flock=self.flock).deaths, 5)
+        self.assertTrue(retry[0]['replayed'])
+        self.assertEqual(retry[0]['server_id'], first[0]['server_id'])
+
+    def test_same_client_id_from_another_device_is_processed(self):
+        payload = [{'flock_id': self.flock.id, 'date': self.today, 'deaths': 5, 'client_id': 'm1'}]
+
+        MortalityService.register_mortality_batch(payload, self.user, 'dev-1')
+        MortalityService.register_mortality_batch(payload, self.user, 'dev-2')
+
+        self.flock.refresh_from_db()
+        self.assertEqual(self.flock.current_quantity, 90)
+
+    def test_errors_are_not_stored_and_can_be_retried(self):
+        payload = [{'flock_id': self.flock.id, 'date': self.today, 'deaths': 500, 'client_id': 'm1'}]
+
+        first = MortalityService.register_mortality_batch(payload, self.user, 'dev-1')
+        self.assertEqual(first[0]['status'], 'error')
+        self.assertFalse(SyncIdempotencyKey.objects.exists())
+
+        payload[0]['deaths'] = 3
+        retry = MortalityService.register_mortality_batch(payload, self.user, 'dev-1')
+        self.assertEqual(retry[0]['status'], 'success')
+        self.assertNotIn('replayed', retry[0])
+
+    def test_weight_retry_replays_with_one_lookup(self):
+        records = [
+            {'flock_id': self.flock.id, 'date': self.today, 'average_weight': 120, 'client_id': 'w1'},
+            {'flock_id': self.flock.id, 'date': self.today, 'average_weight': 130, 'client_id': 'w2'},
+        ]
+        first = WeightSyncService.bulk_sync(records, self.user, 'dev-1')
+        self.assertEqual(first['details'][1]['resolution'], 'averaged')
+
+        with CaptureQueriesContext(connection) as ctx:
+            retry = WeightSyncService.bulk_sync(records, self.user, 'dev-1')
+
+        statements = [q['sql'] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(retry['successful'], 2)
+        self.assertTrue(all(d['replayed'] for d in retry['details']))
+        self.assertEqual(DailyWeightRecord.objects.get(flock=self.flock).average_weight, Decimal('125.00'))
+
+    def test_fifo_retry_does_not_consume_stock_twice(self):
+        item = InventoryItem.objects.create(name='Iniciador', unit='KG', farm=self.farm)
+        item.add_stock(100)
+        payload = {'consumption_records': [
+            {'flock_id': self.flock.id, 'inventory_item_id': item.id, 'quantity_consumed': '12.5', 'client_id': 'f1'}
+        ]}
+        self.client.force_authenticate(user=self.user)
+
+        first = self.client.post('/api/inventory/bulk-consume-fifo/', payload, format='json', HTTP_X_DEVICE_ID='dev-1')
+        retry = self.client.post('/api/inventory/bulk-consume-fifo/', payload, format='json', HTTP_X_DEVICE_ID='dev-1')
+
+        item.refresh_from_db()
+        self.assertEqual(item.current_stock, Decimal('87.50'))
+        self.assertEqual(first.data['successful'], 1)
+        self.assertTrue(retry.data['details'][0]['replayed'])
@@ -1,7 +1,10 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import SyncConflictViewSet
+from .views import SyncChangesView, SyncConflictViewSet
 
 router = DefaultRouter()
 router.register(r'conflicts', SyncConflictViewSet, basename='sync-conflict')
 
-urlpatterns = router.urls
+urlpatterns = [
+	path('sync/changes/', SyncChangesView.as_view(), name='sync-changes'),
+] + router.urls
@@ -5,12 +5,16 @@ from .models import SyncConflict
 from .serializers import SyncConflictSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .services import ConflictResolutionService
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
+from avicolatrack.pagination import KeysetPagination
+from .services import CHANGE_FEED_LIMIT, ChangeFeedService, ConflictResolutionService
 
 class SyncConflictViewSet(viewsets.ModelViewSet):
 	queryset = SyncConflict.objects.all().order_by('-created_at')
 	serializer_class = SyncConflictSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = KeysetPagination
 
 	@action(detail=True, methods=['post'])
 	def resolve(self, request, pk=None):
@@ -25,4 +29,37 @@ class SyncConflictViewSet(viewsets.ModelViewSet):
 
 		return Response({'result': result})
 
+
+class SyncChangesView(APIView):
+	permission_classes = [permissions.IsAuthenticated]
+
+	@extend_schema(
+		description='Feed incremental para dispositivos móviles: filas de lotes, pesajes diarios, mortalidad, inventario y alarmas creadas, modificadas o eliminadas desde el cursor `since`, limitadas a los galpones del usuario. Un dispositivo nuevo empieza con since=0; luego guarda `cursor` y repite la llamada mientras `has_more` sea verdadero. La eliminación de un lote publica también la de sus pesajes y mortalidades.',
+		parameters=[
+			OpenApiParameter('since', int, description='Último cursor recibido (0 para la primera sincronización)'),
+			OpenApiParameter('limit', int, description=f'Máximo de entradas del feed por página (por defecto {CHANGE_FEED_LIMIT})'),
+		],
+		examples=[
+			OpenApiExample('Ejemplo cambios', value={
+				'cursor': 1542,
+				'has_more': False,
+				'changes': {
+					'daily_weight': [{'id': 88, 'flock_id': 4, 'date': '2025-09-28', 'average_weight': '1250.00'}],
+					'flock': [{'id': 4, 'current_quantity': 4875, 'status': 'ACTIVE'}]
+				},
+				'deleted': {'alarm': [17]}
+			})
+		]
+	)
+	def get(self, request):
+		try:
+			since = int(request.query_params.get('since', 0))
+			limit = int(request.query_params.get('limit', CHANGE_FEED_LIMIT))
+		except (TypeError, ValueError):
+			return Response({'error': 'since y limit deben ser enteros'}, status=status.HTTP_400_BAD_REQUEST)
+		if since < 0:
+			return Response({'error': 'since debe ser mayor o igual a 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+		return Response(ChangeFeedService.changes(request.user, since, limit))
+
 # Create your views here.
@@ -29,14 +29,30 @@ app.conf.beat_schedule = {
         'task': 'apps.inventory.tasks.update_all_inventory_metrics_task',
         'schedule': 86400.0,  # Cada día
     },
+    'roll-up-inventory-snapshots-daily': {
+        'task': 'apps.inventory.tasks.roll_up_inventory_snapshots_task',
+        'schedule': 86400.0,  # Cada día (consolida el día anterior)
+    },
     'check-stock-alerts-every-6-hours': {
         'task': 'apps.inventory.tasks.check_stock_alerts_task',
         'schedule': 21600.0,  # Cada 6 horas
     },
+    'refresh-growth-forecasts-daily': {
+        'task': 'apps.flocks.tasks.refresh_growth_forecasts_task',
+        'schedule': 86400.0,  # Cada día
+    },
+    'close-out-flocks-daily': {
+        'task': 'apps.flocks.tasks.close_out_flocks_task',
+        'schedule': 86400.0,  # Cada día (lotes cuyo cierre diferido no se ejecutó)
+    },
     'execute-scheduled-reports-hourly': {
         'task': 'apps.reports.tasks.execute_scheduled_reports',
         'schedule': 3600.0,  # Cada hora
     },
+    'purge-sync-idempotency-keys-daily': {
+        'task': 'apps.sync.tasks.purge_idempotency_keys_task',
+        'schedule': 86400.0,  # Cada día
+    },
     'cleanup-reports-weekly': {
         'task': 'apps.reports.tasks.cleanup_old_reports',
         'schedule': 604800.0,  # Cada semana
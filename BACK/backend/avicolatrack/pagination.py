@@ -0,0 +1,147 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginación por cursor sobre la clave compuesta (ordering_field, id), de más nuevo a más antiguo.
+
+    El cursor guarda el último (valor, id) entregado y la página siguiente se obtiene con
+    `campo < valor OR (campo = valor AND id < id)`, que recorre el índice compuesto
+    (ordering_field, id) sin OFFSET: cualquier página cuesta lo mismo que la primera y las
+    filas insertadas mientras se pagina no desplazan ni duplican resultados. A diferencia de
+    CursorPagination de DRF, los empates en ordering_field no se resuelven con OFFSET.
+    """
+    ordering_field = 'created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.reverse, self.position = self.decode_cursor(request)
+
+        # Hacia atrás (enlace previous) se recorre en orden ascendente y se invierte el resultado
+        descending = not self.reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.ordering_field}', f'{prefix}id')
+        if self.position is not None:
+            value, pk = self.position
+            try:
+                value = queryset.model._meta.get_field(self.ordering_field).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__{op}': value}) | Q(**{self.ordering_field: value, f'id__{op}': pk})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._key(self.page[-1]) if self.page else self.position
+        return self.encode_cursor(False, position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(True, self.position) if self.position else None
+        return self.encode_cursor(True, self._key(self.page[0]))
+
+    def _key(self, instance):
+        value = getattr(instance, self.ordering_field)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        return value, instance.pk
+
+    def encode_cursor(self, reverse, position):
+        token = json.dumps([int(reverse), position[0], position[1]], separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            reverse, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            # _key siempre serializa el valor como texto (fechas en ISO)
+            if not isinstance(value, str):
+                raise ValueError(value)
+            return bool(reverse), (value, int(pk))
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor devuelto en next/previous',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Resultados por página (máximo {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class DateKeysetPagination(KeysetPagination):
+    """Registros diarios (pesajes, consumos) por (date, id)"""
+    ordering_field = 'date'
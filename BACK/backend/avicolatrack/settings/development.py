@@ -26,3 +26,7 @@ CACHES = {
 
 # Ensure django-ratelimit uses the local cache name
 RATELIMIT_USE_CACHE = 'default'
+
+# Run Celery tasks inline during development/tests so background jobs
+# (e.g. breed reference imports) don't require a running Redis broker.
+CELERY_TASK_ALWAYS_EAGER = True
@@ -1,4 +1,16 @@
 import pytest
 
 # Configuración para pytest-django
-pytest_plugins = ['pytest_django']
\ No newline at end of file
+pytest_plugins = ['pytest_django']
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    # Las curvas en memoria y la caché local sobreviven al rollback de cada test;
+    # se limpian entre tests para no servir datos de ids reutilizados
+    from django.core.cache import cache
+    from apps.flocks.reference_cache import BreedReferenceCache
+
+    BreedReferenceCache.clear()
+    cache.clear()
+    yield